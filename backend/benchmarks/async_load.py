@@ -0,0 +1,135 @@
+"""Load benchmark: sync (threadpool) vs async handlers for the same query.
+
+Serves GET /api/queue/status twice from one uvicorn worker, once through
+the sync ``get_db`` session (the old path, bounded by Starlette's 40
+threadpool slots) and once through the async router, then fires the same
+concurrent load at both. Each request also waits BENCH_DB_LATENCY_MS inside
+the database, standing in for the round trip to a remote server. Needs a
+scratch PostgreSQL database; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.async_load
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+if not os.getenv("BENCH_DATABASE_URL", "").startswith("postgresql"):
+    sys.exit("Set BENCH_DATABASE_URL to a scratch PostgreSQL database")
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+
+import httpx
+from alembic import command
+from alembic.config import Config
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+import database
+from init_db import init_database
+from routers import queue
+from services.queue_service import QueueService
+
+PORT = int(os.getenv("BENCH_PORT", "8799"))
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+CONCURRENCY = [int(level) for level in os.getenv("BENCH_CONCURRENCY", "10,40,80").split(",")]
+DB_LATENCY_SECONDS = float(os.getenv("BENCH_DB_LATENCY_MS", "20")) / 1000
+# Large enough that the connection pool is not what limits either path;
+# each engine is disposed after its run to stay under max_connections
+POOL_SIZE = max(CONCURRENCY)
+
+sync_engine = create_engine(database.DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0)
+SyncSession = sessionmaker(autoflush=False, bind=sync_engine)
+async_engine = create_async_engine(database.ASYNC_DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+def get_sync_db():
+    db = SyncSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _simulated_round_trip(db: Session):
+    db.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": DB_LATENCY_SECONDS})
+
+app = FastAPI()
+
+@app.get("/sync/status")
+def sync_status(db: Session = Depends(get_sync_db)):
+    _simulated_round_trip(db)
+    return QueueService.get_queue_status(db)
+
+@app.get("/async/status")
+async def async_status(db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(_simulated_round_trip)
+    return await queue.get_queue_status(db=db)
+
+@app.post("/reset")
+async def reset_pools():
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+async def run_load(client: httpx.AsyncClient, path: str, concurrency: int, requests: int = REQUESTS):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000
+    }
+
+async def benchmark():
+    limits = httpx.Limits(max_connections=max(CONCURRENCY))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        for _ in range(100):
+            try:
+                await client.get("/docs")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+        print(f"{REQUESTS} requests per run, {DB_LATENCY_SECONDS * 1000:.0f} ms simulated DB latency")
+        print(f"{'concurrency':>11}  {'path':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for concurrency in CONCURRENCY:
+            for path in ("/sync/status", "/async/status"):
+                # Open every pooled connection first so connects are not timed
+                await run_load(client, path, concurrency, concurrency * 2)
+                result = await run_load(client, path, concurrency)
+                await client.post("/reset")
+                print(f"{concurrency:>11}  {path:<14} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p95']:>8.1f}")
+
+def main():
+    command.upgrade(Config("alembic.ini"), "head")
+    init_database()
+    # Separate server process so the load generator does not share its GIL
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "benchmarks.async_load:app",
+        "--port", str(PORT), "--log-level", "warning", "--backlog", "4096"
+    ])
+    try:
+        asyncio.run(benchmark())
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
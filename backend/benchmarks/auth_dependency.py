@@ -0,0 +1,76 @@
+"""Micro-benchmark: cost of the auth dependency on every protected request.
+
+Times ``main.get_current_user`` (what every patients, queue and reports
+request awaits) with the verified-token cache off and on, plus the user
+lookup behind ``/api/auth/me`` with and without the user cache. Uses a
+throwaway SQLite file unless AUTH_BENCH_DATABASE_URL points elsewhere. Run
+from the backend directory:
+
+    python -m benchmarks.auth_dependency
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "AUTH_BENCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'auth_bench.db')}"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from fastapi.security import HTTPAuthorizationCredentials
+from database import engine, SessionLocal, Base
+from models import User
+from services import auth_service
+from services.auth_service import create_access_token, get_password_hash, token_cache, user_cache
+from main import get_current_user
+
+CALLS = int(os.getenv("AUTH_BENCH_CALLS", "20000"))
+USERNAME = "auth-benchmark"
+
+def per_call(run, calls: int) -> float:
+    started = time.perf_counter()
+    run(calls)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+def dependency(credentials):
+    async def loop(calls):
+        for _ in range(calls):
+            await get_current_user(credentials)
+    return lambda calls: asyncio.run(loop(calls))
+
+def user_lookup(db):
+    def loop(calls):
+        for _ in range(calls):
+            user_cache.get(db, USERNAME)
+    return loop
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if not db.query(User).filter(User.username == USERNAME).first():
+            db.add(User(username=USERNAME, email=f"{USERNAME}@example.com", hashed_password=get_password_hash("x")))
+            db.commit()
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": USERNAME}))
+    backend = auth_service._decode_jwt.__module__.split(".")[0]
+    print(f"JWT backend: {backend}, {CALLS} calls each")
+
+    size = token_cache.size
+    token_cache.size = 0
+    uncached = per_call(dependency(credentials), CALLS)
+    token_cache.size = size
+    cached = per_call(dependency(credentials), CALLS)
+    print(f"get_current_user  uncached {uncached:7.1f} us/call   cached {cached:7.1f} us/call   ({uncached / cached:.0f}x)")
+
+    with SessionLocal() as db:
+        ttl = user_cache.ttl
+        user_cache.ttl = 0
+        uncached = per_call(user_lookup(db), CALLS // 10)
+        user_cache.ttl = ttl
+        user_cache.invalidate()
+        cached = per_call(user_lookup(db), CALLS)
+    print(f"/me user lookup   uncached {uncached:7.1f} us/call   cached {cached:7.1f} us/call   ({uncached / cached:.0f}x)")
+
+if __name__ == "__main__":
+    main()
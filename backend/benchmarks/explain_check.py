@@ -0,0 +1,178 @@
+"""Query plan audit: fails if a router query sequentially scans a large table.
+
+Needs a scratch PostgreSQL database; it is migrated and, if empty, seeded
+with ~1M patient_tests rows. Run from the backend directory:
+
+    EXPLAIN_DATABASE_URL=postgresql://... python -m benchmarks.explain_check
+"""
+import json
+import os
+import sys
+
+if not os.getenv("EXPLAIN_DATABASE_URL", "").startswith("postgresql"):
+    sys.exit("Set EXPLAIN_DATABASE_URL to a scratch PostgreSQL database")
+os.environ["DATABASE_URL"] = os.environ["EXPLAIN_DATABASE_URL"]
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, text
+from database import engine, SessionLocal
+from models import Patient, PatientTest
+from init_db import init_database
+from services.rollup_service import RollupService
+from services.queue_service import QueueService
+from services.patient_portal_service import PatientPortalService
+from schemas import AppointmentAccessRequest
+from routers import patients, appointments, reports
+
+PATIENTS = 200_000
+PATIENT_TESTS = 1_000_000
+APPOINTMENTS = 200_000
+
+# Tables that grow with history; the small catalog tables may be scanned
+LARGE_TABLES = {"patients", "patient_tests", "appointments"}
+
+# Planner cost for SSD-backed storage, as recommended in DEPLOYMENT.md.
+# With the spinning-disk default of 4 the planner prefers hashing the whole
+# patients table over a few hundred primary key lookups.
+RANDOM_PAGE_COST = os.getenv("EXPLAIN_RANDOM_PAGE_COST", "1.1")
+
+SEED_SQL = (
+    f"""
+    INSERT INTO patients (unique_id, first_name, last_name, date_of_birth, gender, phone,
+                          smoking, diabetes, hypertension, obesity, family_history, risk_level, created_at)
+    SELECT 'P' || lpad(g::text, 9, '0'), 'First' || g, 'Last' || g,
+           date '1940-01-01' + (g % 25000), CASE WHEN g % 2 = 0 THEN 'female' ELSE 'male' END,
+           '98' || lpad(g::text, 8, '0'), false, false, false, false, false, 'low',
+           now() - (g % 730) * interval '1 day'
+    FROM generate_series(1, {PATIENTS}) g
+    """,
+    # Only today's tests are still active, as on a real floor
+    f"""
+    INSERT INTO patient_tests (patient_id, test_id, status, assigned_room_id,
+                               assigned_at, started_at, completed_at, created_at, updated_at)
+    SELECT p.first_id + g % {PATIENTS},
+           t.first_id + g % 7,
+           CASE WHEN g % 730 > 0 OR g % 3 = 0 THEN 'completed' WHEN g % 3 = 1 THEN 'pending' ELSE 'in_progress' END,
+           r.first_id + g % 6,
+           now() - (g % 730) * interval '1 day' + interval '5 minutes',
+           now() - (g % 730) * interval '1 day' + interval '20 minutes',
+           CASE WHEN g % 730 > 0 OR g % 3 = 0 THEN now() - (g % 730) * interval '1 day' + interval '45 minutes' END,
+           now() - (g % 730) * interval '1 day',
+           now() - (g % 730) * interval '1 day'
+    FROM generate_series(1, {PATIENT_TESTS}) g,
+         (SELECT min(id) AS first_id FROM patients) p,
+         (SELECT min(id) AS first_id FROM tests) t,
+         (SELECT min(id) AS first_id FROM rooms) r
+    """,
+    f"""
+    INSERT INTO appointments (patient_id, room_id, appointment_date, estimated_wait_time, status, created_at)
+    SELECT p.first_id + g % {PATIENTS}, r.first_id + g % 6,
+           now() + (g % 60) * interval '1 day', 30,
+           CASE WHEN g % 10 = 0 THEN 'scheduled' ELSE 'completed' END,
+           now() - (g % 730) * interval '1 day'
+    FROM generate_series(1, {APPOINTMENTS}) g,
+         (SELECT min(id) AS first_id FROM patients) p,
+         (SELECT min(id) AS first_id FROM rooms) r
+    """,
+)
+
+def prepare():
+    command.upgrade(Config("alembic.ini"), "head")
+    init_database()
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM patients")).scalar() < PATIENTS:
+            print("Seeding dataset, this takes a minute...")
+            for statement in SEED_SQL:
+                conn.execute(text(statement))
+
+    # Reports read history from the rollups, as they do in production
+    RollupService.run_once()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+def scenarios(db):
+    patient = db.query(Patient).order_by(Patient.id.desc()).first()
+    access = AppointmentAccessRequest(
+        unique_id=patient.unique_id,
+        date_of_birth=patient.date_of_birth.strftime("%Y-%m-%d")
+    )
+    return {
+        # Async endpoints are audited through the sync code they run via run_sync
+        "queue status": lambda: QueueService.get_queue_status(db),
+        "queue status by department": lambda: QueueService.get_queue_status(db, department_id=1),
+        "patient queue tests": lambda: db.query(PatientTest).filter(PatientTest.patient_id == patient.id).all(),
+        "patient by UHID": lambda: patients.get_patient_by_unique_id(patient.unique_id, db=db),
+        "patient search by name": lambda: patients.search_patients(q=f"{patient.first_name} {patient.last_name[:4]}", db=db),
+        "patient search by phone": lambda: patients.search_patients(q=patient.phone[:6], db=db),
+        "patient tests": lambda: patients.get_patient_tests(patient.id, db=db),
+        "appointment portal": lambda: appointments._access_appointment_portal(db, access),
+        "patient portal": lambda: PatientPortalService.get_portal(db, patient.unique_id),
+        "patient appointments": lambda: appointments._get_appointments(db, patient_id=patient.id),
+        "patient schedule": lambda: appointments._get_patient_schedule(db, patient.id),
+        "completion report (one day)": lambda: reports.get_patient_completion_report(
+            start_date="2026-01-01T00:00:00", end_date="2026-01-02T00:00:00", db=db
+        ),
+        "daily summary": lambda: reports._daily_summary_report(db),
+        "department efficiency": lambda: reports._department_efficiency_report(db),
+    }
+
+def capture(run):
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return statements
+
+def seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+def main():
+    prepare()
+    db = SessionLocal()
+    failures = []
+    try:
+        for name, run in scenarios(db).items():
+            statements = capture(run)
+            db.rollback()
+
+            raw = engine.raw_connection()
+            try:
+                cursor = raw.cursor()
+                cursor.execute(f"SET random_page_cost = {float(RANDOM_PAGE_COST)}")
+                for statement, parameters in statements:
+                    if statement.lstrip().upper().startswith("EXPLAIN"):
+                        # Row-count estimates for paged lists already are a plan
+                        continue
+                    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+                    plan = cursor.fetchone()[0]
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    scanned = seq_scans(plan[0]["Plan"])
+                    if scanned:
+                        failures.append((name, scanned, " ".join(statement.split())))
+            finally:
+                raw.close()
+
+            print(f"{'FAIL' if failures and failures[-1][0] == name else 'ok  '} {name} ({len(statements)} statement(s))")
+    finally:
+        db.close()
+
+    for name, scanned, statement in failures:
+        print(f"\n{name}: Seq Scan on {', '.join(scanned)}\n  {statement[:300]}")
+
+    if failures:
+        sys.exit(1)
+    print("OK: no sequential scans on large tables")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark: login throughput, and what a login burst does to other requests.
+
+Fires LOGIN_BENCH_LOGINS concurrent logins (a shift change) at the app
+while one client keeps polling ``/api/queue/status``, first with bcrypt
+running in the request threadpool (PASSWORD_HASH_WORKERS=0, how logins
+used to hash) and then in the password hashing process pool. Reports
+logins per second and the queue requests' latency during the burst. Uses a
+throwaway SQLite file unless LOGIN_BENCH_DATABASE_URL points elsewhere.
+Run from the backend directory:
+
+    python -m benchmarks.login_load
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "LOGIN_BENCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login_load.db')}"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+import httpx
+
+LOGINS = int(os.getenv("LOGIN_BENCH_LOGINS", "32"))
+POOL_WORKERS = int(os.getenv("LOGIN_BENCH_WORKERS", str(max(os.cpu_count() // 2, 1))))
+
+async def burst(app, headers: dict) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        latencies = []
+
+        async def poll_queue():
+            while not done.is_set():
+                started = time.perf_counter()
+                response = await client.get("/api/queue/status", headers=headers)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def log_in():
+            response = await client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+            response.raise_for_status()
+
+        poller = asyncio.create_task(poll_queue())
+        await asyncio.sleep(0.2)
+        baseline = len(latencies)
+        started = time.perf_counter()
+        await asyncio.gather(*(log_in() for _ in range(LOGINS)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await poller
+    return elapsed, latencies[:baseline], latencies[baseline:]
+
+def report(name: str, elapsed: float, idle: list, during: list):
+    p95 = statistics.quantiles(during, n=20)[-1] if len(during) > 1 else during[0]
+    print(f"{name:<22} {LOGINS / elapsed:6.1f} logins/s   queue status idle p50 {statistics.median(idle):6.1f} ms, "
+          f"during burst p50 {statistics.median(during):6.1f} ms  p95 {p95:7.1f} ms  ({len(during)} requests)")
+
+async def run():
+    from alembic import command
+    from alembic.config import Config
+    from init_db import init_database
+    from main import app
+    from services.auth_service import create_access_token
+    from services.login_rate_limiter import login_rate_limiter
+    from services.password_hasher import password_hasher
+
+    command.upgrade(Config("alembic.ini"), "head")
+    init_database()
+    login_rate_limiter.limit = 0
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    print(f"{LOGINS} concurrent logins at bcrypt cost {password_hasher.rounds}, {os.cpu_count()} CPU(s)")
+
+    password_hasher.workers = 0
+    report("request threadpool", *await burst(app, headers))
+
+    password_hasher.workers = POOL_WORKERS
+    password_hasher.start()
+    try:
+        # Let the workers spawn before timing
+        await password_hasher.hash("warm-up")
+        report(f"process pool ({POOL_WORKERS} workers)", *await burst(app, headers))
+    finally:
+        password_hasher.shutdown()
+
+if __name__ == "__main__":
+    # One event loop for both runs: the async engine's pool is bound to it
+    asyncio.run(run())
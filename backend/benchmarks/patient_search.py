@@ -0,0 +1,117 @@
+"""Benchmark: ranked patient search latency on a large registry.
+
+Migrates the database, seeds it (once) with SEARCH_PATIENTS patients drawn
+from common first and last names, then times each kind of search the front
+desk makes and reports p50/p95 per query. PostgreSQL exercises the prefix
+and trigram indexes of migrations 0005, 0007 and 0010; the default
+throwaway SQLite file exercises the in-process fallback index. Run from
+the backend directory:
+
+    SEARCH_DATABASE_URL=postgresql://... python -m benchmarks.patient_search
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "SEARCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'patient_search.db')}"
+)
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, insert, select, text
+from database import engine, SessionLocal
+from models import Patient
+from services.patient_search import PatientSearchService
+
+DEFAULT_PATIENTS = 1_000_000 if engine.dialect.name == "postgresql" else 50_000
+PATIENTS = int(os.getenv("SEARCH_PATIENTS", str(DEFAULT_PATIENTS)))
+REPEATS = int(os.getenv("SEARCH_REPEATS", "50"))
+TARGET_MS = 50
+BATCH = 10_000
+
+FIRST_NAMES = (
+    "Aarav Aditi Akash Amit Ananya Anil Anita Arjun Asha Deepa Divya Gaurav Geeta Harish Isha Kavya "
+    "Kiran Lakshmi Manoj Meena Mohan Neha Nikhil Pooja Priya Rahul Rajesh Ravi Rekha Rohan Sanjay "
+    "Sarita Shreya Sneha Sunil Sunita Suresh Tanvi Uma Varun Vijay Vikram Anjali Farhan Imran Zoya "
+    "John Mary James Linda Michael Sarah David Emma Daniel Olivia Joseph Sophia Thomas Grace"
+).split()
+LAST_NAMES = (
+    "Sharma Verma Gupta Singh Kumar Patel Shah Mehta Iyer Nair Reddy Rao Das Bose Ghosh Mukherjee "
+    "Chatterjee Banerjee Joshi Kulkarni Desai Pillai Menon Khan Ansari Sheikh Qureshi Fernandes "
+    "DSouza Pereira Agarwal Bansal Malhotra Kapoor Chopra Saxena Srivastava Tiwari Pandey Mishra "
+    "Smith Johnson Williams Brown Jones Miller Davis Wilson Taylor Anderson Thomas Moore Martin"
+).split()
+
+def seed():
+    command.upgrade(Config("alembic.ini"), "head")
+    with SessionLocal() as db:
+        existing = db.execute(select(func.count(Patient.id))).scalar()
+    if existing >= PATIENTS:
+        return
+
+    print(f"Seeding {PATIENTS - existing} patients, this takes a while...")
+    rng = random.Random(42)
+    today = datetime.utcnow().strftime("%Y%m%d")
+    with engine.begin() as conn:
+        for start in range(existing, PATIENTS, BATCH):
+            conn.execute(insert(Patient), [{
+                "unique_id": f"P{today}{i:08X}",
+                "first_name": rng.choice(FIRST_NAMES),
+                "last_name": rng.choice(LAST_NAMES),
+                "date_of_birth": datetime(1940, 1, 1) + timedelta(days=rng.randrange(30000)),
+                "gender": rng.choice(("male", "female")),
+                "phone": f"9{rng.randrange(10 ** 9):09d}",
+                "risk_level": "low"
+            } for i in range(start, min(start + BATCH, PATIENTS))])
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE patients"))
+
+def queries(db) -> list:
+    sample = db.execute(select(Patient.unique_id, Patient.phone, Patient.first_name, Patient.last_name)
+                        .order_by(Patient.id.desc()).limit(1)).one()
+    return [
+        ("full UHID", sample.unique_id),
+        ("UHID prefix", sample.unique_id[:10]),
+        ("phone prefix", sample.phone[:6]),
+        ("full phone", sample.phone),
+        ("2-letter name", sample.last_name[:2]),
+        ("last name", sample.last_name),
+        ("first + last prefix", f"{sample.first_name[:3]} {sample.last_name[:3]}"),
+        ("full name", f"{sample.first_name} {sample.last_name}"),
+        ("misspelt name", f"{sample.first_name} {sample.last_name[0]}{sample.last_name[2]}{sample.last_name[1]}{sample.last_name[3:]}"),
+    ]
+
+def main():
+    seed()
+    with SessionLocal() as db:
+        total = db.execute(select(func.count(Patient.id))).scalar()
+        print(f"{engine.dialect.name}: {total} patients, {REPEATS} runs per query")
+        # The fallback index (and PostgreSQL's caches) load on first use
+        PatientSearchService.search(db, "warm up", 20)
+
+        slow = []
+        for label, query in queries(db):
+            timings = []
+            for _ in range(REPEATS):
+                started = time.perf_counter()
+                results = PatientSearchService.search(db, query, 20)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.rollback()
+            p50, p95 = statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
+            top = f"{results[0]['first_name']} {results[0]['last_name']} ({results[0]['score']})" if results else "-"
+            print(f"{label:<20} {query!r:<26} {len(results):>3} hits  p50 {p50:6.1f} ms  p95 {p95:6.1f} ms  top: {top}")
+            if p95 > TARGET_MS:
+                slow.append(label)
+
+    if slow:
+        sys.exit(f"FAIL: p95 above {TARGET_MS} ms for {', '.join(slow)}")
+    print(f"OK: every search p95 under {TARGET_MS} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Regression benchmark: the queue read path must issue a constant number of
+SQL statements no matter how many tests are pending.
+
+Run from the backend directory:  python -m benchmarks.queue_status_queries
+"""
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event
+from database import engine, SessionLocal, Base
+from models import Department, Test, Room, Patient, PatientTest
+from services.queue_service import QueueService
+from datetime import datetime
+
+def seed(db, pending_tests: int):
+    db.query(PatientTest).delete()
+    db.query(Patient).delete()
+
+    if db.query(Department).count() == 0:
+        radiology = Department(name="Radiology", type="radiology")
+        db.add(radiology)
+        db.flush()
+        db.add(Test(name="X-ray Chest", department_id=radiology.id, estimated_duration=15))
+        db.add(Room(room_number="R101", department_id=radiology.id))
+        db.commit()
+
+    test = db.query(Test).first()
+    room = db.query(Room).first()
+
+    patients = [
+        Patient(
+            unique_id=f"P{i:08d}",
+            first_name="Bench",
+            last_name=str(i),
+            date_of_birth=datetime(1980, 1, 1),
+            gender="female"
+        )
+        for i in range(pending_tests)
+    ]
+    db.add_all(patients)
+    db.flush()
+
+    db.add_all([
+        PatientTest(
+            patient_id=patient.id,
+            test_id=test.id,
+            status="pending",
+            assigned_room_id=room.id if i % 2 else None,
+            assigned_at=datetime.utcnow()
+        )
+        for i, patient in enumerate(patients)
+    ])
+    db.commit()
+
+def count_statements(pending_tests: int):
+    db = SessionLocal()
+    try:
+        seed(db, pending_tests)
+        db.expire_all()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            started = time.perf_counter()
+            rows = QueueService.get_queue_status(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert len(rows) == pending_tests
+        return len(statements), elapsed
+    finally:
+        db.close()
+
+def main():
+    Base.metadata.create_all(bind=engine)
+
+    results = {size: count_statements(size) for size in (10, 10_000)}
+    for size, (statements, elapsed) in results.items():
+        print(f"{size:>6} pending tests: {statements} statement(s), {elapsed * 1000:.1f} ms")
+
+    counts = {statements for statements, _ in results.values()}
+    assert len(counts) == 1, f"statement count grows with queue size: {results}"
+    print("OK: statement count is constant")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Stress test: concurrent room allocation must never double-book a room.
+
+Worker threads, each with its own session, start together and race to claim
+the same small set of rooms. Every round
+checks that no room was handed out twice and that the rooms marked taken in
+the database are exactly the ones claimed. The old read-then-write pattern
+runs first for comparison; it is expected to double-book.
+
+Uses a throwaway SQLite file unless STRESS_DATABASE_URL points elsewhere
+(e.g. a scratch PostgreSQL database). Run from the backend directory:
+
+    python -m benchmarks.room_allocation_stress
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "STRESS_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'room_allocation.db')}"
+)
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from database import engine, SessionLocal, Base
+from models import Department, Room
+from services.room_allocation_service import RoomAllocationService
+
+ROOMS = int(os.getenv("STRESS_ROOMS", "5"))
+THREADS = int(os.getenv("STRESS_THREADS", "12"))
+ROUNDS = int(os.getenv("STRESS_ROUNDS", "50"))
+
+def seed() -> tuple:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        department = db.query(Department).filter(Department.name == "Stress Test").first()
+        if not department:
+            department = Department(name="Stress Test", type="radiology")
+            db.add(department)
+            db.flush()
+            db.add_all([
+                Room(room_number=f"STRESS-{i:03d}", department_id=department.id)
+                for i in range(ROOMS)
+            ])
+            db.commit()
+        room_ids = [room.id for room in db.query(Room).filter(Room.department_id == department.id)]
+        return department.id, room_ids
+
+def legacy_claim(db, room_id: int, department_id: int):
+    # What the routers did before: check, then write in a later flush
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room.is_available:
+        return None
+    time.sleep(0.001)
+    room.is_available = False
+    return room_id
+
+def atomic_claim(db, room_id: int, department_id: int):
+    return room_id if RoomAllocationService.claim(db, room_id) else None
+
+def run_round(claim, department_id: int, room_ids: list) -> tuple:
+    with SessionLocal() as db:
+        db.execute(update(Room).where(Room.id.in_(room_ids)).values(is_available=True))
+        db.commit()
+
+    barrier = threading.Barrier(THREADS)
+    claimed, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            # More attempts than rooms, so every room is contended
+            for _ in range(2 * ROOMS // THREADS + 2):
+                try:
+                    room_id = claim(db, random.choice(room_ids), department_id)
+                    db.commit()
+                except OperationalError as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(str(e.orig))
+                    continue
+                if room_id is not None:
+                    with lock:
+                        claimed.append(room_id)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with SessionLocal() as db:
+        taken = {room_id for (room_id,) in db.query(Room.id).filter(Room.id.in_(room_ids), Room.is_available == False)}
+    return Counter(claimed), taken, errors
+
+def stress(name: str, claim, department_id: int, room_ids: list) -> int:
+    double_booked = mismatched = errors = 0
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        counts, taken, round_errors = run_round(claim, department_id, room_ids)
+        double_booked += sum(1 for count in counts.values() if count > 1)
+        mismatched += set(counts) != taken
+        errors += len(round_errors)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<8} {ROUNDS} rounds in {elapsed:.1f}s: {double_booked} double-booked room(s), "
+          f"{mismatched} round(s) out of sync with the database, {errors} database error(s)")
+    return double_booked + mismatched
+
+def main():
+    department_id, room_ids = seed()
+    print(f"{engine.dialect.name}: {THREADS} threads, {len(room_ids)} rooms")
+
+    stress("legacy", legacy_claim, department_id, room_ids)
+    if stress("atomic", atomic_claim, department_id, room_ids):
+        sys.exit("FAIL: atomic allocation double-booked a room")
+    print("OK: no room was allocated twice")
+
+if __name__ == "__main__":
+    main()
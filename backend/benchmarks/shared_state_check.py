@@ -0,0 +1,213 @@
+"""Check: workers' copies of shared state stay coherent through services.shared_state.
+
+Runs several SharedState instances in one process, each keeping its own
+copy of a set the way a worker keeps its caches and indexes, and checks
+that every copy ends up equal to the "database":
+
+- through RedisBackend with an in-memory stand-in for the Redis client
+  (no server needed): concurrent publishers, a garbled message and a
+  dropped subscription, the last two of which must trigger a resync;
+- through the launcher's LocalHub on a temporary Unix socket, with two
+  workers sending large messages at once to a third, which must receive
+  every line intact.
+
+Run from the backend directory:
+
+    python -m benchmarks.shared_state_check
+"""
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from services.shared_state import LocalBackend, LocalHub, RedisBackend, SharedState
+
+MESSAGES = int(os.getenv("SHARED_STATE_CHECK_MESSAGES", "500"))
+THREADS = int(os.getenv("SHARED_STATE_CHECK_THREADS", "4"))
+# Large enough that one message takes several socket writes
+PAYLOAD_BYTES = int(os.getenv("SHARED_STATE_CHECK_PAYLOAD_BYTES", str(256 * 1024)))
+CHANNEL = "shared-state-check"
+TOPIC = "check.added"
+
+class InMemoryRedis:
+    """The slice of redis-py RedisBackend uses: ``publish`` and ``pubsub``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+
+    def publish(self, channel: str, data: bytes):
+        with self._lock:
+            subscribers = [pubsub for pubsub in self._subscribers if pubsub.channel == channel]
+        for pubsub in subscribers:
+            pubsub.messages.put({"type": "message", "channel": channel, "data": data})
+
+    def pubsub(self, ignore_subscribe_messages: bool = False):
+        return InMemoryPubSub(self)
+
+    def drop(self, pubsub: "InMemoryPubSub"):
+        with self._lock:
+            if pubsub in self._subscribers:
+                self._subscribers.remove(pubsub)
+        pubsub.messages.put(None)
+
+class InMemoryPubSub:
+    def __init__(self, server: InMemoryRedis):
+        self.server = server
+        self.channel = None
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel: str):
+        self.channel = channel
+        with self.server._lock:
+            self.server._subscribers.append(self)
+
+    def listen(self):
+        while True:
+            message = self.messages.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.server.drop(self)
+
+class Database:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = set()
+
+class Replica:
+    """One worker's copy of a set, updated by its own writes and its peers' messages."""
+
+    def __init__(self, name: str, database: Database, backend_factory):
+        self.name = name
+        self.database = database
+        self.lock = threading.Lock()
+        self.items = set()
+        self.remote = Counter()
+        self.resyncs = 0
+        self.bus = SharedState(backend_factory)
+        self.bus.subscribe(TOPIC, self._apply, resync=self._resync)
+
+    def add(self, item: str, padding: str = ""):
+        with self.database.lock:
+            self.database.items.add(item)
+        with self.lock:
+            self.items.add(item)
+        self.bus.publish(TOPIC, {"item": item, "padding": padding})
+
+    def _apply(self, message: dict):
+        with self.lock:
+            self.items.add(message["item"])
+            self.remote[message["item"]] += 1
+
+    def _resync(self):
+        with self.database.lock:
+            items = set(self.database.items)
+        with self.lock:
+            self.items = items
+            self.resyncs += 1
+
+def wait_until(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+def coherent(replicas, database: Database) -> bool:
+    with database.lock:
+        expected = set(database.items)
+    return all(replica.items == expected for replica in replicas)
+
+def write_concurrently(replicas, prefix: str, count: int, padding: str = ""):
+    def writer(replica, thread):
+        for n in range(count):
+            replica.add(f"{prefix}-{replica.name}-{thread}-{n}", padding)
+
+    threads = [threading.Thread(target=writer, args=(replica, thread)) for replica in replicas for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def check_redis() -> list:
+    failures = []
+    server = InMemoryRedis()
+    database = Database()
+    replicas = [Replica(name, database, lambda: RedisBackend("redis://in-memory", CHANNEL, client=server)) for name in "ab"]
+    for replica in replicas:
+        replica.bus.start()
+    try:
+        started = time.perf_counter()
+        write_concurrently(replicas, "concurrent", MESSAGES // THREADS)
+        if not wait_until(lambda: coherent(replicas, database)):
+            failures.append("redis: copies differ after concurrent writes")
+        echoed = [replica.name for replica in replicas if any(item.split("-")[1] == replica.name for item in replica.remote)]
+        if echoed:
+            failures.append(f"redis: worker(s) {echoed} applied their own messages")
+        print(f"redis    {len(database.items)} writes from {len(replicas) * THREADS} threads settled in "
+              f"{time.perf_counter() - started:.2f}s")
+
+        # A garbled message may have been a change nobody else will resend
+        before = [replica.resyncs for replica in replicas]
+        server.publish(CHANNEL, b"{not json")
+        if not wait_until(lambda: all(replica.resyncs > count for replica, count in zip(replicas, before))):
+            failures.append("redis: a garbled message did not trigger a resync")
+
+        # A dropped subscription misses messages until the listener reconnects
+        dropped = replicas[1]
+        before = dropped.resyncs
+        dropped.bus._backend.close()
+        replicas[0].add("while-disconnected")
+        if not wait_until(lambda: dropped.resyncs > before):
+            failures.append("redis: reconnecting did not trigger a resync")
+        replicas[0].add("after-reconnect")
+        if not wait_until(lambda: coherent(replicas, database)):
+            failures.append("redis: copies differ after a reconnect")
+        print(f"redis    garbled message and dropped subscription resynced: "
+              f"{[replica.resyncs for replica in replicas]} resync(s)")
+    finally:
+        for replica in replicas:
+            replica.bus.shutdown()
+    return failures
+
+def check_local_hub() -> list:
+    failures = []
+    path = os.path.join(tempfile.mkdtemp(), "hub.sock")
+    hub = LocalHub(path)
+    hub.start()
+    database = Database()
+    replicas = [Replica(name, database, lambda: LocalBackend(path)) for name in "abc"]
+    for replica in replicas:
+        replica.bus.start()
+    try:
+        started = time.perf_counter()
+        count = max(MESSAGES // (THREADS * 10), 1)
+        write_concurrently(replicas[:2], "large", count, "x" * PAYLOAD_BYTES)
+        if not wait_until(lambda: coherent(replicas, database), timeout=30.0):
+            failures.append("local hub: copies differ after concurrent writes")
+        garbled = [replica.name for replica in replicas if replica.resyncs]
+        if garbled:
+            failures.append(f"local hub: worker(s) {garbled} received interleaved lines")
+        print(f"local    {len(database.items)} writes of {PAYLOAD_BYTES // 1024} KB from 2 workers settled in "
+              f"{time.perf_counter() - started:.2f}s")
+    finally:
+        for replica in replicas:
+            replica.bus.shutdown()
+        hub.close()
+    return failures
+
+def main():
+    failures = check_redis() + check_local_hub()
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK: every worker's copy matches the database")
+
+if __name__ == "__main__":
+    main()
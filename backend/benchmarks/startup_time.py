@@ -0,0 +1,109 @@
+"""Benchmark: cold start of a server worker, and which imports it pays for.
+
+Starts STARTUP_BENCH_RUNS fresh interpreters that import ``main`` under
+``python -X importtime`` and run the app's startup (lifespan), then
+reports the median import and startup time, the inclusive import cost of
+each backend module (including the libraries it was first to pull in)
+and the own import time of each third-party package. Migrates a throwaway
+SQLite file unless STARTUP_BENCH_DATABASE_URL points elsewhere. Set
+STARTUP_BENCH_BUDGET_MS to fail when import plus startup exceeds it. Run
+from the backend directory:
+
+    python -m benchmarks.startup_time
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "STARTUP_BENCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from alembic import command
+from alembic.config import Config
+
+RUNS = int(os.getenv("STARTUP_BENCH_RUNS", "5"))
+BUDGET_MS = float(os.getenv("STARTUP_BENCH_BUDGET_MS", "0"))
+TOP = 15
+PROJECT_PACKAGES = ("main", "database", "models", "schemas", "routers", "services")
+
+WORKER = """
+import asyncio, json, os, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+# Processes started by the lifespan (password hashing) inherit -X importtime
+os.dup2(os.open(os.devnull, os.O_WRONLY), 2)
+
+async def start():
+    async with main.lifespan(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (ready - imported) * 1000}))
+"""
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self us, cumulative us) per ``-X importtime`` line."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(own), int(cumulative)))
+    return modules
+
+def is_project(module: str) -> bool:
+    return module.split(".")[0] in PROJECT_PACKAGES
+
+def run_worker() -> tuple:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", WORKER],
+        capture_output=True, text=True, check=True, env={**os.environ, "LOG_LEVEL": "WARNING"}
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+def median_table(runs: list) -> dict:
+    keys = set().union(*runs)
+    return {key: statistics.median(run.get(key, 0) for run in runs) for key in keys}
+
+def main():
+    command.upgrade(Config("alembic.ini"), "head")
+
+    timings, project, packages = [], [], []
+    for _ in range(RUNS):
+        run_timings, modules = run_worker()
+        timings.append(run_timings)
+        inclusive, own = {}, {}
+        for module, self_us, cumulative_us in modules:
+            if is_project(module):
+                inclusive[module] = cumulative_us / 1000
+            else:
+                package = module.split(".")[0]
+                own[package] = own.get(package, 0) + self_us / 1000
+        project.append(inclusive)
+        packages.append(own)
+
+    import_ms = statistics.median(run["import_ms"] for run in timings)
+    startup_ms = statistics.median(run["startup_ms"] for run in timings)
+    print(f"{RUNS} cold starts: import main {import_ms:7.1f} ms, startup {startup_ms:7.1f} ms, "
+          f"total {import_ms + startup_ms:7.1f} ms (median)")
+
+    print(f"\nBackend modules, inclusive import time (top {TOP}):")
+    for module, ms in sorted(median_table(project).items(), key=lambda item: -item[1])[:TOP]:
+        print(f"  {module:<40} {ms:8.1f} ms")
+
+    print(f"\nThird-party packages, own import time (top {TOP}):")
+    for package, ms in sorted(median_table(packages).items(), key=lambda item: -item[1])[:TOP]:
+        print(f"  {package:<40} {ms:8.1f} ms")
+
+    if BUDGET_MS and import_ms + startup_ms > BUDGET_MS:
+        sys.exit(f"FAIL: cold start {import_ms + startup_ms:.0f} ms over the {BUDGET_MS:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
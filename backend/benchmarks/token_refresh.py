@@ -0,0 +1,65 @@
+"""Benchmark: renewing a session with a refresh token versus logging in again.
+
+Times ``/api/auth/login`` (a bcrypt verification) against
+``/api/auth/refresh`` (a signature check and a primary key lookup, plus
+the rotated token's insert) one request at a time, and reports p50/p95 of
+each. Uses a throwaway SQLite file unless REFRESH_BENCH_DATABASE_URL points
+elsewhere. Run from the backend directory:
+
+    python -m benchmarks.token_refresh
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "REFRESH_BENCH_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'token_refresh.db')}"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+import httpx
+
+REQUESTS = int(os.getenv("REFRESH_BENCH_REQUESTS", "50"))
+
+def report(name: str, timings: list):
+    p95 = statistics.quantiles(timings, n=20)[-1]
+    print(f"{name:<8} p50 {statistics.median(timings):7.1f} ms  p95 {p95:7.1f} ms")
+
+async def run():
+    from alembic import command
+    from alembic.config import Config
+    from init_db import init_database
+    from main import app
+    from services.login_rate_limiter import login_rate_limiter
+    from services.password_hasher import password_hasher
+
+    command.upgrade(Config("alembic.ini"), "head")
+    init_database()
+    login_rate_limiter.limit = 0
+    print(f"{REQUESTS} requests each, bcrypt cost {password_hasher.rounds}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(request):
+            started = time.perf_counter()
+            response = await request()
+            response.raise_for_status()
+            return (time.perf_counter() - started) * 1000, response.json()
+
+        credentials = {"username": "admin", "password": "admin123"}
+        logins = [await timed(lambda: client.post("/api/auth/login", data=credentials)) for _ in range(REQUESTS)]
+        refresh_token = logins[-1][1]["refresh_token"]
+        refreshes = []
+        for _ in range(REQUESTS):
+            elapsed, tokens = await timed(lambda: client.post("/api/auth/refresh", json={"refresh_token": refresh_token}))
+            refresh_token = tokens["refresh_token"]
+            refreshes.append(elapsed)
+
+    report("login", [elapsed for elapsed, _ in logins])
+    report("refresh", refreshes)
+    password_hasher.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(run())
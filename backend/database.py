@@ -1,20 +1,72 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from services.db_metrics import db_metrics, TimedQueuePool, TimedAsyncQueuePool
+from services.request_profiler import request_profiler
 import os
 
 load_dotenv("../config.env")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Managed Postgres drops idle connections; pre-ping and recycling keep the
+# pool from handing them out after a quiet period
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_url(url: str):
+    # Same database as DATABASE_URL, reached through an asyncio driver
+    url = make_url(url)
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        return url
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    if "sslmode" in url.query:
+        # asyncpg takes ``ssl`` rather than libpq's ``sslmode``
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+def _pool_options(url, poolclass) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite keeps SQLAlchemy's default pool; there is no server to pool against
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL, TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL, TimedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+db_metrics.instrument("sync", engine)
+db_metrics.instrument("async", async_engine.sync_engine)
+request_profiler.instrument("sync", engine)
+request_profiler.instrument("async", async_engine.sync_engine)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,10 +1,13 @@
+from sqlalchemy import inspect
 from database import engine, SessionLocal
-from models import Base, Department, Test, Room, User
+from models import Department, Test, Room, User
 from services.auth_service import get_password_hash
 from datetime import datetime
 
 def init_database():
-    Base.metadata.create_all(bind=engine)
+    # Seeds data only: tables come from migrations, so there is one source of schema
+    if not inspect(engine).has_table("alembic_version"):
+        raise SystemExit("Database schema is not managed by migrations: run `alembic upgrade head` first")
     
     db = SessionLocal()
     
@@ -77,7 +80,8 @@ def init_database():
             admin_user = User(
                 username="admin",
                 email="admin@mhcqms.com",
-                hashed_password=get_password_hash("admin123")
+                hashed_password=get_password_hash("admin123"),
+                is_admin=True
             )
             db.add(admin_user)
             db.commit()
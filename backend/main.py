@@ -1,21 +1,71 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
 import uvicorn
 from dotenv import load_dotenv
+import asyncio
+import hmac
+import logging
 import os
 
-from database import engine, Base
-from routers import auth, patients, queue, reports, appointments
-from services.auth_service import verify_token
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from database import engine, async_engine, SessionLocal, get_db
+from routers import auth, patients, queue, reports, appointments, profiling
+from services.auth_service import METRICS_TOKEN, user_cache, verify_token
+from services.rollup_service import RollupService, ROLLUP_INTERVAL_SECONDS
+from services.export_jobs import ExportJobService
+from services.db_metrics import db_metrics, RequestMetricsMiddleware
+from services.request_profiler import request_profiler, ProfilingMiddleware, PROFILE_ID_HEADER
+from services.test_catalog import test_catalog
+from services.room_dispatcher import room_dispatcher
+from services.wait_time_estimator import wait_time_estimator, WAIT_TIME_RECONCILE_SECONDS
+from services.slot_scheduler import slot_scheduler, SLOT_INDEX_RECONCILE_SECONDS
+from services.pagination import NEXT_CURSOR_HEADER, TOTAL_ESTIMATE_HEADER
+from services.password_hasher import password_hasher
+from services.shared_state import shared_state
 
 load_dotenv("config.env")
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    # The schema is managed by migrations (alembic upgrade head), not at startup
+    if not inspect(engine).has_table("alembic_version"):
+        logger.warning("startup.schema_unmanaged run `alembic upgrade head` to create or update the database schema")
+    # Listen before loading so changes other workers make meanwhile are not missed
+    shared_state.start()
+    with SessionLocal() as db:
+        test_catalog.load(db)
+        if room_dispatcher.enabled:
+            room_dispatcher.rebuild(db)
+        wait_time_estimator.rebuild(db)
+        slot_scheduler.rebuild(db)
+    password_hasher.start()
+    rollup_task = None
+    if ROLLUP_INTERVAL_SECONDS > 0 and shared_state.is_primary:
+        rollup_task = asyncio.create_task(RollupService.run_periodically(ROLLUP_INTERVAL_SECONDS))
+    reconcile_tasks = []
+    if WAIT_TIME_RECONCILE_SECONDS > 0:
+        reconcile_tasks.append(asyncio.create_task(wait_time_estimator.run_periodically(WAIT_TIME_RECONCILE_SECONDS)))
+    if SLOT_INDEX_RECONCILE_SECONDS > 0:
+        reconcile_tasks.append(asyncio.create_task(slot_scheduler.run_periodically(SLOT_INDEX_RECONCILE_SECONDS)))
     yield
+    if rollup_task:
+        rollup_task.cancel()
+    for task in reconcile_tasks:
+        task.cancel()
+    ExportJobService.shutdown()
+    password_hasher.shutdown()
+    shared_state.shutdown()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Healthcare Queue Management System",
@@ -30,14 +80,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_ESTIMATE_HEADER, PROFILE_ID_HEADER],
 )
+if request_profiler.enabled:
+    request_profiler.instrument_routing()
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 security = HTTPBearer()
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _verified(credentials)
+
+def get_admin_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    return _admin(_verified(credentials), db)
+
+def get_metrics_reader(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    if METRICS_TOKEN and hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        return None
+    return _admin(_verified(credentials), db)
+
+def _verified(credentials: HTTPAuthorizationCredentials) -> dict:
     try:
-        payload = verify_token(credentials.credentials)
-        return payload
+        return verify_token(credentials.credentials)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,11 +110,18 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def _admin(current_user: dict, db: Session) -> dict:
+    user = user_cache.get(db, current_user["sub"])
+    if not user or not user["is_active"] or not user["is_admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(patients.router, prefix="/api/patients", tags=["Patients"], dependencies=[Depends(get_current_user)])
 app.include_router(queue.router, prefix="/api/queue", tags=["Queue Management"], dependencies=[Depends(get_current_user)])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"], dependencies=[Depends(get_current_user)])
 app.include_router(appointments.router, prefix="/api/appointments", tags=["Appointments"])
+app.include_router(profiling.router, prefix="/api/profiling", tags=["Profiling"], dependencies=[Depends(get_admin_user)])
 
 @app.get("/")
 async def root():
@@ -59,5 +131,16 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "System is running"}
 
+@app.get("/metrics", dependencies=[Depends(get_metrics_reader)])
+async def get_metrics():
+    """Connection pool state and per-endpoint SQL counts/DB time since startup."""
+    return db_metrics.snapshot()
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse, dependencies=[Depends(get_metrics_reader)])
+async def get_prometheus_metrics():
+    """The pool counters and, with PROFILING_ENABLED, per-route histograms in Prometheus text format."""
+    return PlainTextResponse(request_profiler.prometheus(db_metrics.snapshot()), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Development server; production runs serve.py
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=os.getenv("RELOAD", "false").lower() == "true")
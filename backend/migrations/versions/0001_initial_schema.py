@@ -0,0 +1,157 @@
+"""Initial schema
+
+Creates the tables that used to be created by Base.metadata.create_all.
+Tables that already exist are left untouched, so this revision can be
+applied to databases that were bootstrapped before migrations existed.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(name, *columns):
+    if not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns)
+        return True
+    return False
+
+
+def upgrade() -> None:
+    if _create_table(
+        "departments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ):
+        op.create_index("ix_departments_id", "departments", ["id"])
+        op.create_index("ix_departments_name", "departments", ["name"], unique=True)
+
+    if _create_table(
+        "rooms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("room_number", sa.String()),
+        sa.Column("department_id", sa.Integer(), sa.ForeignKey("departments.id")),
+        sa.Column("is_available", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    ):
+        op.create_index("ix_rooms_id", "rooms", ["id"])
+        op.create_index("ix_rooms_room_number", "rooms", ["room_number"], unique=True)
+
+    if _create_table(
+        "tests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("department_id", sa.Integer(), sa.ForeignKey("departments.id")),
+        sa.Column("description", sa.Text()),
+        sa.Column("estimated_duration", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    ):
+        op.create_index("ix_tests_id", "tests", ["id"])
+
+    if _create_table(
+        "patients",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("unique_id", sa.String()),
+        sa.Column("first_name", sa.String(), nullable=False),
+        sa.Column("last_name", sa.String(), nullable=False),
+        sa.Column("date_of_birth", sa.DateTime(), nullable=False),
+        sa.Column("gender", sa.String(), nullable=False),
+        sa.Column("phone", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("address", sa.Text()),
+        sa.Column("smoking", sa.Boolean()),
+        sa.Column("diabetes", sa.Boolean()),
+        sa.Column("hypertension", sa.Boolean()),
+        sa.Column("obesity", sa.Boolean()),
+        sa.Column("family_history", sa.Boolean()),
+        sa.Column("risk_level", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ):
+        op.create_index("ix_patients_id", "patients", ["id"])
+        op.create_index("ix_patients_unique_id", "patients", ["unique_id"], unique=True)
+
+    if _create_table(
+        "patient_tests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id")),
+        sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id")),
+        sa.Column("status", sa.String()),
+        sa.Column("assigned_room_id", sa.Integer(), sa.ForeignKey("rooms.id"), nullable=True),
+        sa.Column("assigned_at", sa.DateTime(timezone=True)),
+        sa.Column("started_at", sa.DateTime(timezone=True)),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        sa.Column("notes", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ):
+        op.create_index("ix_patient_tests_id", "patient_tests", ["id"])
+
+    if _create_table(
+        "appointments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id")),
+        sa.Column("room_id", sa.Integer(), sa.ForeignKey("rooms.id")),
+        sa.Column("appointment_date", sa.DateTime(), nullable=False),
+        sa.Column("estimated_wait_time", sa.Integer()),
+        sa.Column("status", sa.String()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    ):
+        op.create_index("ix_appointments_id", "appointments", ["id"])
+
+    if _create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    ):
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if _create_table(
+        "queue_metrics",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("department_id", sa.Integer(), sa.ForeignKey("departments.id")),
+        sa.Column("total_patients", sa.Integer()),
+        sa.Column("pending_tests", sa.Integer()),
+        sa.Column("completed_tests", sa.Integer()),
+        sa.Column("average_wait_time", sa.Float()),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    ):
+        op.create_index("ix_queue_metrics_id", "queue_metrics", ["id"])
+
+
+def downgrade() -> None:
+    for table in (
+        "queue_metrics",
+        "users",
+        "appointments",
+        "patient_tests",
+        "patients",
+        "tests",
+        "rooms",
+        "departments",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,54 @@
+"""Queue metrics rollup columns
+
+Turns queue_metrics into per-department hourly and daily rollups of
+patient_tests, written by services/rollup_service.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = (
+    sa.Column("granularity", sa.String(), nullable=False, server_default="day"),
+    sa.Column("total_tests", sa.Integer(), server_default="0"),
+    sa.Column("in_progress_tests", sa.Integer(), server_default="0"),
+    sa.Column("wait_time_samples", sa.Integer(), server_default="0"),
+    sa.Column("average_test_duration", sa.Float(), server_default="0"),
+    sa.Column("test_duration_samples", sa.Integer(), server_default="0"),
+    sa.Column("updated_at", sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = {column["name"] for column in inspector.get_columns("queue_metrics")}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column("queue_metrics", column)
+
+    indexes = {index["name"] for index in inspector.get_indexes("queue_metrics")}
+    if "uq_queue_metrics_bucket" not in indexes:
+        op.create_index(
+            "uq_queue_metrics_bucket",
+            "queue_metrics",
+            ["department_id", "granularity", "date"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_queue_metrics_bucket", table_name="queue_metrics")
+    for column in reversed(NEW_COLUMNS):
+        op.drop_column("queue_metrics", column.name)
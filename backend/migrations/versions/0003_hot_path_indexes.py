@@ -0,0 +1,61 @@
+"""Indexes for hot query filters
+
+Composite and partial indexes matching the queue, portal, report and
+rollup access patterns. On PostgreSQL they are built CONCURRENTLY so the
+migration does not block writes on large tables.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = "status <> 'completed'"
+ROOM_ACTIVE = "assigned_room_id IS NOT NULL AND status <> 'completed'"
+
+# (name, table, columns, partial predicate)
+INDEXES = (
+    ("ix_rooms_department_id", "rooms", ["department_id"], None),
+    ("ix_tests_department_id", "tests", ["department_id"], None),
+    ("ix_patients_created_at", "patients", ["created_at"], None),
+    ("ix_patient_tests_active", "patient_tests", ["test_id", "status"], ACTIVE),
+    ("ix_patient_tests_patient_status", "patient_tests", ["patient_id", "status"], None),
+    ("ix_patient_tests_created_at", "patient_tests", ["created_at"], None),
+    ("ix_patient_tests_updated_at", "patient_tests", ["updated_at"], None),
+    ("ix_patient_tests_room_active", "patient_tests", ["assigned_room_id"], ROOM_ACTIVE),
+    ("ix_appointments_patient_status_date", "appointments", ["patient_id", "status", "appointment_date"], None),
+    ("ix_appointments_room_date", "appointments", ["room_id", "appointment_date"], None),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            if name in {index["name"] for index in inspector.get_indexes(table)}:
+                continue
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                sqlite_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
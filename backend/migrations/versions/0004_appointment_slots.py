@@ -0,0 +1,43 @@
+"""Appointment slot columns
+
+Appointments record the test they are for and the length of the slot they
+hold, so services/slot_scheduler.py can check bookings against time
+instead of the room's single availability flag.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = (
+    sa.Column("test_id", sa.Integer(), sa.ForeignKey("tests.id", name="fk_appointments_test_id"), nullable=True),
+    sa.Column("duration_minutes", sa.Integer(), nullable=True),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing = {column["name"] for column in inspector.get_columns("appointments")}
+    # Batch mode: SQLite can only add the foreign key by rebuilding the table
+    with op.batch_alter_table("appointments") as batch:
+        for column in NEW_COLUMNS:
+            if column.name not in existing:
+                batch.add_column(column.copy())
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("appointments") as batch:
+        for column in reversed(NEW_COLUMNS):
+            batch.drop_column(column.name)
@@ -0,0 +1,62 @@
+"""Patient search indexes
+
+Prefix indexes for services/patient_search.py on PostgreSQL: lower-cased
+names, phone and UHID in the "C" collation, so ``LIKE 'abc%'`` is an
+ordered index range scan. Fuzzy name matching uses a pg_trgm GIN index,
+created when the extension can be installed. SQLite databases get
+nothing here; development search runs on an in-process index instead.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# (name, indexed expression); the search queries must use the same expressions
+PREFIX_INDEXES = (
+    ("ix_patients_last_name_prefix", 'lower(last_name) COLLATE "C"'),
+    ("ix_patients_first_name_prefix", 'lower(first_name) COLLATE "C"'),
+    ("ix_patients_phone_prefix", 'phone COLLATE "C"'),
+    ("ix_patients_unique_id_prefix", 'unique_id COLLATE "C"'),
+)
+TRIGRAM_INDEX = ("ix_patients_name_trgm", "(first_name || ' ' || last_name) gin_trgm_ops")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        for name, expression in PREFIX_INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients ({expression})")
+
+        try:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except sa.exc.DBAPIError as e:
+            logger.warning("pg_trgm is not available (%s); patient search will match prefixes only", e.orig)
+            return
+        name, expression = TRIGRAM_INDEX
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients USING gin ({expression})")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        for name, _ in (TRIGRAM_INDEX, *PREFIX_INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,40 @@
+"""Refresh tokens
+
+Revocation store for the refresh tokens issued by services/refresh_tokens.py:
+one narrow row per token, looked up by its primary key on every refresh.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("refresh_tokens"):
+        return
+    op.create_table(
+        "refresh_tokens",
+        sa.Column("jti", sa.String(32), primary_key=True),
+        sa.Column("family", sa.String(32), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime()),
+    )
+    op.create_index("ix_refresh_tokens_family", "refresh_tokens", ["family"])
+    op.create_index("ix_refresh_tokens_user_id_expires_at", "refresh_tokens", ["user_id", "expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("refresh_tokens")
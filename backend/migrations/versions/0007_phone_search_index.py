@@ -0,0 +1,47 @@
+"""Phone search index on normalized numbers
+
+The phone prefix index from 0005 covered the raw column, so numbers stored
+as "98765-43210" or "+91 98765 43210" never matched a typed "9876543210"
+or "+9198". services/patient_search.py now compares digits and "+" only;
+this replaces the index with one on the same expression. SQLite databases
+get nothing here, as in 0005.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must stay identical to PHONE_KEY_SQL in services/patient_search.py
+PHONE_INDEX = ("ix_patients_phone_key_prefix", "regexp_replace(phone, '[^0-9+]', '', 'g') COLLATE \"C\"")
+RAW_PHONE_INDEX = ("ix_patients_phone_prefix", 'phone COLLATE "C"')
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        name, expression = PHONE_INDEX
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients ({expression})")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {RAW_PHONE_INDEX[0]}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        name, expression = RAW_PHONE_INDEX
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients ({expression})")
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {PHONE_INDEX[0]}")
@@ -0,0 +1,36 @@
+"""Admin flag on users
+
+The profiling and metrics endpoints used to admit anyone logged in as a
+configured username, which /api/auth/register hands out to whoever asks
+first. They now require users.is_admin. Nobody is granted it here; init_db
+seeds the default admin with it, and existing operators are granted it
+with ``UPDATE users SET is_admin = true WHERE username = '...'``.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "is_admin" in columns:
+        return
+    op.add_column("users", sa.Column("is_admin", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("is_admin")
@@ -0,0 +1,39 @@
+"""Drop the full test_id/status index
+
+0003 used to create ix_patient_tests_test_status on (test_id, status)
+next to the partial ix_patient_tests_active on the same columns. The live
+queue filters on unfinished tests, which only the partial index serves;
+the full one only added write cost on patient_tests (the metrics count
+reads every row either way). 0003 no longer creates it; this drops it
+from databases that already have it.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = "ix_patient_tests_test_status"
+
+
+def upgrade() -> None:
+    if INDEX not in {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("patient_tests")}:
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="patient_tests", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    # Not recreated: 0003 no longer creates it either
+    pass
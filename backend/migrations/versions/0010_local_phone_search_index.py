@@ -0,0 +1,43 @@
+"""Phone search index on local numbers
+
+0007 indexes numbers as stored, digits and "+" only, so "555123" never
+found "+1 555-123-4000": the country code comes first. Patient search now
+also matches the last ten digits of each number for queries typed without
+a country code; this indexes that expression.
+SQLite databases get nothing here, as in 0005.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must stay identical to PHONE_LOCAL_KEY_SQL in services/patient_search.py
+LOCAL_PHONE_INDEX = ("ix_patients_phone_local_prefix", "right(regexp_replace(phone, '[^0-9]', '', 'g'), 10) COLLATE \"C\"")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        name, expression = LOCAL_PHONE_INDEX
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON patients ({expression})")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {LOCAL_PHONE_INDEX[0]}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -34,6 +34,9 @@ class Department(Base):
 
 class Room(Base):
     __tablename__ = "rooms"
+    __table_args__ = (
+        Index("ix_rooms_department_id", "department_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     room_number = Column(String, unique=True, index=True)
@@ -46,6 +49,9 @@ class Room(Base):
 
 class Test(Base):
     __tablename__ = "tests"
+    __table_args__ = (
+        Index("ix_tests_department_id", "department_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -59,6 +65,9 @@ class Test(Base):
 
 class Patient(Base):
     __tablename__ = "patients"
+    __table_args__ = (
+        Index("ix_patients_created_at", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     unique_id = Column(String, unique=True, index=True)
@@ -84,8 +93,24 @@ class Patient(Base):
     patient_tests = relationship("PatientTest", back_populates="patient")
     appointments = relationship("Appointment", back_populates="patient")
 
+ACTIVE_TEST_PREDICATE = text("status <> 'completed'")
+
 class PatientTest(Base):
     __tablename__ = "patient_tests"
+    __table_args__ = (
+        # Live queue and per-test waiting counts: only the small set of unfinished tests
+        Index("ix_patient_tests_active", "test_id", "status",
+              postgresql_where=ACTIVE_TEST_PREDICATE, sqlite_where=ACTIVE_TEST_PREDICATE),
+        # Patient portal and per-patient test lists
+        Index("ix_patient_tests_patient_status", "patient_id", "status"),
+        # Report date ranges and rollup buckets
+        Index("ix_patient_tests_created_at", "created_at"),
+        Index("ix_patient_tests_updated_at", "updated_at"),
+        # Rooms currently holding an unfinished test
+        Index("ix_patient_tests_room_active", "assigned_room_id",
+              postgresql_where=text("assigned_room_id IS NOT NULL AND status <> 'completed'"),
+              sqlite_where=text("assigned_room_id IS NOT NULL AND status <> 'completed'")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
@@ -105,11 +130,17 @@ class PatientTest(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_patient_status_date", "patient_id", "status", "appointment_date"),
+        Index("ix_appointments_room_date", "room_id", "appointment_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"))
     room_id = Column(Integer, ForeignKey("rooms.id"))
+    test_id = Column(Integer, ForeignKey("tests.id", name="fk_appointments_test_id"), nullable=True)
     appointment_date = Column(DateTime, nullable=False)
+    duration_minutes = Column(Integer)  # slot length; NULL means the default slot
     estimated_wait_time = Column(Integer)  # in minutes
     status = Column(String, default="scheduled")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -126,16 +157,56 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
+    # Operator endpoints (profiling, metrics); granted in the database, never through registration
+    is_admin = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+class RollupGranularity(str, enum.Enum):
+    HOUR = "hour"
+    DAY = "day"
+
 class QueueMetrics(Base):
+    """Per-department rollup of patient_tests for one hour or one day.
+
+    Buckets are keyed by PatientTest.created_at; averages cover completed
+    tests only and carry their sample counts so buckets can be combined.
+    """
     __tablename__ = "queue_metrics"
+    __table_args__ = (
+        Index("uq_queue_metrics_bucket", "department_id", "granularity", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     department_id = Column(Integer, ForeignKey("departments.id"))
+    granularity = Column(String, nullable=False, default=RollupGranularity.DAY)
     total_patients = Column(Integer, default=0)
+    total_tests = Column(Integer, default=0)
     pending_tests = Column(Integer, default=0)
+    in_progress_tests = Column(Integer, default=0)
     completed_tests = Column(Integer, default=0)
     average_wait_time = Column(Float, default=0.0)
+    wait_time_samples = Column(Integer, default=0)
+    average_test_duration = Column(Float, default=0.0)
+    test_duration_samples = Column(Integer, default=0)
     date = Column(DateTime, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime)
+
+class RefreshToken(Base):
+    """One issued refresh token, by its JWT ``jti``.
+
+    Tokens from one login share a ``family``; refreshing revokes the
+    presented token and issues the next one in the family, so presenting a
+    revoked token again means it was copied, and the whole family is revoked.
+    """
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_family", "family"),
+        Index("ix_refresh_tokens_user_id_expires_at", "user_id", "expires_at"),
+    )
+    
+    jti = Column(String(32), primary_key=True)
+    family = Column(String(32), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
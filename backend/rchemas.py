@@ -8,4 +8,5 @@ class PatientScheduleRequest(BaseModel):
     date_of_birth: str
     room_id: int
     appointment_date: datetime
+    test_id: Optional[int] = None
     estimated_wait_time: int = 30
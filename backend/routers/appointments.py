@@ -1,14 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Appointment, Patient, Room, Department, PatientTest, Test
-from schemas import AppointmentCreate, Appointment as AppointmentSchema, AppointmentAccessRequest, AppointmentAccessResponse, PatientPortalResponse, PatientTestHistory
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, selectinload
+from database import get_db, get_async_db
+from models import Appointment, Patient, Room
+from schemas import AppointmentCreate, Appointment as AppointmentSchema, AppointmentAccessRequest, AppointmentAccessResponse, PatientPortalResponse, AppointmentSlot
 from rchemas import PatientScheduleRequest
+from services.pagination import KeysetPage, column_fields, fetch_page, parse_fields
+from services.patient_portal_service import PatientPortalService
+from services.slot_scheduler import INACTIVE_STATUSES, slot_scheduler
+from services.test_catalog import test_catalog
+from services.wait_time_estimator import wait_time_estimator
 from typing import List
 from datetime import datetime, timedelta
 from sqlalchemy import and_
+import logging
+
+APPOINTMENT_SEARCH_DAYS = 7
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/health")
 def health_check():
@@ -19,7 +30,10 @@ def test_patient_portal():
     return {"message": "Patient portal test endpoint is working"}
 
 @router.post("/access-portal", response_model=AppointmentAccessResponse)
-def access_appointment_portal(access_request: AppointmentAccessRequest, db: Session = Depends(get_db)):
+async def access_appointment_portal(access_request: AppointmentAccessRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_access_appointment_portal, access_request)
+
+def _access_appointment_portal(db: Session, access_request: AppointmentAccessRequest) -> AppointmentAccessResponse:
     patient = db.query(Patient).filter(Patient.unique_id == access_request.unique_id).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -40,6 +54,11 @@ def access_appointment_portal(access_request: AppointmentAccessRequest, db: Sess
     if next_appointment:
         room_number = next_appointment.room.room_number
         estimated_wait_time = next_appointment.estimated_wait_time
+        # Due today: the live queue says more than the number stored at booking
+        if next_appointment.appointment_date.date() <= datetime.utcnow().date():
+            live_estimate = wait_time_estimator.department_wait(next_appointment.room.department_id)
+            if live_estimate is not None:
+                estimated_wait_time = live_estimate
     
     return AppointmentAccessResponse(
         patient_name=f"{patient.first_name} {patient.last_name}",
@@ -50,128 +69,139 @@ def access_appointment_portal(access_request: AppointmentAccessRequest, db: Sess
     )
 
 @router.post("/patient-portal", response_model=PatientPortalResponse)
-def access_patient_portal(access_request: AppointmentAccessRequest, db: Session = Depends(get_db)):
+async def access_patient_portal(access_request: AppointmentAccessRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        print(f"Processing patient portal request for UHID: {access_request.unique_id}")
-        
-        # Verify patient exists
-        patient = db.query(Patient).filter(Patient.unique_id == access_request.unique_id).first()
-        if not patient:
-            print(f"Patient not found for UHID: {access_request.unique_id}")
+        portal = await db.run_sync(PatientPortalService.get_portal, access_request.unique_id)
+        if portal is None:
+            logger.info("patient_portal.not_found unique_id=%s", access_request.unique_id)
             raise HTTPException(status_code=404, detail="Patient not found")
         
-        print(f"Patient found: {patient.first_name} {patient.last_name}")
-        
         # Verify date of birth
-        dob_str = patient.date_of_birth.strftime("%Y-%m-%d")
+        dob_str, response = portal
         if dob_str != access_request.date_of_birth:
-            print(f"Date of birth mismatch for patient {patient.id}")
+            logger.info("patient_portal.dob_mismatch unique_id=%s", access_request.unique_id)
             raise HTTPException(status_code=401, detail="Invalid date of birth")
         
-        print(f"Date of birth verified for patient {patient.id}")
-        
-        # Get all patient tests - use simpler query first
-        print(f"Fetching patient tests for patient {patient.id}")
-        patient_tests = db.query(PatientTest).filter(PatientTest.patient_id == patient.id).all()
-        print(f"Found {len(patient_tests)} patient tests")
-        
-        upcoming_tests = []
-        completed_tests = []
-        
-        for pt in patient_tests:
-            try:
-                # Get test and department info separately to avoid complex joins
-                test = db.query(Test).filter(Test.id == pt.test_id).first()
-                department = db.query(Department).filter(Department.id == test.department_id).first() if test else None
-                room = db.query(Room).filter(Room.id == pt.assigned_room_id).first() if pt.assigned_room_id else None
-                
-                test_history = PatientTestHistory(
-                    id=pt.id,
-                    test_name=test.name if test else "Unknown Test",
-                    department=department.name if department else "Unknown Department",
-                    status=pt.status,
-                    appointment_date=pt.assigned_at,
-                    room_number=room.room_number if room else None,
-                    assigned_at=pt.assigned_at,
-                    started_at=pt.started_at,
-                    completed_at=pt.completed_at,
-                    notes=pt.notes
-                )
-                
-                if pt.status in ["pending", "in_progress"]:
-                    upcoming_tests.append(test_history)
-                elif pt.status == "completed":
-                    completed_tests.append(test_history)
-                    
-                print(f"Processed test {pt.id}: {test.name if test else 'Unknown'} - Status: {pt.status}")
-                
-            except Exception as e:
-                print(f"Error processing patient test {pt.id}: {str(e)}")
-                continue
-        
-        print(f"Successfully processed {len(upcoming_tests)} upcoming tests and {len(completed_tests)} completed tests")
-        
-        return PatientPortalResponse(
-            patient_name=f"{patient.first_name} {patient.last_name}",
-            unique_id=patient.unique_id,
-            upcoming_tests=upcoming_tests,
-            completed_tests=completed_tests,
-            message="Access granted successfully"
-        )
+        return response
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
-    except Exception as e:
-        # Log unexpected errors and return a generic error
-        print(f"Unexpected error in patient-portal endpoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("patient_portal.error unique_id=%s", access_request.unique_id)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/create", response_model=AppointmentSchema)
 def create_appointment(appointment_data: AppointmentCreate, db: Session = Depends(get_db)):
-    # Check if room is available
-    room = db.query(Room).filter(Room.id == appointment_data.room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not room.is_available:
-        raise HTTPException(status_code=400, detail="Room is not available")
-    
     # Check if patient exists
     patient = db.query(Patient).filter(Patient.id == appointment_data.patient_id).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
+    # Check the time slot, not the room's live availability flag
+    duration_minutes = appointment_data.duration_minutes or slot_scheduler.duration_for(db, appointment_data.test_id)
+    _book_slot(db, appointment_data.room_id, appointment_data.appointment_date, duration_minutes)
+    
     # Create appointment
     appointment = Appointment(**appointment_data.dict())
+    appointment.duration_minutes = duration_minutes
+    # Today's queue says nothing about a later day; the portal fills in the
+    # live estimate once the appointment is due
+    if appointment.estimated_wait_time is None and appointment.appointment_date.date() <= datetime.utcnow().date():
+        appointment.estimated_wait_time = wait_time_estimator.department_wait(db.get(Room, appointment.room_id).department_id)
     db.add(appointment)
     db.commit()
     db.refresh(appointment)
+    slot_scheduler.track(appointment)
     
     return appointment
 
+def _book_slot(db: Session, room_id: int, start: datetime, duration_minutes: int, appointment_id: int = None) -> None:
+    # The index rejects taken slots without SQL; the database check under the
+    # room lock is what guarantees no overlap. A moved appointment is in the
+    # index itself, so it skips the shortcut.
+    if appointment_id is None and not slot_scheduler.is_free(room_id, start, duration_minutes):
+        raise HTTPException(status_code=400, detail="Time slot is not available")
+    
+    free = slot_scheduler.reserve(db, room_id, start, duration_minutes, appointment_id)
+    if free is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not free:
+        raise HTTPException(status_code=400, detail="Time slot is not available")
+
 @router.get("/", response_model=List[AppointmentSchema])
-def get_appointments(
+async def get_appointments(
     patient_id: int = None,
     room_id: int = None,
     status: str = None,
-    db: Session = Depends(get_db)
+    limit: int = 100,
+    cursor: str = None,
+    sort: str = "id",
+    fields: str = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Appointment)
+    """Appointments, ``limit`` at a time; paged like ``GET /api/patients/``."""
+    try:
+        page = KeysetPage(Appointment.id, sort=sort, cursor=cursor, limit=limit)
+        field_names = parse_fields(fields, column_fields(Appointment, AppointmentSchema))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await db.run_sync(_get_appointments, patient_id, room_id, status, page, field_names)
+
+def _get_appointments(
+    db: Session,
+    patient_id: int = None,
+    room_id: int = None,
+    status: str = None,
+    page: KeysetPage = None,
+    fields: List[str] = None
+) -> JSONResponse:
+    filters = []
     
     if patient_id:
-        query = query.filter(Appointment.patient_id == patient_id)
+        filters.append(Appointment.patient_id == patient_id)
     
     if room_id:
-        query = query.filter(Appointment.room_id == room_id)
+        filters.append(Appointment.room_id == room_id)
     
     if status:
-        query = query.filter(Appointment.status == status)
+        filters.append(Appointment.status == status)
     
-    appointments = query.all()
-    return appointments
+    # Serialized here, with patients and rooms loaded per page instead of per row
+    return fetch_page(
+        db, page or KeysetPage(Appointment.id), Appointment, AppointmentSchema, fields, filters,
+        options=(selectinload(Appointment.patient), selectinload(Appointment.room).selectinload(Room.department))
+    )
+
+@router.get("/available-slots", response_model=List[AppointmentSlot])
+def get_available_slots(
+    test_id: int = None,
+    department_id: int = None,
+    room_id: int = None,
+    start: datetime = None,
+    end: datetime = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Free slots in ``room_id``, ``department_id`` or the test's department, earliest first."""
+    if test_id and not department_id:
+        test = test_catalog.get(db).tests.get(test_id)
+        if not test:
+            raise HTTPException(status_code=404, detail="Test not found")
+        department_id = test.department_id
+    
+    if room_id:
+        room_ids = [room_id]
+    elif department_id:
+        room_ids = slot_scheduler.rooms_for_department(department_id)
+    else:
+        raise HTTPException(status_code=400, detail="Specify test_id, department_id or room_id")
+    
+    start = start or datetime.now()
+    end = end or start + timedelta(days=APPOINTMENT_SEARCH_DAYS)
+    return slot_scheduler.available_slots(
+        room_ids, start, end, slot_scheduler.duration_for(db, test_id), max(1, min(limit, 500))
+    )
 
 @router.get("/available-rooms")
 def get_available_rooms(department_id: int = None, db: Session = Depends(get_db)):
@@ -185,13 +215,17 @@ def get_available_rooms(department_id: int = None, db: Session = Depends(get_db)
 
 @router.get("/patient/available-rooms")
 def get_patient_available_rooms(department_id: int = None, db: Session = Depends(get_db)):
-    query = db.query(Room).filter(Room.is_available == True)
+    # Rooms with a free slot in the booking window; is_available only says
+    # whether a room is occupied right now
+    query = db.query(Room)
     
     if department_id:
         query = query.filter(Room.department_id == department_id)
     
-    rooms = query.all()
-    return rooms
+    start = datetime.now()
+    end = start + timedelta(days=APPOINTMENT_SEARCH_DAYS)
+    duration_minutes = slot_scheduler.duration_for(db, None)
+    return [room for room in query.all() if slot_scheduler.available_slots([room.id], start, end, duration_minutes, 1)]
 
 @router.post("/patient/schedule", response_model=AppointmentSchema)
 def patient_schedule_appointment(
@@ -208,19 +242,17 @@ def patient_schedule_appointment(
     if dob_str != schedule_request.date_of_birth:
         raise HTTPException(status_code=401, detail="Invalid date of birth")
     
-    # Check if room is available
-    room = db.query(Room).filter(Room.id == schedule_request.room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not room.is_available:
-        raise HTTPException(status_code=400, detail="Room is not available")
+    # Check if the time slot is free
+    duration_minutes = slot_scheduler.duration_for(db, schedule_request.test_id)
+    _book_slot(db, schedule_request.room_id, schedule_request.appointment_date, duration_minutes)
     
     # Create appointment
     appointment_data = {
         "patient_id": patient.id,
         "room_id": schedule_request.room_id,
+        "test_id": schedule_request.test_id,
         "appointment_date": schedule_request.appointment_date,
+        "duration_minutes": duration_minutes,
         "estimated_wait_time": schedule_request.estimated_wait_time,
         "status": "scheduled"
     }
@@ -229,11 +261,15 @@ def patient_schedule_appointment(
     db.add(appointment)
     db.commit()
     db.refresh(appointment)
+    slot_scheduler.track(appointment)
     
     return appointment
 
 @router.get("/patient/{patient_id}/schedule")
-def get_patient_schedule(patient_id: int, db: Session = Depends(get_db)):
+async def get_patient_schedule(patient_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_get_patient_schedule, patient_id)
+
+def _get_patient_schedule(db: Session, patient_id: int) -> List[dict]:
     appointments = db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
     
     schedule = []
@@ -259,15 +295,18 @@ def update_appointment_status(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
+    # Reopening a cancelled or completed appointment takes its slot back
+    if appointment.status in INACTIVE_STATUSES and status not in INACTIVE_STATUSES:
+        duration_minutes = appointment.duration_minutes or slot_scheduler.duration_for(db, appointment.test_id)
+        _book_slot(db, appointment.room_id, appointment.appointment_date, duration_minutes, appointment.id)
+    
     appointment.status = status
     appointment.updated_at = datetime.utcnow()
     
-    if status == "completed":
-        room = appointment.room
-        room.is_available = True
-    
     db.commit()
     db.refresh(appointment)
+    # Completed and cancelled appointments free their slot
+    slot_scheduler.track(appointment)
     return {"message": "Appointment status updated successfully", "appointment": appointment}
 
 @router.post("/{appointment_id}/assign-room")
@@ -280,25 +319,16 @@ def assign_room_to_appointment(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    room = db.query(Room).filter(Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not room.is_available:
-        raise HTTPException(status_code=400, detail="Room is not available")
-    
-    # Free up previous room if any
-    if appointment.room_id:
-        old_room = db.query(Room).filter(Room.id == appointment.room_id).first()
-        if old_room:
-            old_room.is_available = True
+    # Same time slot in the new room
+    duration_minutes = appointment.duration_minutes or slot_scheduler.duration_for(db, appointment.test_id)
+    _book_slot(db, room_id, appointment.appointment_date, duration_minutes, appointment.id)
     
     appointment.room_id = room_id
-    room.is_available = False
     appointment.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(appointment)
+    slot_scheduler.track(appointment)
     return {"message": "Room assigned successfully", "appointment": appointment}
 
 @router.get("/{appointment_id}", response_model=AppointmentSchema)
@@ -321,9 +351,13 @@ def update_appointment(
     for field, value in appointment_data.dict().items():
         setattr(appointment, field, value)
     
+    appointment.duration_minutes = appointment.duration_minutes or slot_scheduler.duration_for(db, appointment.test_id)
+    _book_slot(db, appointment.room_id, appointment.appointment_date, appointment.duration_minutes, appointment.id)
+    
     appointment.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(appointment)
+    slot_scheduler.track(appointment)
     return appointment
 
 @router.delete("/{appointment_id}")
@@ -334,4 +368,5 @@ def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
     
     db.delete(appointment)
     db.commit()
+    slot_scheduler.forget(appointment_id)
     return {"message": "Appointment deleted successfully"}
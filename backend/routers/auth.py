@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db
 from models import User
-from schemas import UserCreate, User as UserSchema, Token
-from services.auth_service import verify_password, get_password_hash, create_access_token, get_current_user
+from schemas import UserCreate, User as UserSchema, Token, RefreshTokenRequest
+from services.auth_service import create_access_token, get_current_user, user_cache
+from services.refresh_token_service import RefreshTokenService, InvalidRefreshToken
+from services.login_rate_limiter import login_rate_limiter
+from services.password_hasher import password_hasher, PasswordHashBusy
 from datetime import timedelta
 from dotenv import load_dotenv
 import os
@@ -14,16 +18,14 @@ load_dotenv("config.env")
 router = APIRouter()
 
 @router.post("/register", response_model=UserSchema)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await db.run_sync(_find_user, user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    if await db.run_sync(_find_user, None, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await _hash_or_busy(password_hasher.hash(user.password))
     db_user = User(
         username=user.username,
         email=user.email,
@@ -31,30 +33,90 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    limit_key = f"{request.client.host if request.client else ''}|{form_data.username.lower()}"
+    retry_after = login_rate_limiter.hit(limit_key)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+    
+    user = await db.run_sync(_find_user, form_data.username)
+    verified = False
+    if user:
+        verified, new_hash = await _hash_or_busy(password_hasher.verify(form_data.password, user.hashed_password))
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    login_rate_limiter.reset(limit_key)
+    if new_hash:
+        # Stored at an older bcrypt cost; upgrade while the password is at hand
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    refresh_token, family = await db.run_sync(RefreshTokenService.issue, user)
+    return _tokens(user.username, family, refresh_token)
+
+@router.post("/refresh", response_model=Token)
+def refresh(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    try:
+        user, refresh_token, family = RefreshTokenService.rotate(db, request.refresh_token)
+    except InvalidRefreshToken:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return _tokens(user.username, family, refresh_token)
+
+@router.post("/logout")
+def logout(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    try:
+        RefreshTokenService.revoke(db, request.refresh_token)
+    except InvalidRefreshToken:
+        # Nothing left to revoke; the client is logged out either way
+        pass
+    return {"message": "Logged out successfully"}
+
+def _tokens(username: str, family: str, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")))
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username, "fam": family}, expires_delta=access_token_expires
     )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+def _find_user(db: Session, username: str = None, email: str = None) -> User:
+    query = db.query(User)
+    if username is not None:
+        query = query.filter(User.username == username)
+    if email is not None:
+        query = query.filter(User.email == email)
+    return query.first()
+
+async def _hash_or_busy(hashing):
+    try:
+        return await hashing
+    except PasswordHashBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
 
 @router.get("/me", response_model=UserSchema)
 def get_current_user_info(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == current_user["sub"]).first()
+    user = user_cache.get(db, current_user["sub"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
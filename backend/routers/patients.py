@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db
 from models import Patient, PatientTest, Test, Department
-from schemas import PatientCreate, Patient as PatientSchema, PatientTest as PatientTestSchema, PatientRegistrationResponse
+from schemas import PatientCreate, Patient as PatientSchema, PatientTest as PatientTestSchema, PatientRegistrationResponse, BulkRegistrationResponse, PatientSearchResult
 from services.test_assignment_service import TestAssignmentService
+from services.queue_service import QueueService
+from services.patient_portal_service import PatientPortalService
+from services.test_catalog import test_catalog
+from services.room_dispatcher import room_dispatcher
+from services.patient_registration_service import PatientRegistrationService, BULK_REGISTER_MAX_ROWS
+from services.patient_search import PatientSearchService, PATIENT_SEARCH_LIMIT_MAX, PATIENT_SEARCH_MIN_LENGTH
+from services.pagination import KeysetPage, column_fields, fetch_page, parse_fields
 from typing import List
 from datetime import datetime
 
@@ -35,6 +43,13 @@ def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db))
     for test in assigned_tests:
         db.refresh(test)
     
+    # Serializing assigned_tests then resolves test/department from the cache
+    test_catalog.attach(db)
+    
+    QueueService.record_new_tests(db, assigned_tests)
+    QueueService.publish_changes(db, [test.id for test in assigned_tests])
+    room_dispatcher.enqueue(db, assigned_tests, risk_level)
+    
     return PatientRegistrationResponse(
         patient=db_patient,
         assigned_tests=assigned_tests,
@@ -42,10 +57,63 @@ def register_patient(patient_data: PatientCreate, db: Session = Depends(get_db))
         message=f"Patient registered successfully with {len(assigned_tests)} tests assigned"
     )
 
+@router.post("/bulk-register", response_model=BulkRegistrationResponse)
+async def bulk_register_patients(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Register many patients from a JSON array or a CSV file (body or multipart ``file``)."""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Missing 'file' form field")
+            rows = PatientRegistrationService.parse_csv((await upload.read()).decode("utf-8-sig"))
+        elif "csv" in content_type:
+            rows = PatientRegistrationService.parse_csv((await request.body()).decode("utf-8-sig"))
+        else:
+            rows = await request.json()
+            if isinstance(rows, dict):
+                rows = rows.get("patients")
+    except (UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of patients or a UTF-8 CSV file")
+    
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=400, detail="No patients to register")
+    if len(rows) > BULK_REGISTER_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_REGISTER_MAX_ROWS} patients per request")
+    
+    return await db.run_sync(PatientRegistrationService.bulk_register, rows)
+
 @router.get("/", response_model=List[PatientSchema])
-def get_patients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    patients = db.query(Patient).offset(skip).limit(limit).all()
-    return patients
+def get_patients(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    sort: str = "id",
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    """Patients, ``limit`` at a time; the next page is ``cursor=<X-Next-Cursor header>``."""
+    try:
+        page = KeysetPage(Patient.id, Patient.created_at, sort, cursor, limit)
+        field_names = parse_fields(fields, column_fields(Patient, PatientSchema))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if skip and not cursor:
+        patients = db.query(Patient).order_by(Patient.id).offset(skip).limit(limit).all()
+        return patients
+    
+    return fetch_page(db, page, Patient, PatientSchema, field_names)
+
+@router.get("/search", response_model=List[PatientSearchResult])
+def search_patients(q: str, limit: int = 20, db: Session = Depends(get_db)):
+    """Patients whose UHID, phone or name starts with ``q`` (``"jo sm"`` finds John Smith), then close spellings, best match first."""
+    if len(q.strip()) < PATIENT_SEARCH_MIN_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Search needs at least {PATIENT_SEARCH_MIN_LENGTH} characters")
+    if not 1 <= limit <= PATIENT_SEARCH_LIMIT_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {PATIENT_SEARCH_LIMIT_MAX}")
+    return PatientSearchService.search(db, q, limit)
 
 @router.get("/{patient_id}", response_model=PatientSchema)
 def get_patient(patient_id: int, db: Session = Depends(get_db)):
@@ -73,6 +141,7 @@ def update_patient(patient_id: int, patient_data: PatientCreate, db: Session = D
     
     db.commit()
     db.refresh(patient)
+    PatientPortalService.invalidate_patient(patient.id)
     return patient
 
 @router.delete("/{patient_id}")
@@ -83,6 +152,7 @@ def delete_patient(patient_id: int, db: Session = Depends(get_db)):
     
     db.delete(patient)
     db.commit()
+    PatientPortalService.invalidate_patient(patient_id)
     return {"message": "Patient deleted successfully"}
 
 @router.get("/search/{unique_id}", response_model=PatientSchema)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Response, status
+from services.request_profiler import request_profiler
+
+router = APIRouter()
+
+@router.get("")
+def get_profiling_summary():
+    """This worker's per-route latency, SQL and serialization stats, and every worker's captured profiles."""
+    return request_profiler.snapshot()
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str):
+    profile = request_profiler.profile(profile_id)
+    if profile is None:
+        # Only the latest PROFILE_KEEP are kept
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    
+    return Response(
+        content=profile["data"],
+        media_type=profile["media_type"],
+        headers={"Content-Disposition": f"attachment; filename={profile['filename']}"}
+    )
+
+@router.delete("")
+def reset_profiling():
+    request_profiler.reset()
+    return {"message": "Profiling data cleared"}
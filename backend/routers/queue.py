@@ -1,56 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
-from models import PatientTest, Patient, Test, Department, Room
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from database import get_db, get_async_db, AsyncSessionLocal
+from models import PatientTest, Test, Department, Room
 from schemas import QueueStatus, QueueUpdateRequest, PatientTest as PatientTestSchema
+from services.pagination import KeysetPage, PAGE_SIZE_MAX, parse_fields
+from services.queue_events import queue_event_bus
+from services.queue_service import QueueService
+from services.patient_portal_service import PatientPortalService
+from services.room_allocation_service import RoomAllocationService
+from services.room_dispatcher import room_dispatcher
+from services.wait_time_estimator import wait_time_estimator
 from typing import List
 from datetime import datetime
-from sqlalchemy import and_
+from sqlalchemy import select
+import json
+
+STREAM_KEEPALIVE_SECONDS = 15
 
 router = APIRouter()
 
 @router.get("/status", response_model=List[QueueStatus])
-def get_queue_status(department_id: int = None, db: Session = Depends(get_db)):
-    query = db.query(PatientTest).join(Patient).join(Test).join(Department)
-    
-    if department_id:
-        query = query.filter(Department.id == department_id)
-    
-    patient_tests = query.filter(PatientTest.status != "completed").all()
-    
-    queue_status = []
-    for pt in patient_tests:
-        wait_time = None
-        if pt.assigned_at:
-            wait_time = int((datetime.utcnow() - pt.assigned_at).total_seconds() / 60)
-        
-        queue_status.append(QueueStatus(
-            id=pt.id,
-            patient_id=pt.patient.id,
-            unique_id=pt.patient.unique_id,
-            patient_name=f"{pt.patient.first_name} {pt.patient.last_name}",
-            test_name=pt.test.name,
-            department=pt.test.department.name,
-            status=pt.status,
-            room_number=pt.room.room_number if pt.room else None,
-            wait_time=wait_time,
-            created_at=pt.created_at
-        ))
-    
-    return queue_status
+async def get_queue_status(
+    department_id: int = None,
+    limit: int = None,
+    cursor: str = None,
+    sort: str = "id",
+    fields: str = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The active queue; whole by default, in pages once ``limit`` or ``cursor`` is given."""
+    if limit is None and cursor is None and fields is None:
+        return await db.run_sync(QueueService.get_queue_status, department_id=department_id)
+    
+    try:
+        page = KeysetPage(PatientTest.id, PatientTest.created_at, sort, cursor, limit or PAGE_SIZE_MAX)
+        field_names = parse_fields(fields, QueueStatus.model_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await db.run_sync(QueueService.get_queue_page, page, department_id=department_id, fields=field_names)
+
+async def _load_queue_snapshot(department_id: int = None):
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(QueueService.get_queue_status, department_id=department_id)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.get("/stream")
+async def stream_queue(request: Request, department_id: int = None):
+    """Server-sent events feed: one snapshot, then upsert/remove deltas."""
+    async def event_stream():
+        # Subscribe before taking the snapshot so no change slips in between
+        subscriber = queue_event_bus.subscribe()
+        try:
+            snapshot = await _load_queue_snapshot(department_id)
+            yield _sse("snapshot", snapshot)
+
+            while not await request.is_disconnected():
+                event = await queue_event_bus.next_event(subscriber, STREAM_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if department_id and event.get("department_id") not in (None, department_id):
+                    continue
+
+                if event["type"] == "resync":
+                    snapshot = await _load_queue_snapshot(department_id)
+                    yield _sse("snapshot", snapshot)
+                else:
+                    yield _sse(event["type"], event)
+        finally:
+            queue_event_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/departments")
-def get_departments(db: Session = Depends(get_db)):
-    departments = db.query(Department).all()
+async def get_departments(db: AsyncSession = Depends(get_async_db)):
+    departments = (await db.scalars(select(Department))).all()
     return departments
 
 @router.get("/rooms")
-def get_rooms(department_id: int = None, db: Session = Depends(get_db)):
-    query = db.query(Room)
+async def get_rooms(department_id: int = None, db: AsyncSession = Depends(get_async_db)):
+    query = select(Room)
     if department_id:
         query = query.filter(Room.department_id == department_id)
     
-    rooms = query.all()
+    rooms = (await db.scalars(query)).all()
     return rooms
 
 @router.put("/update-status")
@@ -59,69 +102,69 @@ def update_test_status(update_data: QueueUpdateRequest, db: Session = Depends(ge
     if not patient_test:
         raise HTTPException(status_code=404, detail="Patient test not found")
     
+    old_status = patient_test.status
     patient_test.status = update_data.status
     patient_test.updated_at = datetime.utcnow()
+    if update_data.status != "pending":
+        room_dispatcher.discard(db, patient_test.id)
     
+    dispatched = None
     if update_data.status == "in_progress":
         patient_test.started_at = datetime.utcnow()
         if update_data.room_id:
+            # Take the room in one statement unless this test already holds it
+            if update_data.room_id != patient_test.assigned_room_id and not RoomAllocationService.claim(db, update_data.room_id):
+                if not db.get(Room, update_data.room_id):
+                    raise HTTPException(status_code=404, detail="Room not found")
+                raise HTTPException(status_code=400, detail="Room is not available")
             patient_test.assigned_room_id = update_data.room_id
-            room = db.query(Room).filter(Room.id == update_data.room_id).first()
-            if room:
-                room.is_available = False
     elif update_data.status == "completed":
         patient_test.completed_at = datetime.utcnow()
-        if patient_test.assigned_room_id:
-            room = db.query(Room).filter(Room.id == patient_test.assigned_room_id).first()
-            if room:
-                room.is_available = True
+        room = patient_test.room
+        if room:
+            # Hand the room straight to the next waiting patient, if any
+            dispatched = room_dispatcher.dispatch(db, room)
+            if not dispatched:
+                RoomAllocationService.release(db, room.id)
     
     if update_data.notes:
         patient_test.notes = update_data.notes
     
     db.commit()
     db.refresh(patient_test)
-    return {"message": "Status updated successfully", "patient_test": patient_test}
-
-@router.get("/metrics")
-def get_queue_metrics(db: Session = Depends(get_db)):
-    total_pending = db.query(PatientTest).filter(PatientTest.status == "pending").count()
-    total_in_progress = db.query(PatientTest).filter(PatientTest.status == "in_progress").count()
-    total_completed = db.query(PatientTest).filter(PatientTest.status == "completed").count()
-    
-    departments = db.query(Department).all()
-    dept_metrics = []
-    
-    for dept in departments:
-        pending = db.query(PatientTest).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "pending")
-        ).count()
-        
-        in_progress = db.query(PatientTest).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "in_progress")
-        ).count()
-        
-        completed = db.query(PatientTest).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "completed")
-        ).count()
-        
-        dept_metrics.append({
-            "department": dept.name,
-            "pending": pending,
-            "in_progress": in_progress,
-            "completed": completed
-        })
-    
+    if update_data.status == "pending" and old_status != "pending" and patient_test.assigned_room_id is None:
+        # Back in line, e.g. a cancellation undone
+        room_dispatcher.enqueue(db, [patient_test], patient_test.patient.risk_level)
+    QueueService.record_status_change(patient_test, old_status)
+    QueueService.publish_changes(db, [patient_test.id] + ([dispatched.patient_test_id] if dispatched else []))
+    PatientPortalService.invalidate_patient(patient_test.patient_id)
+    if dispatched:
+        PatientPortalService.invalidate_patient(dispatched.patient_id)
     return {
-        "total_pending": total_pending,
-        "total_in_progress": total_in_progress,
-        "total_completed": total_completed,
-        "department_metrics": dept_metrics
+        "message": "Status updated successfully",
+        "patient_test": patient_test,
+        "dispatched_patient_test_id": dispatched.patient_test_id if dispatched else None
     }
 
+@router.get("/wait-times")
+async def get_wait_times():
+    """Learned per-test durations and the current estimated wait per department."""
+    return wait_time_estimator.snapshot()
+
+@router.get("/metrics")
+async def get_queue_metrics(db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(QueueService.get_queue_metrics)
+
 @router.get("/patient/{patient_id}/tests", response_model=List[PatientTestSchema])
-def get_patient_queue_tests(patient_id: int, db: Session = Depends(get_db)):
-    patient_tests = db.query(PatientTest).filter(PatientTest.patient_id == patient_id).all()
+async def get_patient_queue_tests(patient_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Eager loads: an async session cannot lazy-load during serialization
+    patient_tests = (await db.scalars(
+        select(PatientTest).options(
+            selectinload(PatientTest.patient),
+            selectinload(PatientTest.test).selectinload(Test.department),
+            selectinload(PatientTest.room).selectinload(Room.department)
+        ).filter(PatientTest.patient_id == patient_id)
+    )).all()
     return patient_tests
 
 @router.post("/assign-room")
@@ -130,17 +173,40 @@ def assign_room_to_test(patient_test_id: int, room_id: int, db: Session = Depend
     if not patient_test:
         raise HTTPException(status_code=404, detail="Patient test not found")
     
-    room = db.query(Room).filter(Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    if not room.is_available:
+    # Check and take the room in one statement; a concurrent request gets 400
+    if not RoomAllocationService.claim(db, room_id):
+        if not db.get(Room, room_id):
+            raise HTTPException(status_code=404, detail="Room not found")
         raise HTTPException(status_code=400, detail="Room is not available")
     
     patient_test.assigned_room_id = room_id
     patient_test.assigned_at = datetime.utcnow()
-    room.is_available = False
+    room_dispatcher.discard(db, patient_test.id)
     
     db.commit()
     db.refresh(patient_test)
+    QueueService.publish_changes(db, [patient_test.id])
+    PatientPortalService.invalidate_patient(patient_test.patient_id)
     return {"message": "Room assigned successfully", "patient_test": patient_test}
+
+@router.post("/dispatch")
+def dispatch_next_patient(room_id: int, db: Session = Depends(get_db)):
+    """Call the highest-priority waiting patient of the room's department into an idle room."""
+    if not room_dispatcher.enabled:
+        raise HTTPException(status_code=400, detail="Room dispatcher is disabled")
+    
+    if not RoomAllocationService.claim(db, room_id):
+        if not db.get(Room, room_id):
+            raise HTTPException(status_code=404, detail="Room not found")
+        raise HTTPException(status_code=400, detail="Room is not available")
+    
+    dispatched = room_dispatcher.dispatch(db, db.get(Room, room_id))
+    if not dispatched:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="No patient waiting for this department")
+    
+    db.commit()
+    patient_test = db.get(PatientTest, dispatched.patient_test_id)
+    QueueService.publish_changes(db, [patient_test.id])
+    PatientPortalService.invalidate_patient(patient_test.patient_id)
+    return {"message": "Patient dispatched successfully", "patient_test": patient_test}
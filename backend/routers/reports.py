@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
-from models import PatientTest, Patient, Test, Department, Room
+from starlette.background import BackgroundTask
+from database import get_db, get_async_db, SessionLocal
+from models import PatientTest, Patient, Department
 from schemas import ReportRequest
 from services.export_service import ExportService
+from services.rollup_service import RollupService
+from services.report_service import ReportService, PATIENT_COMPLETION_COLUMNS
+from services.export_jobs import ExportJobService, EXPORT_INLINE_PDF_MAX_ROWS
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
-from sqlalchemy import and_, func
-import io
+from datetime import datetime
+from sqlalchemy import and_
+import os
+import re
+
+RANGE_CHUNK_SIZE = 64 * 1024
 
 router = APIRouter()
 
@@ -19,68 +27,34 @@ def get_patient_completion_report(
     department_id: int = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(PatientTest).join(Patient).join(Test).join(Department)
-    
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-        query = query.filter(PatientTest.created_at >= start_dt)
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-        query = query.filter(PatientTest.created_at <= end_dt)
+    start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00')) if start_date else None
+    end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00')) if end_date else None
     
-    if department_id:
-        query = query.filter(Department.id == department_id)
-    
-    patient_tests = query.all()
-    
-    report_data = []
-    for pt in patient_tests:
-        wait_time = None
-        if pt.assigned_at and pt.started_at:
-            wait_time = int((pt.started_at - pt.assigned_at).total_seconds() / 60)
-        
-        test_duration = None
-        if pt.started_at and pt.completed_at:
-            test_duration = int((pt.completed_at - pt.started_at).total_seconds() / 60)
-        
-        report_data.append({
-            "Patient ID": pt.patient.unique_id,
-            "Patient Name": f"{pt.patient.first_name} {pt.patient.last_name}",
-            "Test": pt.test.name,
-            "Department": pt.test.department.name,
-            "Status": pt.status,
-            "Room": pt.room.room_number if pt.room else "Not Assigned",
-            "Wait Time (min)": wait_time or "N/A",
-            "Test Duration (min)": test_duration or "N/A",
-            "Created": pt.created_at.strftime("%Y-%m-%d %H:%M"),
-            "Completed": pt.completed_at.strftime("%Y-%m-%d %H:%M") if pt.completed_at else "N/A"
-        })
-    
-    return report_data
+    return list(ReportService.iter_patient_completion_rows(db, start_dt, end_dt, department_id))
+
+def _patient_completion_rows(start_date: datetime, end_date: datetime, department_id: int = None):
+    # Own session: a streamed body outlives the request's dependencies
+    db = SessionLocal()
+    try:
+        yield from ReportService.iter_patient_completion_rows(db, start_date, end_date, department_id)
+    finally:
+        db.close()
 
 @router.get("/department-efficiency")
-def get_department_efficiency_report(db: Session = Depends(get_db)):
+async def get_department_efficiency_report(db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_department_efficiency_report)
+
+def _department_efficiency_report(db: Session) -> List[Dict[str, Any]]:
     departments = db.query(Department).all()
+    department_stats = RollupService.department_stats(db)
     efficiency_data = []
     
     for dept in departments:
-        total_tests = db.query(PatientTest).join(Test).filter(Test.department_id == dept.id).count()
-        completed_tests = db.query(PatientTest).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "completed")
-        ).count()
-        
-        avg_wait_time = db.query(
-            func.avg(func.extract('epoch', PatientTest.started_at - PatientTest.assigned_at) / 60)
-        ).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "completed")
-        ).scalar() or 0
-        
-        avg_test_duration = db.query(
-            func.avg(func.extract('epoch', PatientTest.completed_at - PatientTest.started_at) / 60)
-        ).join(Test).filter(
-            and_(Test.department_id == dept.id, PatientTest.status == "completed")
-        ).scalar() or 0
+        stats = department_stats.get(dept.id)
+        total_tests = stats.total_tests if stats else 0
+        completed_tests = stats.completed_tests if stats else 0
+        avg_wait_time = stats.average_wait_time if stats else 0
+        avg_test_duration = stats.average_test_duration if stats else 0
         
         efficiency_data.append({
             "Department": dept.name,
@@ -94,7 +68,10 @@ def get_department_efficiency_report(db: Session = Depends(get_db)):
     return efficiency_data
 
 @router.get("/daily-summary")
-def get_daily_summary_report(date: str = None, db: Session = Depends(get_db)):
+async def get_daily_summary_report(date: str = None, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_daily_summary_report, date)
+
+def _daily_summary_report(db: Session, date: str = None) -> Dict[str, Any]:
     if date:
         target_date = datetime.fromisoformat(date).date()
     else:
@@ -135,76 +112,137 @@ def get_daily_summary_report(date: str = None, db: Session = Depends(get_db)):
 
 @router.post("/export")
 def export_report(report_request: ReportRequest, db: Session = Depends(get_db)):
-    if report_request.format.lower() == "pdf":
-        report_data = get_patient_completion_report(
-            start_date=report_request.start_date.isoformat(),
-            end_date=report_request.end_date.isoformat(),
-            department_id=report_request.department_id,
-            db=db
-        )
-        
-        buffer, content_type, filename = ExportService.export_data(
-            report_data, "pdf", "Patient Completion Report"
-        )
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.getvalue()),
-            media_type=content_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+    if report_request.format.lower() not in ("pdf", "csv", "excel"):
+        raise HTTPException(status_code=400, detail="Unsupported export format")
     
-    elif report_request.format.lower() == "csv":
-        report_data = get_patient_completion_report(
-            start_date=report_request.start_date.isoformat(),
-            end_date=report_request.end_date.isoformat(),
-            department_id=report_request.department_id,
-            db=db
-        )
-        
-        buffer, content_type, filename = ExportService.export_data(
-            report_data, "csv", "Patient Completion Report"
-        )
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.getvalue()),
-            media_type=content_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+    background = report_request.background
+    if not background and report_request.format.lower() == "pdf":
+        background = ReportService.count_patient_completion_rows(
+            db, report_request.start_date, report_request.end_date, report_request.department_id
+        ) > EXPORT_INLINE_PDF_MAX_ROWS
+    
+    if background:
+        job = ExportJobService.submit(
+            report_request.start_date,
+            report_request.end_date,
+            report_request.department_id,
+            report_request.format
         )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=_job_response(job))
+    
+    rows = _patient_completion_rows(
+        report_request.start_date,
+        report_request.end_date,
+        report_request.department_id
+    )
+    
+    chunks, content_type, filename, temp_path = ExportService.stream_export(
+        rows, PATIENT_COMPLETION_COLUMNS, report_request.format, "Patient Completion Report"
+    )
+    
+    return StreamingResponse(
+        chunks,
+        media_type=content_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        # Runs even if the client leaves before the body is read
+        background=BackgroundTask(ExportService.remove_temp_file, temp_path)
+    )
+
+def _job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    total_rows = job.get("total_rows")
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "format": job.get("format"),
+        "rows_written": job.get("rows_written", 0),
+        "total_rows": total_rows,
+        "progress": round(job.get("rows_written", 0) / total_rows * 100, 1) if total_rows else (100.0 if job["status"] == "completed" else 0.0),
+        "size": job.get("size"),
+        "error": job.get("error"),
+        "status_url": f"/api/reports/export/jobs/{job['job_id']}",
+        "download_url": f"/api/reports/export/jobs/{job['job_id']}/download" if job["status"] == "completed" else None
+    }
+
+@router.get("/export/jobs/{job_id}")
+def get_export_job(job_id: str):
+    job = ExportJobService.read_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return _job_response(job)
+
+def _iter_file_range(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@router.get("/export/jobs/{job_id}/download")
+def download_export_job(job_id: str, request: Request):
+    job = ExportJobService.read_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    
+    path = ExportJobService.file_path(job_id, job["format"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    
+    size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={job['filename']}"
+    }
     
-    elif report_request.format.lower() == "excel":
-        report_data = get_patient_completion_report(
-            start_date=report_request.start_date.isoformat(),
-            end_date=report_request.end_date.isoformat(),
-            department_id=report_request.department_id,
-            db=db
-        )
-        
-        buffer, content_type, filename = ExportService.export_data(
-            report_data, "excel", "Patient Completion Report"
-        )
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.getvalue()),
-            media_type=content_type,
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+    # Single byte range (bytes=start-end, bytes=start- or bytes=-suffix) for resumable downloads
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", "").strip())
+    if not match or match.groups() == ("", ""):
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file_range(path, 0, size), media_type=job["content_type"], headers=headers)
     
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
     else:
-        raise HTTPException(status_code=400, detail="Unsupported export format")
+        start = max(size - int(last), 0)
+        end = size - 1
+    
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file_range(path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=job["content_type"],
+        headers=headers
+    )
 
 @router.get("/performance-metrics")
-def get_performance_metrics(db: Session = Depends(get_db)):
+async def get_performance_metrics(db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_performance_metrics)
+
+def _performance_metrics(db: Session) -> Dict[str, Any]:
     total_patients = db.query(Patient).count()
-    total_tests = db.query(PatientTest).count()
-    completed_tests = db.query(PatientTest).filter(PatientTest.status == "completed").count()
     
-    avg_wait_time = db.query(
-        func.avg(func.extract('epoch', PatientTest.started_at - PatientTest.assigned_at) / 60)
-    ).filter(PatientTest.status == "completed").scalar() or 0
+    department_stats = RollupService.department_stats(db).values()
+    total_tests = sum(stats.total_tests for stats in department_stats)
+    completed_tests = sum(stats.completed_tests for stats in department_stats)
+    
+    wait_time_samples = sum(stats.wait_time_samples for stats in department_stats)
+    avg_wait_time = sum(stats.wait_time_total for stats in department_stats) / wait_time_samples if wait_time_samples else 0
     
-    avg_test_duration = db.query(
-        func.avg(func.extract('epoch', PatientTest.completed_at - PatientTest.started_at) / 60)
-    ).filter(PatientTest.status == "completed").scalar() or 0
+    test_duration_samples = sum(stats.test_duration_samples for stats in department_stats)
+    avg_test_duration = sum(stats.test_duration_total for stats in department_stats) / test_duration_samples if test_duration_samples else 0
     
     return {
         "total_patients": total_patients,
@@ -13,6 +13,7 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     is_active: bool
+    is_admin: bool = False
     created_at: datetime
     
     class Config:
@@ -21,6 +22,10 @@ class User(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -101,6 +106,15 @@ class Patient(PatientBase):
     class Config:
         from_attributes = True
 
+class PatientSearchResult(BaseModel):
+    id: int
+    unique_id: str
+    first_name: str
+    last_name: str
+    phone: Optional[str] = None
+    date_of_birth: datetime
+    score: float
+
 class PatientTestBase(BaseModel):
     patient_id: int
     test_id: int
@@ -129,6 +143,8 @@ class AppointmentBase(BaseModel):
     patient_id: int
     room_id: int
     appointment_date: datetime
+    test_id: Optional[int] = None
+    duration_minutes: Optional[int] = None
     estimated_wait_time: Optional[int] = None
 
 class AppointmentCreate(AppointmentBase):
@@ -145,6 +161,12 @@ class Appointment(AppointmentBase):
     class Config:
         from_attributes = True
 
+class AppointmentSlot(BaseModel):
+    room_id: int
+    room_number: str
+    start: datetime
+    end: datetime
+
 class QueueStatus(BaseModel):
     id: int
     patient_id: int
@@ -155,6 +177,7 @@ class QueueStatus(BaseModel):
     status: str
     room_number: Optional[str] = None
     wait_time: Optional[int] = None
+    estimated_wait_time: Optional[int] = None
     created_at: datetime
 
 class PatientRegistrationResponse(BaseModel):
@@ -163,6 +186,23 @@ class PatientRegistrationResponse(BaseModel):
     risk_level: str
     message: str
 
+class BulkRegisteredPatient(BaseModel):
+    row: int
+    patient_id: int
+    unique_id: str
+    risk_level: str
+    assigned_tests: List[str]
+
+class BulkRegistrationError(BaseModel):
+    row: int
+    errors: List[str]
+
+class BulkRegistrationResponse(BaseModel):
+    registered: int
+    failed: int
+    patients: List[BulkRegisteredPatient]
+    errors: List[BulkRegistrationError]
+
 class TestAssignmentRequest(BaseModel):
     patient_id: int
     test_ids: List[int]
@@ -178,6 +218,7 @@ class ReportRequest(BaseModel):
     end_date: datetime
     department_id: Optional[int] = None
     format: str = "json"
+    background: bool = False
 
 class AppointmentAccessRequest(BaseModel):
     unique_id: str
@@ -0,0 +1,178 @@
+"""Production launcher: WEB_CONCURRENCY uvicorn workers on one listening socket.
+
+Workers default to one per CPU core. Their caches, indexes and live feeds
+stay coherent through services.shared_state; with the default local
+backend this process relays their messages over a Unix socket. A worker
+that dies is replaced.
+
+- SIGHUP: rolling restart, one worker at a time; each replacement is
+  serving before the worker it replaces stops accepting and drains
+- SIGTERM / SIGINT: drain in-flight requests (at most GRACEFUL_TIMEOUT
+  seconds) and exit
+
+Run from the backend directory:
+
+    python serve.py
+"""
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import uvicorn
+
+load_dotenv("config.env")
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+# Seconds a stopping worker gets to finish its requests (live feeds are cut off after it)
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Seconds a new worker gets to start serving before a rolling restart gives up
+STARTUP_TIMEOUT = 120
+# A worker dying sooner than this after starting is replaced only after a pause
+MIN_UPTIME_SECONDS = 5
+
+logger = logging.getLogger("serve")
+
+class _Server(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets: Optional[List[socket.socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.ready.set()
+
+def _run_worker(config: uvicorn.Config, sockets: List[socket.socket], index: int, ready):
+    # Before the app is imported: modules read it at import time
+    os.environ["WORKER_INDEX"] = str(index)
+    _Server(config, ready).run(sockets=sockets)
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        # index -> (process, start time, its ready event; kept referenced until the child has it)
+        self._processes: Dict[int, Tuple[multiprocessing.Process, float, object]] = {}
+        self._sockets: List[socket.socket] = []
+        self._signals: List[int] = []
+        self._wake = threading.Event()
+
+    def run(self):
+        hub = self._start_hub()
+        self._sockets = [self.config.bind_socket()]
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, self._on_signal)
+        logger.info("serve.started pid=%d workers=%d", os.getpid(), self.workers)
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            while True:
+                self._wake.wait(0.5)
+                self._wake.clear()
+                if signal.SIGINT in self._signals or signal.SIGTERM in self._signals:
+                    break
+                if signal.SIGHUP in self._signals:
+                    self._signals.remove(signal.SIGHUP)
+                    self._restart()
+                self._replace_dead()
+        finally:
+            self._stop([process for process, _, _ in self._processes.values()])
+            for sock in self._sockets:
+                sock.close()
+            if hub is not None:
+                hub.close()
+            logger.info("serve.stopped")
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+        self._wake.set()
+
+    def _start_hub(self):
+        from services.shared_state import SHARED_STATE_BACKEND, LocalHub
+        if SHARED_STATE_BACKEND != "local" or self.workers < 2:
+            return None
+        path = os.getenv("SHARED_STATE_SOCKET") or os.path.join(tempfile.gettempdir(), f"mhcqms-{os.getpid()}.sock")
+        hub = LocalHub(path)
+        hub.start()
+        # Inherited by the workers, which connect to it
+        os.environ["SHARED_STATE_SOCKET"] = path
+        return hub
+
+    def _spawn(self, index: int) -> Tuple[multiprocessing.Process, object]:
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=_run_worker,
+            kwargs={"config": self.config, "sockets": self._sockets, "index": index, "ready": ready},
+            name=f"worker-{index}"
+        )
+        process.start()
+        self._processes[index] = (process, time.monotonic(), ready)
+        logger.info("serve.worker_started index=%d pid=%d", index, process.pid)
+        return process, ready
+
+    def _replace_dead(self):
+        for index, (process, started, _) in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            logger.warning("serve.worker_died index=%d pid=%d exitcode=%s", index, process.pid, process.exitcode)
+            if time.monotonic() - started < MIN_UPTIME_SECONDS:
+                # Crashing at startup (bad config, database down): do not spin
+                time.sleep(MIN_UPTIME_SECONDS)
+            self._spawn(index)
+
+    def _restart(self):
+        logger.info("serve.restarting workers=%d", self.workers)
+        for index in range(self.workers):
+            old = self._processes[index]
+            new, ready = self._spawn(index)
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while not ready.wait(0.5):
+                if not new.is_alive() or time.monotonic() > deadline or self._stopping():
+                    logger.error("serve.restart_aborted index=%d pid=%d", index, new.pid)
+                    self._stop([new])
+                    self._processes[index] = old
+                    return
+            self._stop([old[0]])
+        logger.info("serve.restarted workers=%d", self.workers)
+
+    def _stopping(self) -> bool:
+        return signal.SIGINT in self._signals or signal.SIGTERM in self._signals
+
+    def _stop(self, processes: List[multiprocessing.Process]):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("serve.worker_killed pid=%d", process.pid)
+                process.kill()
+                process.join()
+
+def main():
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s"
+    )
+    config = uvicorn.Config(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        proxy_headers=True,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT
+    )
+    Supervisor(config, WEB_CONCURRENCY).run()
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,188 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User
+from schemas import User as UserSchema
+from services.password_hasher import BCRYPT_ROUNDS
+from services.shared_state import shared_state
 from dotenv import load_dotenv
+import logging
 import os
+import threading
+import time
 
 load_dotenv("config.env")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Verified tokens kept per worker (0 disables the cache)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+AUTH_USER_CACHE_SECONDS = float(os.getenv("AUTH_USER_CACHE_SECONDS", "60"))
+# "auto" decodes with PyJWT when it is installed, else python-jose
+JWT_BACKEND = os.getenv("JWT_BACKEND", "auto").lower()
+# Bearer token a metrics scraper may send instead of an admin user's access token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+def _jwt_backend(name: str):
+    """(decode function, exception types) for the JWT library to verify tokens with.
+
+    PyJWT is optional (``pip install PyJWT``): it verifies the HS256 tokens
+    issued here with less overhead than python-jose. Tokens are still
+    issued by python-jose, and either library accepts the other's.
+    """
+    if name in ("auto", "pyjwt"):
+        try:
+            import jwt as pyjwt
+            return pyjwt.decode, (pyjwt.PyJWTError,)
+        except ImportError:
+            if name == "pyjwt":
+                logger.warning("auth.jwt_backend_missing backend=pyjwt falling back to python-jose")
+    return jwt.decode, (JWTError,)
+
+_decode_jwt, _JWT_ERRORS = _jwt_backend(JWT_BACKEND)
+
+class TokenCache:
+    """Bounded LRU of verified token -> claims.
+
+    A hit skips the signature check and claim decoding. Entries are only
+    served until the token's own ``exp``, so caching never extends a
+    token's life; only successfully verified tokens are stored.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return dict(claims)
+
+    def put(self, token: str, claims: dict):
+        if self.size <= 0:
+            return
+        expires_at = float(claims["exp"]) if claims.get("exp") is not None else float("inf")
+        with self._lock:
+            self._entries[token] = (dict(claims), expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE)
+
+class RevokedFamilies:
+    """Login sessions (refresh token families) revoked recently.
+
+    Access tokens are not looked up anywhere, so after a logout the ones
+    already handed out would stay valid until they expire. They carry
+    their family as ``fam``; verify_token refuses those whose family is
+    listed here, cached or not. An entry is only kept for as long as an
+    access token issued before the revocation can live. Revocations reach
+    the other server workers through services.shared_state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until: Dict[str, float] = {}
+
+    def revoke(self, family: str, broadcast: bool = True):
+        if broadcast:
+            shared_state.publish("auth.family_revoked", {"family": family})
+        now = time.time()
+        with self._lock:
+            self._until[family] = now + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            for expired in [f for f, until in self._until.items() if until <= now]:
+                del self._until[expired]
+
+    def __contains__(self, family: Optional[str]) -> bool:
+        if family is None or not self._until:
+            return False
+        with self._lock:
+            until = self._until.get(family)
+        return until is not None and until > time.time()
+
+revoked_families = RevokedFamilies()
+
+shared_state.subscribe("auth.family_revoked", lambda message: revoked_families.revoke(message["family"], broadcast=False))
+
+class UserCache:
+    """username -> serialized User row for ``/api/auth/me``.
+
+    Commits that insert, update or delete a User clear it, in every worker
+    when they share state (services.shared_state), so e.g. a deactivation
+    shows at once; otherwise other workers pick the change up within
+    AUTH_USER_CACHE_SECONDS.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users: Dict[str, Tuple[dict, float]] = {}
+
+    def get(self, db: Session, username: str) -> Optional[dict]:
+        with self._lock:
+            cached = self._users.get(username)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            return None
+        record = UserSchema.model_validate(user).model_dump()
+        if self.ttl > 0:
+            with self._lock:
+                self._users[username] = (record, time.monotonic())
+        return record
+
+    def invalidate(self):
+        with self._lock:
+            self._users.clear()
+
+user_cache = UserCache(AUTH_USER_CACHE_SECONDS)
+
+def _mark_users_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info["auth_users_changed"] = True
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(User, _event, _mark_users_changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users_on_commit(session):
+    if session.info.pop("auth_users_changed", False):
+        user_cache.invalidate()
+        shared_state.publish("auth.users_changed")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_users_on_rollback(session):
+    session.info.pop("auth_users_changed", None)
+
+shared_state.subscribe("auth.users_changed", lambda message: user_cache.invalidate(), resync=user_cache.invalidate)
+
+# For scripts (init_db); request handlers hash through services.password_hasher
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -33,27 +202,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return _decode_jwt(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except _JWT_ERRORS:
+        raise JWTError("Invalid token")
+
+def verify_token(token: str):
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = decode_token(token)
         username: str = payload.get("sub")
-        if username is None:
+        # Refresh tokens are only good for /api/auth/refresh
+        if username is None or payload.get("typ") == "refresh":
             raise JWTError("Invalid token")
-        return payload
-    except JWTError:
+        token_cache.put(token, payload)
+    if payload.get("fam") in revoked_families:
         raise JWTError("Invalid token")
+    return payload
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return payload
+        return verify_token(credentials.credentials)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,179 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import Any, Dict, List, Optional
+import threading
+import time
+
+class RequestStats:
+    __slots__ = ("statements", "db_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+
+# Set by RequestMetricsMiddleware; threadpool handlers inherit a copy of the
+# context, so they update the same object
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+class DatabaseMetrics:
+    """Process-wide pool and per-endpoint SQL counters behind ``GET /metrics``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Any] = {}
+        self._pool_stats: Dict[str, Dict[str, float]] = {}
+        self._endpoints: Dict[str, Dict[str, float]] = {}
+
+    def instrument(self, name: str, engine):
+        """Track checkouts and SQL timings for an engine (pass ``sync_engine`` for async ones)."""
+        self._pools[name] = engine.pool
+        self._pool_stats[name] = {"checkouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "failures": 0}
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_started"].pop()
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.statements += 1
+                stats.db_time += elapsed
+
+    def record_checkout(self, name: str, waited: float, failed: bool = False):
+        with self._lock:
+            stats = self._pool_stats.get(name)
+            if stats is None:
+                return
+            stats["checkouts"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            if failed:
+                stats["failures"] += 1
+
+    def record_request(self, endpoint: str, duration: float, stats: RequestStats, status_code: int):
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "statements": 0, "db_seconds": 0.0
+            })
+            totals["requests"] += 1
+            totals["errors"] += status_code >= 500
+            totals["seconds"] += duration
+            totals["max_seconds"] = max(totals["max_seconds"], duration)
+            totals["statements"] += stats.statements
+            totals["db_seconds"] += stats.db_time
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = {}
+            for name, pool in self._pools.items():
+                stats = self._pool_stats[name]
+                pools[name] = {
+                    **self._pool_state(pool),
+                    "checkouts": stats["checkouts"],
+                    "failed_checkouts": stats["failures"],
+                    "avg_wait_ms": round(stats["wait_seconds"] / stats["checkouts"] * 1000, 3) if stats["checkouts"] else 0.0,
+                    "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 3)
+                }
+
+            endpoints = {}
+            for endpoint, totals in sorted(self._endpoints.items()):
+                requests = totals["requests"]
+                endpoints[endpoint] = {
+                    "requests": requests,
+                    "errors": totals["errors"],
+                    "avg_ms": round(totals["seconds"] / requests * 1000, 3),
+                    "max_ms": round(totals["max_seconds"] * 1000, 3),
+                    "avg_statements": round(totals["statements"] / requests, 2),
+                    "avg_db_ms": round(totals["db_seconds"] / requests * 1000, 3),
+                    "db_share": round(totals["db_seconds"] / totals["seconds"], 3) if totals["seconds"] else 0.0
+                }
+
+        return {"pools": pools, "endpoints": endpoints}
+
+    @staticmethod
+    def _pool_state(pool) -> Dict[str, Any]:
+        if not isinstance(pool, QueuePool):
+            return {"class": type(pool).__name__}
+        return {
+            "class": type(pool).__name__,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0)
+        }
+
+    def reset(self):
+        with self._lock:
+            for stats in self._pool_stats.values():
+                stats.update(checkouts=0, wait_seconds=0.0, max_wait_seconds=0.0, failures=0)
+            self._endpoints.clear()
+
+db_metrics = DatabaseMetrics()
+
+class _TimedCheckoutMixin:
+    """Times how long a checkout waits for a free (or new) connection.
+
+    Failures are pool timeouts (``DB_POOL_TIMEOUT``) or connect errors.
+    """
+
+    metrics_name = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            db_metrics.record_checkout(self.metrics_name, time.perf_counter() - started, failed=True)
+            raise
+        db_metrics.record_checkout(self.metrics_name, time.perf_counter() - started)
+        return connection
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics_name = "sync"
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording duration, SQL statements and DB time per route.
+
+    Also adds a ``Server-Timing`` header so the numbers show up in browser
+    dev tools. Streamed bodies are only counted up to the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                headers: List = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f"db;dur={stats.db_time * 1000:.1f};desc=\"{stats.statements} queries\", app;dur={elapsed:.1f}".encode()
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+            db_metrics.record_request(endpoint, time.perf_counter() - started, stats, status_code)
@@ -0,0 +1,284 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from dotenv import load_dotenv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+load_dotenv("config.env")
+
+EXPORT_JOB_DIR = os.getenv("EXPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "mhcqms-exports"))
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_TTL_SECONDS = int(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+# reportlab keeps every page in memory until the file is saved: larger PDF
+# exports run as background jobs, outside the server worker
+EXPORT_INLINE_PDF_MAX_ROWS = int(os.getenv("EXPORT_INLINE_PDF_MAX_ROWS", "20000"))
+PROGRESS_EVERY_ROWS = 1000
+# The worker that submitted a job touches its lock file this often until it finishes;
+# a queued or running job whose lock is older than HEARTBEAT_TIMEOUT_SECONDS was lost
+HEARTBEAT_SECONDS = 10
+HEARTBEAT_TIMEOUT_SECONDS = 3 * HEARTBEAT_SECONDS
+
+FILE_EXTENSIONS = {"pdf": "pdf", "csv": "csv", "excel": "xlsx"}
+
+logger = logging.getLogger(__name__)
+
+def _status_path(job_id: str) -> str:
+    return os.path.join(EXPORT_JOB_DIR, f"{job_id}.json")
+
+def _lock_path(job_id: str) -> str:
+    return os.path.join(EXPORT_JOB_DIR, f"{job_id}.lock")
+
+def _lock_alive(job_id: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(_lock_path(job_id)) < HEARTBEAT_TIMEOUT_SECONDS
+    except FileNotFoundError:
+        return False
+
+def _write_status(job_id: str, status: Dict[str, Any]):
+    # Atomic replace so readers in other workers never see a partial file
+    path = _status_path(job_id)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(status, file)
+    os.replace(f"{path}.tmp", path)
+
+def _run_export(job_id: str, params: Dict[str, Any]):
+    """Runs in a pool process: writes the export file and its status to disk."""
+    from database import SessionLocal
+    from services.export_service import ExportService
+    from services.report_service import ReportService, PATIENT_COMPLETION_COLUMNS
+
+    status = ExportJobService.read_status(job_id)
+    status.update(status="running", started_at=datetime.utcnow().isoformat())
+    _write_status(job_id, status)
+
+    start_date = datetime.fromisoformat(params["start_date"])
+    end_date = datetime.fromisoformat(params["end_date"])
+    db = SessionLocal()
+    try:
+        status["total_rows"] = ReportService.count_patient_completion_rows(
+            db, start_date, end_date, params["department_id"]
+        )
+        _write_status(job_id, status)
+
+        def counted_rows():
+            for rows_written, row in enumerate(ReportService.iter_patient_completion_rows(
+                db, start_date, end_date, params["department_id"]
+            ), 1):
+                if rows_written % PROGRESS_EVERY_ROWS == 0:
+                    status["rows_written"] = rows_written
+                    _write_status(job_id, status)
+                yield row
+                status["rows_written"] = rows_written
+
+        chunks, content_type, filename, temp_path = ExportService.stream_export(
+            counted_rows(), PATIENT_COMPLETION_COLUMNS, params["format"], "Patient Completion Report"
+        )
+
+        path = ExportJobService.file_path(job_id, params["format"])
+        # Per process: a run orphaned by a dead server worker may still be writing its own
+        part_path = f"{path}.{os.getpid()}.part"
+        try:
+            with open(part_path, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        finally:
+            ExportService.remove_temp_file(temp_path)
+        os.replace(part_path, path)
+
+        status.update(
+            status="completed",
+            content_type=content_type,
+            filename=filename,
+            size=os.path.getsize(path),
+            finished_at=datetime.utcnow().isoformat()
+        )
+        _write_status(job_id, status)
+    except Exception as e:
+        status.update(status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+        _write_status(job_id, status)
+        raise
+    finally:
+        db.close()
+
+class ExportJobService:
+    """Report exports run in a local process pool, deduplicated by request.
+
+    Job state lives next to the output file in EXPORT_JOB_DIR, so any
+    server worker can report status or serve the finished download. The
+    worker that submits a job first creates ``{job_id}.lock`` (O_EXCL, so
+    one worker wins) and keeps touching it until the job is done; a queued
+    or running job without a fresh lock died with its worker and reads as
+    failed, so the next request resubmits it.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _lock = threading.Lock()
+    _in_flight: Set[str] = set()
+    _heartbeat: Optional[threading.Thread] = None
+
+    @staticmethod
+    def job_id(start_date: datetime, end_date: datetime, department_id: Optional[int], format_type: str) -> str:
+        key = f"{start_date.isoformat()}|{end_date.isoformat()}|{department_id}|{format_type.lower()}"
+        return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+    @staticmethod
+    def file_path(job_id: str, format_type: str) -> str:
+        return os.path.join(EXPORT_JOB_DIR, f"{job_id}.{FILE_EXTENSIONS[format_type.lower()]}")
+
+    @staticmethod
+    def read_status(job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(_status_path(job_id)) as file:
+                status = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if status["status"] in ("queued", "running") and not _lock_alive(job_id):
+            status.update(status="failed", error="The export was interrupted by a server restart")
+        return status
+
+    @staticmethod
+    def _get_executor() -> ProcessPoolExecutor:
+        with ExportJobService._lock:
+            if ExportJobService._executor is None:
+                # Spawned, not forked: children must not inherit the event loop or pooled connections
+                ExportJobService._executor = ProcessPoolExecutor(
+                    max_workers=EXPORT_JOB_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return ExportJobService._executor
+
+    @staticmethod
+    def _is_reusable(status: Optional[Dict[str, Any]]) -> bool:
+        if status is None or status["status"] == "failed":
+            return False
+        return time.time() - status["submitted"] < EXPORT_JOB_TTL_SECONDS
+
+    @staticmethod
+    def _claim(job_id: str) -> bool:
+        """Create the job's lock file; False if another live worker holds it."""
+        path = _lock_path(job_id)
+        for _ in range(2):
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                if _lock_alive(job_id):
+                    return False
+                # Left by a worker that died: move it aside (only one claimer can) and retry
+                stale_path = f"{path}.{os.getpid()}.stale"
+                try:
+                    os.rename(path, stale_path)
+                except FileNotFoundError:
+                    continue
+                if time.time() - os.path.getmtime(stale_path) < HEARTBEAT_TIMEOUT_SECONDS:
+                    # Another worker broke the stale lock and claimed the job in between
+                    os.rename(stale_path, path)
+                    return False
+                os.remove(stale_path)
+        return False
+
+    @staticmethod
+    def _release(job_id: str):
+        with ExportJobService._lock:
+            ExportJobService._in_flight.discard(job_id)
+        try:
+            os.remove(_lock_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _beat():
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with ExportJobService._lock:
+                job_ids = list(ExportJobService._in_flight)
+            for job_id in job_ids:
+                try:
+                    os.utime(_lock_path(job_id))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def submit(start_date: datetime, end_date: datetime, department_id: Optional[int], format_type: str) -> Dict[str, Any]:
+        os.makedirs(EXPORT_JOB_DIR, exist_ok=True)
+        job_id = ExportJobService.job_id(start_date, end_date, department_id, format_type)
+
+        status = ExportJobService.read_status(job_id)
+        if ExportJobService._is_reusable(status):
+            return status
+        if not ExportJobService._claim(job_id):
+            # Another worker is submitting the same export right now
+            return ExportJobService.read_status(job_id) or {
+                "job_id": job_id, "status": "queued", "format": format_type.lower(), "rows_written": 0, "total_rows": None
+            }
+
+        with ExportJobService._lock:
+            ExportJobService._in_flight.add(job_id)
+            if ExportJobService._heartbeat is None:
+                ExportJobService._heartbeat = threading.Thread(target=ExportJobService._beat, name="export-job-heartbeat", daemon=True)
+                ExportJobService._heartbeat.start()
+
+        try:
+            status = {
+                "job_id": job_id,
+                "status": "queued",
+                "format": format_type.lower(),
+                "submitted": time.time(),
+                "rows_written": 0,
+                "total_rows": None,
+                "error": None
+            }
+            _write_status(job_id, status)
+
+            params = {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "department_id": department_id,
+                "format": format_type.lower()
+            }
+            future = ExportJobService._get_executor().submit(_run_export, job_id, params)
+        except Exception:
+            ExportJobService._release(job_id)
+            raise
+        future.add_done_callback(lambda f: ExportJobService._on_done(job_id, f))
+        ExportJobService.cleanup()
+        return status
+
+    @staticmethod
+    def _on_done(job_id: str, future):
+        ExportJobService._release(job_id)
+        error = None if future.cancelled() else future.exception()
+        if error is None:
+            return
+        logger.error("export_job.failed job_id=%s error=%s", job_id, error)
+        status = ExportJobService.read_status(job_id) or {"job_id": job_id, "submitted": time.time()}
+        if status.get("status") != "failed":
+            # The worker died before it could record the failure itself
+            status.update(status="failed", error=str(error))
+            _write_status(job_id, status)
+
+    @staticmethod
+    def cleanup():
+        """Delete job files older than the dedup window."""
+        cutoff = time.time() - EXPORT_JOB_TTL_SECONDS
+        for name in os.listdir(EXPORT_JOB_DIR):
+            path = os.path.join(EXPORT_JOB_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def shutdown():
+        with ExportJobService._lock:
+            if ExportJobService._executor is not None:
+                ExportJobService._executor.shutdown(wait=False, cancel_futures=True)
+                ExportJobService._executor = None
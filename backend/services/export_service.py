@@ -1,28 +1,125 @@
-import pandas as pd
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from io import BytesIO
+from io import StringIO
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import csv
 import json
+import os
+import tempfile
+# reportlab and openpyxl are imported by the methods that use them:
+# most workers never export, and loading them slows every cold start
+
+STREAM_CHUNK_SIZE = 64 * 1024
+PDF_ROWS_PER_TABLE = 500
+
+class _LazyStory(list):
+    """A story that pulls its next flowables from ``pending`` as ``doc.build`` consumes it.
+
+    build() only ever looks at the front of the list and deletes what it
+    has drawn, so at most a couple of page-sized tables of rows are in
+    memory, however many rows the report has.
+    """
+
+    def __init__(self, flowables, pending: Iterator):
+        super().__init__(flowables)
+        self._pending = pending
+
+    def __len__(self) -> int:
+        # build() checks len() before each flowable; keep one queued behind the current one
+        while list.__len__(self) < 2:
+            flowable = next(self._pending, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return list.__len__(self)
 
 class ExportService:
     
     @staticmethod
-    def export_to_pdf(data: List[Dict[str, Any]], title: str, filename: str = None) -> BytesIO:
-        buffer = BytesIO()
+    def _iter_file(path: str) -> Iterator[bytes]:
+        with open(path, "rb") as file:
+            while True:
+                chunk = file.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    
+    @staticmethod
+    def remove_temp_file(path: Optional[str]):
+        """Deletes a file from stream_export, whether or not its chunks were read."""
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def _temp_path(suffix: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        return path
+    
+    @staticmethod
+    def stream_csv(rows: Iterable[Dict[str, Any]], headers: List[str]) -> Iterator[bytes]:
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
         
-        if filename is None:
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
         
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    
+    @staticmethod
+    def write_excel(rows: Iterable[Dict[str, Any]], headers: List[str]) -> str:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, PatternFill
+        from openpyxl.utils import get_column_letter
+
+        # Write-only workbooks flush rows to disk instead of keeping cells in memory
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Report")
         
+        # Widths must be set before any row is written in write-only mode
+        for col, header in enumerate(headers, 1):
+            ws.column_dimensions[get_column_letter(col)].width = min(max(len(header) + 2, 18), 50)
+        
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = Font(bold=True)
+            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+            cell.alignment = Alignment(horizontal="center")
+            header_cells.append(cell)
+        ws.append(header_cells)
+        
+        for row in rows:
+            ws.append([str(row.get(header, '')) for header in headers])
+        
+        path = ExportService._temp_path(".xlsx")
+        try:
+            wb.save(path)
+        except BaseException:
+            ExportService.remove_temp_file(path)
+            raise
+        return path
+    
+    @staticmethod
+    def write_pdf(rows: Iterable[Dict[str, Any]], headers: List[str], title: str) -> str:
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+
+        # Many page-sized tables lay out far faster than one giant Table
+        path = ExportService._temp_path(".pdf")
+        doc = SimpleDocTemplate(path, pagesize=A4)
         styles = getSampleStyleSheet()
         title_style = ParagraphStyle(
             'CustomTitle',
@@ -31,110 +128,52 @@ class ExportService:
             spaceAfter=30,
             alignment=1
         )
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
         
-        elements.append(Paragraph(title, title_style))
-        elements.append(Spacer(1, 20))
-        
-        if data:
-            headers = list(data[0].keys())
-            table_data = [headers]
-            
-            for row in data:
-                table_data.append([str(row.get(header, '')) for header in headers])
-            
-            table = Table(table_data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            
-            elements.append(table)
+        def tables():
+            table_rows = []
+            for row in rows:
+                table_rows.append([str(row.get(header, '')) for header in headers])
+                if len(table_rows) >= PDF_ROWS_PER_TABLE:
+                    yield Table([headers] + table_rows, style=table_style, repeatRows=1)
+                    table_rows = []
+            if table_rows:
+                yield Table([headers] + table_rows, style=table_style, repeatRows=1)
         
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
+        try:
+            doc.build(_LazyStory([Paragraph(title, title_style), Spacer(1, 20)], tables()))
+        except BaseException:
+            ExportService.remove_temp_file(path)
+            raise
+        return path
     
     @staticmethod
-    def export_to_csv(data: List[Dict[str, Any]], filename: str = None) -> BytesIO:
-        buffer = BytesIO()
-        
-        if filename is None:
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        
-        if data:
-            df = pd.DataFrame(data)
-            df.to_csv(buffer, index=False)
-        
-        buffer.seek(0)
-        return buffer
-    
-    @staticmethod
-    def export_to_excel(data: List[Dict[str, Any]], title: str, filename: str = None) -> BytesIO:
-        buffer = BytesIO()
-        
-        if filename is None:
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Report"
-        
-        if data:
-            headers = list(data[0].keys())
-            
-            # Write headers
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Write data
-            for row, data_row in enumerate(data, 2):
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=row, column=col, value=str(data_row.get(header, '')))
-                    cell.alignment = Alignment(horizontal="center")
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-        
-        wb.save(buffer)
-        buffer.seek(0)
-        return buffer
-    
-    @staticmethod
-    def export_data(data: List[Dict[str, Any]], format_type: str, title: str) -> tuple[BytesIO, str, str]:
+    def stream_export(rows: Iterable[Dict[str, Any]], headers: List[str], format_type: str, title: str) -> tuple[Iterator[bytes], str, str, Optional[str]]:
+        """(chunks, content type, filename, temp file).
+
+        PDF and Excel are built in a temp file first; the caller deletes it
+        with remove_temp_file once the response is done, read or not. CSV
+        is streamed as it is written and has no temp file.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if format_type.lower() == "csv":
+            return ExportService.stream_csv(rows, headers), "text/csv", f"report_{timestamp}.csv", None
         if format_type.lower() == "pdf":
-            buffer = ExportService.export_to_pdf(data, title)
-            content_type = "application/pdf"
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        elif format_type.lower() == "csv":
-            buffer = ExportService.export_to_csv(data)
-            content_type = "text/csv"
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        elif format_type.lower() == "excel":
-            buffer = ExportService.export_to_excel(data, title)
-            content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        else:
-            buffer = ExportService.export_to_excel(data, title)
-            content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
-        return buffer, content_type, filename
+            path = ExportService.write_pdf(rows, headers, title)
+            return ExportService._iter_file(path), "application/pdf", f"report_{timestamp}.pdf", path
+        path = ExportService.write_excel(rows, headers)
+        return (
+            ExportService._iter_file(path),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            f"report_{timestamp}.xlsx",
+            path
+        )
@@ -0,0 +1,75 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+from services.shared_state import shared_state
+from dotenv import load_dotenv
+import os
+import threading
+import time
+
+load_dotenv("config.env")
+
+# Login attempts allowed per client address and username within the window (0 disables)
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", "10"))
+LOGIN_RATE_WINDOW_SECONDS = float(os.getenv("LOGIN_RATE_WINDOW_SECONDS", "60"))
+# Keys kept before idle ones are dropped
+MAX_TRACKED_KEYS = 10_000
+
+class LoginRateLimiter:
+    """Sliding-window limit on login attempts per (client address, username).
+
+    Every attempt costs a bcrypt verification, so guessing and retry storms
+    are turned away before they reach the hasher. A successful login clears
+    its key: staff sharing a hospital NAT address are only limited per
+    account, and only while they keep failing. Attempts and resets are
+    shared with the other server workers, so the limit holds however the
+    attempts are spread across them.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._attempts: Dict[str, Deque[float]] = {}
+
+    def hit(self, key: str) -> Optional[float]:
+        """Count an attempt; if over the limit, the seconds until one is allowed again."""
+        if self.limit <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return attempts[0] + self.window - now
+            attempts.append(now)
+            if len(self._attempts) > MAX_TRACKED_KEYS:
+                self._prune(now)
+        shared_state.publish("login_rate.attempt", {"key": key})
+        return None
+
+    def record(self, key: str):
+        """An attempt counted by another worker."""
+        if self.limit <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._attempts.setdefault(key, deque()).append(now)
+            if len(self._attempts) > MAX_TRACKED_KEYS:
+                self._prune(now)
+
+    def reset(self, key: str, broadcast: bool = True):
+        with self._lock:
+            self._attempts.pop(key, None)
+        if broadcast:
+            shared_state.publish("login_rate.reset", {"key": key})
+
+    def _prune(self, now: float):
+        # Caller holds the lock
+        for key in [key for key, attempts in self._attempts.items() if not attempts or attempts[-1] <= now - self.window]:
+            del self._attempts[key]
+
+login_rate_limiter = LoginRateLimiter(LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW_SECONDS)
+
+shared_state.subscribe("login_rate.attempt", lambda message: login_rate_limiter.record(message["key"]))
+shared_state.subscribe("login_rate.reset", lambda message: login_rate_limiter.reset(message["key"], broadcast=False))
@@ -0,0 +1,184 @@
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+from dotenv import load_dotenv
+import base64
+import json
+import os
+
+load_dotenv("config.env")
+
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+# Response headers list endpoints return next to the (unchanged) JSON array
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_ESTIMATE_HEADER = "X-Total-Count-Estimate"
+
+class KeysetPage:
+    """One page of a list endpoint, addressed by a cursor instead of an offset.
+
+    The cursor is the sort key of the last row handed out, so the next page
+    is ``WHERE (created_at, id) > (:last_created_at, :last_id) ORDER BY
+    created_at, id LIMIT n``: an index range scan that costs the same on
+    page 1 and on page 5000, where OFFSET reads and drops every row before
+    the page. Sorts are ``id`` or ``created_at``, ``-`` for descending.
+    """
+
+    def __init__(self, id_column, created_column=None, sort: str = "id",
+                 cursor: Optional[str] = None, limit: int = 100):
+        sorts = ("id", "created_at") if created_column is not None else ("id",)
+        if sort.lstrip("-") not in sorts:
+            raise ValueError(f"sort must be one of: {', '.join(sorts)} (prefix '-' for descending)")
+        if not 1 <= limit <= PAGE_SIZE_MAX:
+            raise ValueError(f"limit must be between 1 and {PAGE_SIZE_MAX}")
+
+        self.id_column = id_column
+        self.key_column = created_column if sort.lstrip("-") == "created_at" else None
+        self.descending = sort.startswith("-")
+        self.limit = limit
+        self.first_page = not cursor
+        self.after = self._decode(cursor) if cursor else None
+
+    def apply(self, db: Session, query):
+        """Restrict a Select or Query to this page; one row more is fetched to see if another follows."""
+        if self.after is not None:
+            query = query.filter(self._after_filter(db))
+        if self.key_column is None:
+            order = [self.id_column.desc() if self.descending else self.id_column]
+        elif self.descending:
+            order = [self.key_column.desc().nulls_first(), self.id_column.desc()]
+        else:
+            # Rows without a created_at come after the dated ones ascending and
+            # before them descending: the order an index on the column reads in
+            order = [self.key_column.nulls_last(), self.id_column]
+        return query.order_by(*order).limit(self.limit + 1)
+
+    def _after_filter(self, db: Session):
+        """The rows that follow the cursor in this page's sort order."""
+        after_id = self.id_column < self.after["id"] if self.descending else self.id_column > self.after["id"]
+        if self.key_column is None:
+            return after_id
+        if self.after["key"] is None:
+            # The cursor is among the undated rows
+            undated = and_(self.key_column.is_(None), after_id)
+            return or_(undated, self.key_column.is_not(None)) if self.descending else undated
+        if db.get_bind().dialect.name == "sqlite":
+            # SQLite compares timestamps as text, and CURRENT_TIMESTAMP
+            # defaults carry no fractional seconds while bound values do
+            key = tuple_(func.julianday(self.key_column), self.id_column)
+            value = tuple_(func.julianday(self.after["key"].isoformat(sep=" ")), self.after["id"])
+        else:
+            key, value = tuple_(self.key_column, self.id_column), (self.after["key"], self.after["id"])
+        if self.descending:
+            return key < value
+        # The OR loses the index range, so only add it when undated rows exist
+        if db.execute(select(self.id_column).where(self.key_column.is_(None)).limit(1)).first() is not None:
+            return or_(key > value, self.key_column.is_(None))
+        return key > value
+
+    def split(self, rows: List) -> tuple:
+        """(rows of this page, cursor of the next page or None); rows expose ``id`` and ``created_at``."""
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        last = {"id": rows[-1].id}
+        if self.key_column is not None:
+            created_at = rows[-1].created_at
+            last["key"] = created_at.isoformat() if created_at is not None else None
+        return rows, base64.urlsafe_b64encode(json.dumps(last).encode()).decode().rstrip("=")
+
+    def _decode(self, cursor: str) -> dict:
+        try:
+            after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(after.get("id"), int):
+                raise ValueError
+            if self.key_column is not None and after["key"] is not None:
+                after["key"] = datetime.fromisoformat(after["key"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise ValueError("Invalid cursor (it belongs to the same sort order it came from)")
+        return after
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Names from a comma-separated ``fields`` parameter; None means every field."""
+    if not fields:
+        return None
+    allowed = list(allowed)
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return requested or None
+
+def estimate_count(db: Session, query) -> int:
+    """Rows ``query`` would return, without counting them on PostgreSQL.
+
+    There the planner's row estimate is read from ``EXPLAIN`` (table
+    statistics: ``reltuples`` times the filters' selectivity), which takes
+    a fraction of a millisecond whatever the table size. SQLite has no such
+    statistics and gets an exact ``COUNT(*)``; it only backs small
+    development databases.
+    """
+    statement = getattr(query, "statement", query)
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return db.execute(select(func.count()).select_from(statement.order_by(None).subquery())).scalar()
+
+    compiled = statement.compile(dialect=bind.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def page_response(items: List[Any], next_cursor: Optional[str], total_estimate: Optional[int] = None) -> JSONResponse:
+    """The page as a plain JSON array, with the cursor and estimate in headers."""
+    headers = {}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total_estimate is not None:
+        headers[TOTAL_ESTIMATE_HEADER] = str(total_estimate)
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
+
+def fetch_page(
+    db: Session,
+    page: KeysetPage,
+    model,
+    schema,
+    fields: Optional[List[str]] = None,
+    filters: Iterable = (),
+    options: Iterable = ()
+) -> JSONResponse:
+    """List ``model`` rows matching ``filters`` one page at a time.
+
+    With ``fields`` only those columns are selected (plus the sort key the
+    cursor needs) and returned; otherwise whole rows are serialized with
+    ``schema``, loading relationships through ``options``.
+    """
+    if fields:
+        names = list(dict.fromkeys([*fields, "id", "created_at"]))
+        statement = select(*(getattr(model, name) for name in names))
+    else:
+        statement = select(model).options(*options)
+    statement = statement.where(*filters)
+
+    total_estimate = estimate_count(db, statement) if page.first_page else None
+    if fields:
+        rows = db.execute(page.apply(db, statement)).all()
+    else:
+        rows = db.execute(page.apply(db, statement)).scalars().all()
+    rows, next_cursor = page.split(rows)
+
+    if fields:
+        items = [{name: getattr(row, name) for name in fields} for row in rows]
+    else:
+        items = [schema.model_validate(row) for row in rows]
+    return page_response(items, next_cursor, total_estimate)
+
+def column_fields(model, schema) -> List[str]:
+    """Schema fields that are plain columns of ``model`` (what ``fields=`` can pick)."""
+    return [name for name in schema.model_fields if name in model.__table__.columns]
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+
+load_dotenv("config.env")
+
+# Processes hashing passwords (0 hashes in the request threadpool instead)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hashes waiting or running before further logins are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+# bcrypt cost of new hashes; each step doubles the work. Stored hashes keep
+# their cost until their owner next logs in and is re-hashed.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+logger = logging.getLogger(__name__)
+
+_contexts = {}
+
+def _context(rounds: int) -> CryptContext:
+    # One per process and cost; building it is not free
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return _contexts[rounds]
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+def _warm_up(rounds: int) -> int:
+    _context(rounds)
+    return os.getpid()
+
+class PasswordHashBusy(Exception):
+    """More hashes are pending than PASSWORD_HASH_MAX_PENDING."""
+
+class PasswordHasher:
+    """bcrypt off the request path, in a bounded pool of processes.
+
+    A hash costs 100-300 ms of CPU. Run in the request threadpool, a burst
+    of logins occupies its threads and the GIL-holding parts of every
+    other request wait behind them. Here at most ``workers`` hashes run at
+    once, in their own processes, while the request awaits the result
+    without holding a thread; beyond ``max_pending`` callers get
+    PasswordHashBusy instead of an ever longer queue.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def start(self):
+        """Spawn the workers ahead of the first login."""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(_warm_up, self.rounds)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash if the stored one should be replaced at the current cost)."""
+        return await self._run(_verify_and_update, password, hashed, self.rounds)
+
+    async def _run(self, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHashBusy()
+            self._pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(function, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), function, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: children must not inherit the event loop or pooled connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info("password_hasher.started workers=%d rounds=%d", self.workers, self.rounds)
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, BCRYPT_ROUNDS)
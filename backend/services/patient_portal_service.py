@@ -0,0 +1,112 @@
+from sqlalchemy.orm import Session
+from models import Patient, PatientTest, Test, Department, Room
+from schemas import PatientPortalResponse, PatientTestHistory
+from services.cache import TTLCache
+from services.shared_state import shared_state
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import logging
+import os
+
+load_dotenv("config.env")
+
+PATIENT_PORTAL_CACHE_SECONDS = float(os.getenv("PATIENT_PORTAL_CACHE_SECONDS", "5"))
+PATIENT_PORTAL_CACHE_SIZE = int(os.getenv("PATIENT_PORTAL_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+
+# unique_id -> (date of birth as YYYY-MM-DD, portal response)
+patient_portal_cache = TTLCache(PATIENT_PORTAL_CACHE_SIZE, PATIENT_PORTAL_CACHE_SECONDS)
+# patient id -> unique_id of its cached response; evicted oldest first, like the responses
+_unique_ids = TTLCache(PATIENT_PORTAL_CACHE_SIZE, PATIENT_PORTAL_CACHE_SECONDS)
+
+class PatientPortalService:
+
+    @staticmethod
+    def build_response(db: Session, patient: Patient) -> PatientPortalResponse:
+        rows = db.query(
+            PatientTest.id,
+            PatientTest.status,
+            PatientTest.assigned_at,
+            PatientTest.started_at,
+            PatientTest.completed_at,
+            PatientTest.notes,
+            Test.name.label("test_name"),
+            Department.name.label("department_name"),
+            Room.room_number
+        ).select_from(PatientTest).outerjoin(
+            Test, PatientTest.test_id == Test.id
+        ).outerjoin(
+            Department, Test.department_id == Department.id
+        ).outerjoin(
+            Room, PatientTest.assigned_room_id == Room.id
+        ).filter(PatientTest.patient_id == patient.id).all()
+
+        upcoming_tests = []
+        completed_tests = []
+
+        for row in rows:
+            test_history = PatientTestHistory(
+                id=row.id,
+                test_name=row.test_name or "Unknown Test",
+                department=row.department_name or "Unknown Department",
+                status=row.status,
+                appointment_date=row.assigned_at,
+                room_number=row.room_number,
+                assigned_at=row.assigned_at,
+                started_at=row.started_at,
+                completed_at=row.completed_at,
+                notes=row.notes
+            )
+
+            if row.status in ["pending", "in_progress"]:
+                upcoming_tests.append(test_history)
+            elif row.status == "completed":
+                completed_tests.append(test_history)
+
+        logger.info(
+            "patient_portal.loaded patient_id=%s upcoming=%d completed=%d",
+            patient.id, len(upcoming_tests), len(completed_tests)
+        )
+
+        return PatientPortalResponse(
+            patient_name=f"{patient.first_name} {patient.last_name}",
+            unique_id=patient.unique_id,
+            upcoming_tests=upcoming_tests,
+            completed_tests=completed_tests,
+            message="Access granted successfully"
+        )
+
+    @staticmethod
+    def get_portal(db: Session, unique_id: str) -> Optional[Tuple[str, PatientPortalResponse]]:
+        """Return ``(date_of_birth, response)`` for a UHID, or None if unknown.
+
+        Responses are cached for a few seconds so lobby-wide refreshes do not
+        reach the database; the caller still verifies the date of birth.
+        """
+        cached = patient_portal_cache.get(unique_id)
+        if cached is not None:
+            return cached
+
+        patient = db.query(Patient).filter(Patient.unique_id == unique_id).first()
+        if not patient:
+            return None
+
+        entry = (patient.date_of_birth.strftime("%Y-%m-%d"), PatientPortalService.build_response(db, patient))
+        _unique_ids.set(patient.id, unique_id)
+        patient_portal_cache.set(unique_id, entry)
+        return entry
+
+    @staticmethod
+    def invalidate_patient(patient_id: int, broadcast: bool = True):
+        unique_id = _unique_ids.pop(patient_id, None)
+        if unique_id is not None:
+            patient_portal_cache.pop(unique_id)
+        if broadcast:
+            shared_state.publish("patient_portal.changed", {"patient_id": patient_id})
+
+shared_state.subscribe(
+    "patient_portal.changed",
+    lambda message: PatientPortalService.invalidate_patient(message["patient_id"], broadcast=False),
+    resync=patient_portal_cache.clear
+)
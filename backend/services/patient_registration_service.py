@@ -0,0 +1,151 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from models import Patient, PatientTest
+from schemas import PatientCreate
+from services.rule_engine import assignment_rules
+from services.test_catalog import test_catalog
+from services.test_assignment_service import TestAssignmentService
+from services.queue_service import QueueService
+from services.room_dispatcher import room_dispatcher
+from typing import Any, Dict, List, Tuple
+from dotenv import load_dotenv
+import csv
+import io
+import logging
+import os
+
+load_dotenv("config.env")
+
+BULK_REGISTER_MAX_ROWS = int(os.getenv("BULK_REGISTER_MAX_ROWS", "5000"))
+
+logger = logging.getLogger(__name__)
+
+class PatientRegistrationService:
+
+    @staticmethod
+    def parse_csv(content: str) -> List[Dict[str, Any]]:
+        """Spreadsheet export -> row dicts; headers are PatientCreate field names."""
+        reader = csv.DictReader(io.StringIO(content.lstrip("\ufeff")))
+        rows = []
+        for row in reader:
+            rows.append({
+                (key or "").strip().lower(): value.strip() if isinstance(value, str) else value
+                for key, value in row.items()
+                # Blank cells fall back to the schema defaults
+                if value not in (None, "")
+            })
+        return rows
+
+    @staticmethod
+    def validate_rows(rows: List[Any]) -> Tuple[List[Tuple[int, PatientCreate]], List[Dict[str, Any]]]:
+        valid, errors = [], []
+        for number, row in enumerate(rows, 1):
+            try:
+                valid.append((number, PatientCreate.model_validate(row)))
+            except ValidationError as e:
+                errors.append({
+                    "row": number,
+                    "errors": [f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()]
+                })
+        return valid, errors
+
+    @staticmethod
+    def bulk_register(db: Session, rows: List[Any]) -> Dict[str, Any]:
+        """Validate, assign tests in one vectorized pass and insert in a few statements.
+
+        Invalid rows are reported and skipped; if a batch insert fails, rows
+        are retried one by one in savepoints so only the offending ones fail.
+        """
+        valid, errors = PatientRegistrationService.validate_rows(rows)
+        if not valid:
+            return {"registered": 0, "failed": len(errors), "patients": [], "errors": errors}
+
+        import pandas as pd
+        patients = pd.DataFrame([patient.model_dump() for _, patient in valid])
+        evaluated = assignment_rules.evaluate(patients).to_dict("records")
+        catalog = test_catalog.get(db)
+
+        records = []
+        unique_ids = set()
+        for position, (number, patient) in enumerate(valid):
+            unique_id = TestAssignmentService.generate_unique_id()
+            while unique_id in unique_ids:
+                unique_id = TestAssignmentService.generate_unique_id()
+            unique_ids.add(unique_id)
+
+            evaluation = evaluated[position]
+            tests = [catalog.rules[key] for key in assignment_rules.test_keys() if evaluation[key] and key in catalog.rules]
+            records.append({
+                "row": number,
+                "patient": {**patient.model_dump(), "unique_id": unique_id, "risk_level": evaluation["risk_level"]},
+                "tests": tests
+            })
+
+        try:
+            with db.begin_nested():
+                inserted = PatientRegistrationService._insert(db, records)
+        except SQLAlchemyError:
+            logger.warning("bulk_register.batch_failed rows=%d retrying_per_row=true", len(records), exc_info=True)
+            inserted = []
+            for record in records:
+                try:
+                    with db.begin_nested():
+                        inserted.extend(PatientRegistrationService._insert(db, [record]))
+                except SQLAlchemyError as e:
+                    errors.append({"row": record["row"], "errors": [str(e.orig if hasattr(e, "orig") else e).strip()]})
+
+        db.commit()
+
+        patient_tests = [pt for record in inserted for pt in record["patient_tests"]]
+        QueueService.record_new_tests(db, patient_tests)
+        QueueService.publish_changes(db, [pt.id for pt in patient_tests])
+        for record in inserted:
+            room_dispatcher.enqueue(db, record["patient_tests"], record["patient"]["risk_level"])
+
+        errors.sort(key=lambda error: error["row"])
+        logger.info("bulk_register.done registered=%d failed=%d tests=%d", len(inserted), len(errors), len(patient_tests))
+        return {
+            "registered": len(inserted),
+            "failed": len(errors),
+            "patients": [{
+                "row": record["row"],
+                "patient_id": record["patient_id"],
+                "unique_id": record["patient"]["unique_id"],
+                "risk_level": record["patient"]["risk_level"],
+                "assigned_tests": [test.name for test in record["tests"]]
+            } for record in inserted],
+            "errors": errors
+        }
+
+    @staticmethod
+    def _insert(db: Session, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One multi-row INSERT ... RETURNING per table, whatever the batch size
+        patient_rows = db.execute(
+            insert(Patient).returning(Patient.id, Patient.unique_id),
+            [record["patient"] for record in records]
+        ).all()
+        patient_ids = {row.unique_id: row.id for row in patient_rows}
+
+        test_rows = [
+            {"patient_id": patient_ids[record["patient"]["unique_id"]], "test_id": test.id, "status": "pending"}
+            for record in records
+            for test in record["tests"]
+        ]
+        created = db.execute(
+            insert(PatientTest).returning(
+                PatientTest.id, PatientTest.patient_id, PatientTest.test_id, PatientTest.status, PatientTest.created_at
+            ),
+            test_rows
+        ).all() if test_rows else []
+
+        by_patient: Dict[int, list] = {}
+        for row in created:
+            by_patient.setdefault(row.patient_id, []).append(row)
+
+        inserted = []
+        for record in records:
+            patient_id = patient_ids[record["patient"]["unique_id"]]
+            inserted.append({**record, "patient_id": patient_id, "patient_tests": by_patient.get(patient_id, [])})
+        return inserted
@@ -0,0 +1,294 @@
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.orm import Session
+from models import Patient
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import logging
+import re
+import threading
+import time
+
+PATIENT_SEARCH_LIMIT_MAX = 50
+PATIENT_SEARCH_MIN_LENGTH = 2
+# Smallest share of the query's trigrams a name must contain to match
+# fuzzily (pg_trgm word similarity; its own default of 0.6 misses most
+# one-letter typos in short names)
+FUZZY_THRESHOLD = 0.4
+# How often the in-process index checks whether the patients table changed
+INDEX_CHECK_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+class SearchRow(NamedTuple):
+    id: int
+    unique_id: str
+    first_name: str
+    last_name: str
+    phone: Optional[str]
+    date_of_birth: object
+
+COLUMNS = (Patient.id, Patient.unique_id, Patient.first_name, Patient.last_name, Patient.phone, Patient.date_of_birth)
+
+def _words(value: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", value.lower())
+
+def _compact(value: Optional[str]) -> str:
+    # Phone numbers and UHIDs match whatever spacing or dashes were typed
+    return re.sub(r"[\s\-()]", "", value or "").lower()
+
+# A query that can only be (part of) a phone number
+PHONE_QUERY = re.compile(r"\+?[\d\s\-().]+")
+
+def _phone_key(value: Optional[str]) -> str:
+    # Digits and "+", however the number was stored or typed; migration 0007
+    # indexes the same normalization on PostgreSQL
+    return re.sub(r"[^0-9+]", "", value or "")
+
+# Must match the indexed expression exactly for the prefix index to apply
+PHONE_KEY_SQL = func.regexp_replace(
+    Patient.phone, literal_column("'[^0-9+]'"), literal_column("''"), literal_column("'g'")
+).collate("C")
+
+# National numbers are this long (India, North America); anything before
+# them is a country code or trunk prefix
+PHONE_LOCAL_DIGITS = 10
+
+def _local_phone_key(value: Optional[str]) -> str:
+    # The number without its country code, so "555123" finds "+1 555-123-4000";
+    # migration 0010 indexes the same expression on PostgreSQL
+    return re.sub(r"[^0-9]", "", value or "")[-PHONE_LOCAL_DIGITS:]
+
+def _local_phone_query(query: str) -> str:
+    # A query starting with "+" names its country and only matches whole numbers
+    return _local_phone_key(query) if PHONE_QUERY.fullmatch(query) and not query.startswith("+") else ""
+
+PHONE_LOCAL_KEY_SQL = func.right(
+    func.regexp_replace(Patient.phone, literal_column("'[^0-9]'"), literal_column("''"), literal_column("'g'")),
+    literal_column(str(PHONE_LOCAL_DIGITS))
+).collate("C")
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm's trigrams: per lower-cased word, padded with two spaces in front and one behind."""
+    result = set()
+    for word in _words(value):
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+def similarity(query: str, name: str) -> float:
+    """Share of the query's trigrams found in ``name`` (close to pg_trgm's word_similarity)."""
+    wanted = trigrams(query)
+    return len(wanted & trigrams(name)) / len(wanted) if wanted else 0.0
+
+def score(query: str, row: SearchRow) -> float:
+    """Rank of a patient for ``query`` in [0, 1], the same on every backend.
+
+    A prefix of the UHID or phone number, or of the patient's name words
+    (``"jo sm"`` for John Smith), scores 0.5 plus half the share of the
+    field it covers, so exact matches score 1. Fuzzy name matches score at
+    most 0.5.
+    """
+    best = 0.0
+    phone_key = _phone_key(query) if PHONE_QUERY.fullmatch(query) else ""
+    for key, value in (
+        (_compact(query), _compact(row.unique_id)),
+        (phone_key, _phone_key(row.phone)),
+        (_local_phone_query(query), _local_phone_key(row.phone))
+    ):
+        if key and value.startswith(key):
+            best = max(best, 0.5 + 0.5 * len(key) / len(value))
+
+    tokens = _words(query)
+    names = _words(f"{row.first_name} {row.last_name}")
+    if tokens and names and all(any(name.startswith(token) for name in names) for token in tokens):
+        covered = min(sum(len(token) for token in tokens) / sum(len(name) for name in names), 1.0)
+        best = max(best, 0.5 + 0.5 * covered)
+
+    if best < 0.5:
+        best = max(best, 0.5 * similarity(query, f"{row.first_name} {row.last_name}"))
+    return round(best, 3)
+
+def rank(query: str, rows: Iterable[SearchRow], limit: int) -> List[dict]:
+    scored = {}
+    for row in rows:
+        row_score = score(query, row)
+        if row_score >= 0.5 * FUZZY_THRESHOLD:
+            scored[row.id] = (row_score, row)
+    ranked = sorted(scored.values(), key=lambda item: (-item[0], item[1].last_name.lower(), item[1].first_name.lower(), item[1].id))
+    return [{**row._asdict(), "score": row_score} for row_score, row in ranked[:limit]]
+
+def _like_prefix(value: str) -> str:
+    return re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+class PatientSearchService:
+    """Ranked prefix and fuzzy patient lookup by name, phone and UHID.
+
+    On PostgreSQL every prefix kind is one range scan over a ``COLLATE "C"``
+    expression index (migration 0005), read in index order and cut off at
+    ``limit``, so a one-letter-wide prefix costs the same as a full UHID.
+    Phone numbers are compared as digits and ``+`` only (migration 0007),
+    and by their last PHONE_LOCAL_DIGITS digits for queries without a
+    country code (migration 0010).
+    Fuzzy name matches come from a pg_trgm GIN index when the extension is
+    installed and prefix matches did not fill the page. Other backends
+    search an in-process index. Candidates from either are ranked by
+    ``score``.
+    """
+
+    _trigram_available: Optional[bool] = None
+
+    @staticmethod
+    def search(db: Session, query: str, limit: int = 20) -> List[dict]:
+        query = query.strip()
+        if db.get_bind().dialect.name != "postgresql":
+            return rank(query, patient_search_index.candidates(db, query, limit), limit)
+
+        candidates = PatientSearchService._prefix_candidates(db, query, limit)
+        if len({row.id for row in candidates}) < limit and PatientSearchService._has_trigram(db):
+            candidates += PatientSearchService._fuzzy_candidates(db, query, limit)
+        return rank(query, candidates, limit)
+
+    @staticmethod
+    def _prefix_candidates(db: Session, query: str, limit: int) -> List[SearchRow]:
+        first_name = func.lower(Patient.first_name).collate("C")
+        last_name = func.lower(Patient.last_name).collate("C")
+        statements = []
+
+        compact = _compact(query)
+        if compact.isalnum():
+            unique_id = Patient.unique_id.collate("C")
+            statements.append(select(*COLUMNS).where(unique_id.like(_like_prefix(compact.upper()))).order_by(unique_id))
+        if PHONE_QUERY.fullmatch(query):
+            statements.append(
+                select(*COLUMNS).where(PHONE_KEY_SQL.like(_like_prefix(_phone_key(query)))).order_by(PHONE_KEY_SQL)
+            )
+        local_phone = _local_phone_query(query)
+        if local_phone:
+            statements.append(
+                select(*COLUMNS).where(PHONE_LOCAL_KEY_SQL.like(_like_prefix(local_phone))).order_by(PHONE_LOCAL_KEY_SQL)
+            )
+
+        tokens = _words(query)
+        if tokens:
+            # "jo sm": first name jo*, last name sm* -- or the other way round
+            for leading, other in ((last_name, first_name), (first_name, last_name)):
+                statement = select(*COLUMNS).where(leading.like(_like_prefix(tokens[0])))
+                if len(tokens) > 1:
+                    statement = statement.where(other.like(_like_prefix(tokens[-1])))
+                statements.append(statement.order_by(leading))
+
+        rows = []
+        for statement in statements:
+            rows += [SearchRow(*row) for row in db.execute(statement.limit(limit)).all()]
+        return rows
+
+    @staticmethod
+    def _fuzzy_candidates(db: Session, query: str, limit: int) -> List[SearchRow]:
+        # Must match the indexed expression exactly for the GIN index to apply
+        name = Patient.first_name.op("||")(literal_column("' '")).op("||")(Patient.last_name)
+        db.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+                   {"threshold": str(FUZZY_THRESHOLD)})
+        rows = db.execute(
+            select(*COLUMNS).where(name.op("%>")(query))
+            .order_by(func.word_similarity(query, name).desc()).limit(limit)
+        ).all()
+        return [SearchRow(*row) for row in rows]
+
+    @staticmethod
+    def _has_trigram(db: Session) -> bool:
+        if PatientSearchService._trigram_available is None:
+            available = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+            if not available:
+                logger.warning("patient_search.no_pg_trgm fuzzy name matching is disabled")
+            PatientSearchService._trigram_available = available
+        return PatientSearchService._trigram_available
+
+class PatientSearchIndex:
+    """In-process search index for databases without trigram indexes (SQLite development).
+
+    Holds every patient's searchable fields, one sorted list of
+    (lower-cased key, patient id) for prefix lookups and trigram postings
+    for fuzzy names. It is rebuilt when the patients table's row count,
+    highest id or latest update differs from when it was built (checked at
+    most every INDEX_CHECK_SECONDS), which is how changes by any worker or
+    bulk insert are noticed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple] = None
+        self._rows: Dict[int, SearchRow] = {}
+        self._keys: List[Tuple[str, int]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._names: Dict[int, List[str]] = {}
+        self._checked_at = float("-inf")
+
+    def candidates(self, db: Session, query: str, limit: int) -> List[SearchRow]:
+        self._refresh(db)
+        with self._lock:
+            # Like the database path: the first ``limit`` keys in order per prefix
+            ids: Dict[int, None] = dict.fromkeys(self._prefixed(_compact(query), limit))
+            if PHONE_QUERY.fullmatch(query):
+                ids.update(dict.fromkeys(self._prefixed(_phone_key(query), limit)))
+                ids.update(dict.fromkeys(self._prefixed(_local_phone_query(query), limit)))
+            tokens = _words(query)
+            if tokens:
+                # Every word of the query has to start one of the name's words
+                rest = tokens[1:]
+                matching = (
+                    patient_id for patient_id in self._prefixed(tokens[0])
+                    if all(any(name.startswith(token) for name in self._names[patient_id]) for token in rest)
+                )
+                ids.update(dict.fromkeys(islice(matching, limit)))
+
+            wanted = trigrams(query)
+            if wanted:
+                hits: Dict[int, int] = {}
+                for trigram in wanted:
+                    for patient_id in self._postings.get(trigram, ()):
+                        hits[patient_id] = hits.get(patient_id, 0) + 1
+                needed = FUZZY_THRESHOLD * len(wanted)
+                fuzzy = sorted((patient_id for patient_id, count in hits.items() if count >= needed),
+                               key=lambda patient_id: -hits[patient_id])
+                ids.update(dict.fromkeys(fuzzy[:limit]))
+            return [self._rows[patient_id] for patient_id in ids]
+
+    def _prefixed(self, key: str, limit: Optional[int] = None) -> Iterator[int]:
+        # Caller holds the lock
+        if not key:
+            return
+        seen = set()
+        for position in range(bisect_left(self._keys, (key,)), len(self._keys)):
+            indexed, patient_id = self._keys[position]
+            if not indexed.startswith(key) or (limit is not None and len(seen) >= limit):
+                return
+            if patient_id not in seen:
+                seen.add(patient_id)
+                yield patient_id
+
+    def _refresh(self, db: Session):
+        if time.monotonic() - self._checked_at < INDEX_CHECK_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        signature = tuple(db.execute(select(func.count(Patient.id), func.max(Patient.id), func.max(Patient.updated_at))).one())
+        if signature == self._signature:
+            return
+
+        rows = {row.id: SearchRow(*row) for row in db.execute(select(*COLUMNS)).all()}
+        keys, postings, names = [], {}, {}
+        for row in rows.values():
+            names[row.id] = _words(f"{row.first_name} {row.last_name}")
+            for key in {_compact(row.unique_id), _phone_key(row.phone), _local_phone_key(row.phone), *names[row.id]}:
+                if key:
+                    keys.append((key, row.id))
+            for trigram in trigrams(f"{row.first_name} {row.last_name}"):
+                postings.setdefault(trigram, []).append(row.id)
+        keys.sort()
+
+        with self._lock:
+            self._rows, self._keys, self._postings, self._names = rows, keys, postings, names
+            self._signature = signature
+        logger.info("patient_search_index.rebuilt patients=%d keys=%d", len(rows), len(keys))
+
+patient_search_index = PatientSearchIndex()
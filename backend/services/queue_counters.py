@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv("config.env")
+
+QUEUE_METRICS_CACHE = os.getenv("QUEUE_METRICS_CACHE", "false").lower() == "true"
+QUEUE_METRICS_RECONCILE_SECONDS = int(os.getenv("QUEUE_METRICS_RECONCILE_SECONDS", "60"))
+
+# (department_id, department_name, status, count) as returned by the GROUP BY
+CountRow = Tuple[int, str, Optional[str], int]
+
+class QueueCounterStore:
+    """Per-department status counters kept in memory between reconciliations.
+
+    Writers adjust the counters as tests change status; readers only hit the
+    database when the counters are older than the reconcile interval. Any
+    drift from concurrent writers is corrected on the next reconciliation.
+    """
+
+    def __init__(self, enabled: bool, reconcile_seconds: int):
+        self.enabled = enabled
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.Lock()
+        self._departments: Dict[int, str] = {}
+        self._counts: Dict[int, Dict[str, int]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def get_counts(self, load: Callable[[], List[CountRow]]) -> List[CountRow]:
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reconcile_seconds
+            if fresh:
+                return self._rows()
+
+        rows = load()
+        with self._lock:
+            self._departments = {}
+            self._counts = {}
+            for department_id, department_name, test_status, count in rows:
+                self._departments[department_id] = department_name
+                counts = self._counts.setdefault(department_id, {})
+                if test_status is not None:
+                    counts[test_status] = count
+            self._loaded_at = time.monotonic()
+            return self._rows()
+
+    def adjust(self, department_id: int, test_status: str, delta: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._loaded_at is None or department_id not in self._counts:
+                return
+            counts = self._counts[department_id]
+            counts[test_status] = max(counts.get(test_status, 0) + delta, 0)
+
+    def transition(self, department_id: int, old_status: str, new_status: str):
+        if old_status == new_status:
+            return
+        self.adjust(department_id, old_status, -1)
+        self.adjust(department_id, new_status, 1)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _rows(self) -> List[CountRow]:
+        rows = []
+        for department_id, department_name in self._departments.items():
+            counts = self._counts.get(department_id, {})
+            if not counts:
+                rows.append((department_id, department_name, None, 0))
+            for test_status, count in counts.items():
+                rows.append((department_id, department_name, test_status, count))
+        return rows
+
+queue_counters = QueueCounterStore(QUEUE_METRICS_CACHE, QUEUE_METRICS_RECONCILE_SECONDS)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+class QueueEventBus:
+    """In-process fan-out of queue changes to connected live-feed clients.
+
+    Handlers run in Starlette's threadpool, so ``publish`` hands events over
+    to each subscriber's event loop with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[subscriber] = asyncio.get_running_loop()
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def publish(self, event: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+
+        for subscriber, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, subscriber, event)
+            except RuntimeError:
+                # Event loop already closed, the client is gone
+                self.unsubscribe(subscriber)
+
+    @staticmethod
+    def _deliver(subscriber: asyncio.Queue, event: Dict[str, Any]):
+        try:
+            subscriber.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop its backlog and ask it to reload the snapshot
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            subscriber.put_nowait({"type": "resync"})
+
+    @staticmethod
+    async def next_event(subscriber: asyncio.Queue, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(subscriber.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+queue_event_bus = QueueEventBus()
@@ -0,0 +1,254 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from database import SessionLocal
+from models import PatientTest, Patient, Test, Department, Room
+from schemas import QueueStatus
+from services.pagination import KeysetPage, estimate_count, page_response
+from services.queue_events import queue_event_bus
+from services.queue_counters import queue_counters
+from services.shared_state import shared_state
+from services.test_catalog import test_catalog
+from services.wait_time_estimator import wait_time_estimator
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+class QueueService:
+
+    @staticmethod
+    def get_queue_rows(
+        db: Session,
+        department_id: Optional[int] = None,
+        patient_test_ids: Optional[Iterable[int]] = None,
+        include_completed: bool = False,
+        page: Optional[KeysetPage] = None
+    ) -> List[Tuple[int, QueueStatus]]:
+        # Column projection over one joined SELECT: no ORM objects are built
+        # and no relationship is lazily loaded per row.
+        query = db.query(
+            PatientTest.id,
+            PatientTest.test_id,
+            PatientTest.status,
+            PatientTest.assigned_at,
+            PatientTest.created_at,
+            Patient.id.label("patient_id"),
+            Patient.unique_id,
+            Patient.first_name,
+            Patient.last_name,
+            Test.name.label("test_name"),
+            Department.id.label("department_id"),
+            Department.name.label("department_name"),
+            Room.room_number
+        ).select_from(PatientTest).join(
+            Patient, PatientTest.patient_id == Patient.id
+        ).join(
+            Test, PatientTest.test_id == Test.id
+        ).join(
+            Department, Test.department_id == Department.id
+        ).outerjoin(
+            Room, PatientTest.assigned_room_id == Room.id
+        )
+
+        if department_id:
+            query = query.filter(Department.id == department_id)
+
+        if patient_test_ids is not None:
+            query = query.filter(PatientTest.id.in_(list(patient_test_ids)))
+
+        if not include_completed:
+            query = query.filter(PatientTest.status != "completed")
+
+        if page is not None:
+            query = page.apply(db, query)
+
+        now = datetime.utcnow()
+        results = query.all()
+        # Full department queues give each test its place in line; a page or
+        # a few changed rows only get the back-of-queue estimate
+        estimated_waits = wait_time_estimator.queue_waits(
+            [(row.department_id, row.test_id, row.status, row.created_at) for row in results],
+            positional=patient_test_ids is None and page is None
+        )
+        rows = []
+        for row, estimated_wait_time in zip(results, estimated_waits):
+            wait_time = None
+            if row.assigned_at:
+                # timestamptz columns come back aware on PostgreSQL
+                assigned_at = row.assigned_at
+                if assigned_at.tzinfo is not None:
+                    assigned_at = assigned_at.astimezone(timezone.utc).replace(tzinfo=None)
+                wait_time = int((now - assigned_at).total_seconds() / 60)
+
+            rows.append((row.department_id, QueueStatus(
+                id=row.id,
+                patient_id=row.patient_id,
+                unique_id=row.unique_id,
+                patient_name=f"{row.first_name} {row.last_name}",
+                test_name=row.test_name,
+                department=row.department_name,
+                status=row.status,
+                room_number=row.room_number,
+                wait_time=wait_time,
+                estimated_wait_time=estimated_wait_time,
+                created_at=row.created_at
+            )))
+
+        return rows
+
+    @staticmethod
+    def get_queue_status(db: Session, department_id: Optional[int] = None) -> List[QueueStatus]:
+        return [row for _, row in QueueService.get_queue_rows(db, department_id=department_id)]
+
+    @staticmethod
+    def get_queue_page(
+        db: Session,
+        page: KeysetPage,
+        department_id: Optional[int] = None,
+        fields: Optional[List[str]] = None
+    ) -> JSONResponse:
+        total_estimate = None
+        if page.first_page:
+            query = db.query(PatientTest.id).join(Test, PatientTest.test_id == Test.id).filter(PatientTest.status != "completed")
+            if department_id:
+                query = query.filter(Test.department_id == department_id)
+            total_estimate = estimate_count(db, query)
+
+        rows, next_cursor = page.split([row for _, row in QueueService.get_queue_rows(db, department_id=department_id, page=page)])
+        if fields:
+            rows = [{name: getattr(row, name) for name in fields} for row in rows]
+        return page_response(rows, next_cursor, total_estimate)
+
+    @staticmethod
+    def count_by_department_status(db: Session) -> List[Tuple[int, str, Optional[str], int]]:
+        """One GROUP BY department, status pass over patient_tests.
+
+        Departments without any test still come back, with a NULL status.
+        """
+        return [tuple(row) for row in db.query(
+            Department.id,
+            Department.name,
+            PatientTest.status,
+            func.count(PatientTest.id)
+        ).outerjoin(
+            Test, Test.department_id == Department.id
+        ).outerjoin(
+            PatientTest, PatientTest.test_id == Test.id
+        ).group_by(
+            Department.id, Department.name, PatientTest.status
+        ).order_by(Department.id).all()]
+
+    @staticmethod
+    def get_queue_metrics(db: Session) -> Dict[str, Any]:
+        if queue_counters.enabled:
+            counts = queue_counters.get_counts(lambda: QueueService.count_by_department_status(db))
+        else:
+            counts = QueueService.count_by_department_status(db)
+
+        totals = {"pending": 0, "in_progress": 0, "completed": 0}
+        dept_metrics = {}
+        for department_id, department_name, test_status, count in counts:
+            metrics = dept_metrics.setdefault(department_id, {
+                "department": department_name,
+                "pending": 0,
+                "in_progress": 0,
+                "completed": 0
+            })
+            if test_status in totals:
+                metrics[test_status] += count
+                totals[test_status] += count
+
+        return {
+            "total_pending": totals["pending"],
+            "total_in_progress": totals["in_progress"],
+            "total_completed": totals["completed"],
+            "department_metrics": list(dept_metrics.values())
+        }
+
+    @staticmethod
+    def record_status_change(patient_test: PatientTest, old_status: str):
+        if old_status == patient_test.status:
+            return
+        change = {
+            "department_id": patient_test.test.department_id if queue_counters.enabled else None,
+            "test_id": patient_test.test_id,
+            "old_status": old_status,
+            "new_status": patient_test.status,
+            "started_at": patient_test.started_at,
+            "completed_at": patient_test.completed_at
+        }
+        QueueService._apply_status_change(change)
+        shared_state.publish("queue.status_changed", jsonable_encoder(change))
+
+    @staticmethod
+    def record_new_tests(db: Session, patient_tests: List[PatientTest]):
+        if not patient_tests:
+            return
+        added = [{
+            "test_id": pt.test_id,
+            "status": pt.status,
+            "department_id": test_catalog.department_id(db, pt.test_id) if queue_counters.enabled else None
+        } for pt in patient_tests]
+        QueueService._apply_new_tests(added)
+        shared_state.publish("queue.tests_added", {"tests": added})
+
+    @staticmethod
+    def _apply_status_change(change: Dict[str, Any]):
+        if queue_counters.enabled:
+            queue_counters.transition(change["department_id"], change["old_status"], change["new_status"])
+        wait_time_estimator.record_transition(
+            change["test_id"], change["old_status"], change["new_status"],
+            change["started_at"], change["completed_at"]
+        )
+
+    @staticmethod
+    def _apply_new_tests(added: List[Dict[str, Any]]):
+        for test in added:
+            wait_time_estimator.record_new(test["test_id"], test["status"])
+            if queue_counters.enabled:
+                queue_counters.adjust(test["department_id"], test["status"], 1)
+
+    @staticmethod
+    def publish_changes(db: Session, patient_test_ids: Iterable[int]):
+        """Push the new state of the given patient tests to live-feed clients.
+
+        Other workers are told the ids and push to their own clients; nothing
+        is queried in a worker with no screen connected.
+        """
+        patient_test_ids = list(patient_test_ids)
+        if not patient_test_ids:
+            return
+        shared_state.publish("queue.changed", {"ids": patient_test_ids})
+        QueueService._publish_local(db, patient_test_ids)
+
+    @staticmethod
+    def _publish_local(db: Session, patient_test_ids: List[int]):
+        if not queue_event_bus.has_subscribers:
+            return
+
+        rows = QueueService.get_queue_rows(db, patient_test_ids=patient_test_ids, include_completed=True)
+        for department_id, row in rows:
+            if row.status == "completed":
+                event = {"type": "remove", "department_id": department_id, "id": row.id}
+            else:
+                event = {"type": "upsert", "department_id": department_id, "item": jsonable_encoder(row)}
+            queue_event_bus.publish(event)
+
+def _relay_status_change(change: Dict[str, Any]):
+    for key in ("started_at", "completed_at"):
+        if change[key] is not None:
+            change[key] = datetime.fromisoformat(change[key])
+    QueueService._apply_status_change(change)
+
+def _relay_changes(message: Dict[str, Any]):
+    if queue_event_bus.has_subscribers:
+        with SessionLocal() as db:
+            QueueService._publish_local(db, message["ids"])
+
+def _resync_queue_state():
+    queue_counters.invalidate()
+    wait_time_estimator.rebuild_once()
+
+shared_state.subscribe("queue.status_changed", _relay_status_change, resync=_resync_queue_state)
+shared_state.subscribe("queue.tests_added", lambda message: QueueService._apply_new_tests(message["tests"]))
+shared_state.subscribe("queue.changed", _relay_changes, resync=lambda: queue_event_bus.publish({"type": "resync"}))
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from typing import Tuple
+from jose import JWTError, jwt
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import RefreshToken, User
+from services.auth_service import SECRET_KEY, ALGORITHM, decode_token, revoked_families
+from dotenv import load_dotenv
+import logging
+import os
+import uuid
+
+load_dotenv("config.env")
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# A token rotated this recently is refused without revoking its family:
+# two tabs refreshing with the same token at once is not a stolen token
+REUSE_GRACE_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+class InvalidRefreshToken(Exception):
+    """Bad signature, expired, revoked, or its user is inactive."""
+
+class RefreshTokenService:
+    """Long-lived refresh tokens that renew a session without the password.
+
+    A refresh token is a signed JWT (``typ`` "refresh") whose ``jti`` names
+    a row in refresh_tokens; renewing is a signature check and a primary
+    key lookup instead of a bcrypt verification. Each refresh rotates the
+    token: the presented one is revoked and the next one in its family is
+    returned. Access tokens carry the family as ``fam`` so that revoking
+    the family (logout, or a rotated token presented again) also refuses
+    them.
+    """
+
+    @staticmethod
+    def issue(db: Session, user: User, family: str = None) -> Tuple[str, str]:
+        """(refresh token, family); a new family (a new login) unless given."""
+        now = datetime.utcnow()
+        if family is None:
+            family = uuid.uuid4().hex
+            # Logins are rare enough to keep the user's rows trimmed here
+            db.query(RefreshToken).filter(
+                RefreshToken.user_id == user.id,
+                RefreshToken.expires_at < now
+            ).delete(synchronize_session=False)
+
+        expires_at = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        jti = uuid.uuid4().hex
+        db.add(RefreshToken(jti=jti, family=family, user_id=user.id, expires_at=expires_at))
+        db.commit()
+
+        token = jwt.encode(
+            {"sub": user.username, "typ": "refresh", "jti": jti, "fam": family, "exp": expires_at},
+            SECRET_KEY,
+            algorithm=ALGORITHM
+        )
+        return token, family
+
+    @staticmethod
+    def rotate(db: Session, token: str) -> Tuple[User, str, str]:
+        """Revoke ``token`` and issue its successor: (user, new refresh token, family)."""
+        claims = RefreshTokenService._claims(token)
+        row = db.query(RefreshToken, User).join(User, User.id == RefreshToken.user_id).filter(
+            RefreshToken.jti == claims["jti"]
+        ).first()
+        if row is None:
+            raise InvalidRefreshToken()
+        stored, user = row
+        if stored.family != claims["fam"] or user.username != claims["sub"] or not user.is_active:
+            raise InvalidRefreshToken()
+
+        now = datetime.utcnow()
+        if stored.revoked_at is not None:
+            if stored.revoked_at < now - timedelta(seconds=REUSE_GRACE_SECONDS):
+                RefreshTokenService.revoke_family(db, stored.family)
+                logger.warning("refresh_token.reused user_id=%d family=%s revoked=true", user.id, stored.family)
+            raise InvalidRefreshToken()
+
+        # Conditional, so of two concurrent refreshes only one gets a successor
+        claimed = db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.jti == stored.jti, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            raise InvalidRefreshToken()
+
+        new_token, family = RefreshTokenService.issue(db, user, stored.family)
+        return user, new_token, family
+
+    @staticmethod
+    def revoke(db: Session, token: str):
+        """Log out: revoke the session the token belongs to."""
+        claims = RefreshTokenService._claims(token)
+        RefreshTokenService.revoke_family(db, claims["fam"])
+
+    @staticmethod
+    def revoke_family(db: Session, family: str):
+        db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        revoked_families.revoke(family)
+
+    @staticmethod
+    def _claims(token: str) -> dict:
+        try:
+            claims = decode_token(token)
+        except JWTError:
+            raise InvalidRefreshToken()
+        if claims.get("typ") != "refresh" or not all(claims.get(key) for key in ("sub", "jti", "fam")):
+            raise InvalidRefreshToken()
+        return claims
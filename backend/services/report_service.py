@@ -0,0 +1,104 @@
+from sqlalchemy.orm import Session
+from models import PatientTest, Patient, Test, Department, Room
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+PATIENT_COMPLETION_COLUMNS = [
+    "Patient ID",
+    "Patient Name",
+    "Test",
+    "Department",
+    "Status",
+    "Room",
+    "Wait Time (min)",
+    "Test Duration (min)",
+    "Created",
+    "Completed",
+]
+
+REPORT_BATCH_SIZE = 1000
+
+class ReportService:
+
+    @staticmethod
+    def count_patient_completion_rows(
+        db: Session,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        department_id: Optional[int] = None
+    ) -> int:
+        query = db.query(PatientTest)
+        if start_date:
+            query = query.filter(PatientTest.created_at >= start_date)
+        if end_date:
+            query = query.filter(PatientTest.created_at <= end_date)
+        if department_id:
+            query = query.join(Test).filter(Test.department_id == department_id)
+        return query.count()
+
+    @staticmethod
+    def iter_patient_completion_rows(
+        db: Session,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        department_id: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield patient completion report rows in batches from a server-side cursor.
+
+        Only the projected columns are fetched, so memory stays bounded by
+        the batch size whatever the date range.
+        """
+        query = db.query(
+            PatientTest.status,
+            PatientTest.assigned_at,
+            PatientTest.started_at,
+            PatientTest.completed_at,
+            PatientTest.created_at,
+            Patient.unique_id,
+            Patient.first_name,
+            Patient.last_name,
+            Test.name.label("test_name"),
+            Department.name.label("department_name"),
+            Room.room_number
+        ).select_from(PatientTest).join(
+            Patient, PatientTest.patient_id == Patient.id
+        ).join(
+            Test, PatientTest.test_id == Test.id
+        ).join(
+            Department, Test.department_id == Department.id
+        ).outerjoin(
+            Room, PatientTest.assigned_room_id == Room.id
+        )
+
+        if start_date:
+            query = query.filter(PatientTest.created_at >= start_date)
+
+        if end_date:
+            query = query.filter(PatientTest.created_at <= end_date)
+
+        if department_id:
+            query = query.filter(Department.id == department_id)
+
+        query = query.order_by(PatientTest.created_at).execution_options(stream_results=True)
+
+        for row in query.yield_per(REPORT_BATCH_SIZE):
+            wait_time = None
+            if row.assigned_at and row.started_at:
+                wait_time = int((row.started_at - row.assigned_at).total_seconds() / 60)
+
+            test_duration = None
+            if row.started_at and row.completed_at:
+                test_duration = int((row.completed_at - row.started_at).total_seconds() / 60)
+
+            yield {
+                "Patient ID": row.unique_id,
+                "Patient Name": f"{row.first_name} {row.last_name}",
+                "Test": row.test_name,
+                "Department": row.department_name,
+                "Status": row.status,
+                "Room": row.room_number or "Not Assigned",
+                "Wait Time (min)": wait_time or "N/A",
+                "Test Duration (min)": test_duration or "N/A",
+                "Created": row.created_at.strftime("%Y-%m-%d %H:%M"),
+                "Completed": row.completed_at.strftime("%Y-%m-%d %H:%M") if row.completed_at else "N/A"
+            }
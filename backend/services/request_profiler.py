@@ -0,0 +1,510 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import cProfile
+import hmac
+import json
+import logging
+import marshal
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+load_dotenv("config.env")
+
+# Off by default: when on, every request and SQL statement takes a lock to
+# update the histograms
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Fraction of requests whose handler is profiled, e.g. 0.01 for one in a hundred
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests sending "X-Profile: <PROFILE_TOKEN>" are profiled; empty disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# "cprofile" (pstats files) or "pyinstrument" (speedscope JSON; pip install pyinstrument)
+PROFILER = os.getenv("PROFILER", "cprofile").lower()
+# Captured profiles are files here, so any worker on the host can serve them
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "mhcqms-profiles"))
+# Profiles kept in PROFILE_DIR; older ones are deleted
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+WORKER_INDEX = os.getenv("WORKER_INDEX", "0")
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+PROFILE_ID = re.compile(r"[0-9a-f]{12}")
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile, capped at the maximum seen."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs as Prometheus buckets."""
+        buckets = []
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            buckets.append((f"{bound:g}", seen))
+        buckets.append(("+Inf", self.count))
+        return buckets
+
+class RouteStats:
+    __slots__ = ("latency", "db", "serialization", "statements", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.db = Histogram()
+        self.serialization = Histogram()
+        self.statements = 0
+        self.errors = 0
+
+class RequestRecord:
+    __slots__ = ("statements", "db_time", "serialize_time", "sampled", "session")
+
+    def __init__(self, sampled: bool):
+        self.statements = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.sampled = sampled
+        self.session = None
+
+# Set by ProfilingMiddleware; threadpool handlers inherit a copy of the
+# context, so they update the same object
+_current: ContextVar[Optional[RequestRecord]] = ContextVar("request_profile", default=None)
+
+class CProfileSession:
+    name = "cprofile"
+    media_type = "application/octet-stream"
+    extension = "prof"
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+
+    def call(self, function, /, **kwargs):
+        # cProfile follows the thread that enables it: the threadpool thread here
+        return self._profiler.runcall(function, **kwargs)
+
+    async def run(self, coroutine):
+        self._profiler.enable()
+        try:
+            return await coroutine
+        finally:
+            self._profiler.disable()
+
+    def render(self) -> bytes:
+        """The format of ``pstats.Stats.dump_stats``: snakeviz, flameprof, ``python -m pstats``."""
+        self._profiler.create_stats()
+        return marshal.dumps(self._profiler.stats)
+
+class PyinstrumentSession:
+    name = "pyinstrument"
+    media_type = "application/json"
+    extension = "speedscope.json"
+
+    def __init__(self):
+        self._profiler = None
+
+    def call(self, function, /, **kwargs):
+        from pyinstrument import Profiler
+        self._profiler = Profiler(async_mode="disabled")
+        self._profiler.start()
+        try:
+            return function(**kwargs)
+        finally:
+            self._profiler.stop()
+
+    async def run(self, coroutine):
+        from pyinstrument import Profiler
+        # Follows the request's task only, not others interleaved on the event loop
+        self._profiler = Profiler(async_mode="enabled")
+        self._profiler.start()
+        try:
+            return await coroutine
+        finally:
+            self._profiler.stop()
+
+    def render(self) -> bytes:
+        """speedscope JSON (https://www.speedscope.app)."""
+        from pyinstrument.renderers import SpeedscopeRenderer
+        return self._profiler.output(SpeedscopeRenderer()).encode()
+
+def _session_class():
+    if PROFILER == "pyinstrument":
+        try:
+            import pyinstrument  # noqa: F401
+            return PyinstrumentSession
+        except ImportError:
+            logger.warning("request_profiler.pyinstrument_missing profiler=cprofile (pip install pyinstrument)")
+    return CProfileSession
+
+class RequestProfiler:
+    """Opt-in per-route latency histograms, SQL timings and sampled profiles.
+
+    ProfilingMiddleware times each request; SQLAlchemy event hooks count
+    its statements and their time; a wrapper around FastAPI's
+    ``serialize_response`` times response validation and encoding. A
+    sampled request (PROFILE_SAMPLE_RATE, or the X-Profile header) has
+    its endpoint function, not its dependencies, run under a profiler;
+    only one request per worker is profiled at a time. An async endpoint
+    profiled with cProfile also records whatever other requests run on
+    the event loop meanwhile; pyinstrument does not. Histograms are per
+    worker; profiles are written to PROFILE_DIR (a JSON summary next to
+    the profile itself), so whichever worker answers can list and serve
+    them.
+    """
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 token: str = PROFILE_TOKEN, keep: int = PROFILE_KEEP):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.token = token
+        self._lock = threading.Lock()
+        self._routes: Dict[str, RouteStats] = {}
+        self._statements: Dict[Tuple[str, str], Histogram] = {}
+        self.keep = keep
+        self._profiling = threading.Lock()
+        self._session_class = _session_class() if enabled else CProfileSession
+
+    def instrument(self, name: str, engine):
+        """Time SQL statements on an engine (pass ``sync_engine`` for async ones)."""
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+            operation = statement.lstrip()[:7].split(None, 1)[0].upper() if statement.strip() else ""
+            self.record_statement(name, operation if operation in SQL_OPERATIONS else "OTHER", elapsed)
+            record = _current.get()
+            if record is not None:
+                record.statements += 1
+                record.db_time += elapsed
+
+    def instrument_routing(self):
+        """Wrap FastAPI's endpoint call and response serialization (once per process)."""
+        import fastapi.routing
+        if not self.enabled or getattr(fastapi.routing.serialize_response, "_profiled", False):
+            return
+
+        serialize_response = fastapi.routing.serialize_response
+        run_endpoint_function = fastapi.routing.run_endpoint_function
+
+        async def timed_serialize_response(**kwargs):
+            started = time.perf_counter()
+            try:
+                return await serialize_response(**kwargs)
+            finally:
+                record = _current.get()
+                if record is not None:
+                    record.serialize_time += time.perf_counter() - started
+
+        async def profiled_run_endpoint_function(*, dependant, values, is_coroutine):
+            record = _current.get()
+            if record is None or not record.sampled or not self._profiling.acquire(blocking=False):
+                return await run_endpoint_function(dependant=dependant, values=values, is_coroutine=is_coroutine)
+            try:
+                record.session = self._session_class()
+                if is_coroutine:
+                    return await record.session.run(dependant.call(**values))
+                return await run_in_threadpool(record.session.call, dependant.call, **values)
+            finally:
+                self._profiling.release()
+
+        timed_serialize_response._profiled = True
+        fastapi.routing.serialize_response = timed_serialize_response
+        fastapi.routing.run_endpoint_function = profiled_run_endpoint_function
+
+    def should_sample(self, header: Optional[str]) -> bool:
+        if header is not None and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record_statement(self, engine: str, operation: str, seconds: float):
+        with self._lock:
+            histogram = self._statements.get((engine, operation))
+            if histogram is None:
+                histogram = self._statements[(engine, operation)] = Histogram()
+            histogram.observe(seconds)
+
+    def record_request(self, endpoint: str, seconds: float, record: RequestRecord, status_code: int,
+                       path: str = "", profile_id: Optional[str] = None):
+        """Add a finished request to its route's histograms, and keep its profile if it has one."""
+        with self._lock:
+            stats = self._routes.get(endpoint)
+            if stats is None:
+                stats = self._routes[endpoint] = RouteStats()
+            stats.latency.observe(seconds)
+            stats.db.observe(record.db_time)
+            stats.serialization.observe(record.serialize_time)
+            stats.statements += record.statements
+            stats.errors += status_code >= 500
+
+        if record.session is None:
+            return
+        profile_id = profile_id or uuid.uuid4().hex[:12]
+        try:
+            data = record.session.render()
+        except Exception:
+            logger.exception("request_profiler.render_failed endpoint=%s", endpoint)
+            return
+        profile = {
+            "id": profile_id,
+            "worker": int(WORKER_INDEX),
+            "endpoint": endpoint,
+            "path": path,
+            "status_code": status_code,
+            "captured_at": time.time(),
+            "duration_ms": round(seconds * 1000, 3),
+            "statements": record.statements,
+            "db_ms": round(record.db_time * 1000, 3),
+            "serialization_ms": round(record.serialize_time * 1000, 3),
+            "profiler": record.session.name,
+            "media_type": record.session.media_type,
+            "filename": f"{profile_id}.{record.session.extension}"
+        }
+        try:
+            self._store(profile, data)
+        except OSError:
+            logger.exception("request_profiler.store_failed id=%s", profile_id)
+            return
+        logger.info("request_profiler.captured id=%s endpoint=%s duration_ms=%.1f", profile_id, endpoint, seconds * 1000)
+
+    def profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """A stored profile's summary plus its ``data``; None if unknown or already deleted."""
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        path = os.path.join(PROFILE_DIR, profile_id)
+        try:
+            with open(f"{path}.json") as f:
+                profile = json.load(f)
+            with open(f"{path}.data", "rb") as f:
+                return {**profile, "data": f.read()}
+        except (OSError, ValueError):
+            return None
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles of every worker, newest first."""
+        try:
+            names = os.listdir(PROFILE_DIR)
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(PROFILE_DIR, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Deleted or pruned by another worker meanwhile
+                continue
+        return sorted(profiles, key=lambda profile: profile["captured_at"], reverse=True)
+
+    def _store(self, profile: Dict[str, Any], data: bytes):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, profile["id"])
+        part = f"{path}.{os.getpid()}.part"
+        with open(part, "wb") as f:
+            f.write(data)
+        os.replace(part, f"{path}.data")
+        # The summary goes last: a profile is listed once it can be downloaded
+        with open(part, "w") as f:
+            json.dump(profile, f)
+        os.replace(part, f"{path}.json")
+        self._delete(self.profiles()[self.keep:])
+
+    @staticmethod
+    def _delete(profiles: List[Dict[str, Any]]):
+        for profile in profiles:
+            for suffix in (".json", ".data"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, profile["id"] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for endpoint, stats in sorted(self._routes.items()):
+                requests = stats.latency.count
+                routes[endpoint] = {
+                    "requests": requests,
+                    "errors": stats.errors,
+                    "p50_ms": round(stats.latency.quantile(0.5) * 1000, 3),
+                    "p95_ms": round(stats.latency.quantile(0.95) * 1000, 3),
+                    "p99_ms": round(stats.latency.quantile(0.99) * 1000, 3),
+                    "max_ms": round(stats.latency.max * 1000, 3),
+                    "avg_statements": round(stats.statements / requests, 2),
+                    "avg_db_ms": round(stats.db.sum / requests * 1000, 3),
+                    "avg_serialization_ms": round(stats.serialization.sum / requests * 1000, 3)
+                }
+            statements = {
+                f"{engine} {operation}": {
+                    "count": histogram.count,
+                    "avg_ms": round(histogram.sum / histogram.count * 1000, 3),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 3),
+                    "max_ms": round(histogram.max * 1000, 3)
+                }
+                for (engine, operation), histogram in sorted(self._statements.items())
+            }
+
+        return {
+            "enabled": self.enabled,
+            "worker": int(WORKER_INDEX),
+            "sample_rate": self.sample_rate,
+            "profiler": self._session_class.name,
+            "routes": routes,
+            "statements": statements,
+            "profiles": self.profiles()
+        }
+
+    def prometheus(self, database: Dict[str, Any]) -> str:
+        """Prometheus text exposition of ``db_metrics.snapshot()`` and, when enabled, these histograms."""
+        lines: List[str] = []
+        worker = {"worker": WORKER_INDEX}
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def sample(name: str, labels: Dict[str, str], value: float):
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in {**worker, **labels}.items())
+            lines.append(f"{name}{{{label_text}}} {value:g}")
+
+        def histogram(name: str, help_text: str, series: List[Tuple[Dict[str, str], Histogram]]):
+            metric(name, "histogram", help_text)
+            for labels, values in series:
+                for le, count in values.cumulative():
+                    sample(f"{name}_bucket", {**labels, "le": le}, count)
+                sample(f"{name}_sum", labels, values.sum)
+                sample(f"{name}_count", labels, values.count)
+
+        pools = database.get("pools", {})
+        for key, name, kind, help_text in (
+            ("checked_out", "mhcqms_db_pool_checked_out", "gauge", "Connections in use"),
+            ("size", "mhcqms_db_pool_size", "gauge", "Configured pool size"),
+            ("overflow", "mhcqms_db_pool_overflow", "gauge", "Connections open beyond the pool size"),
+            ("checkouts", "mhcqms_db_pool_checkouts_total", "counter", "Connection checkouts"),
+            ("failed_checkouts", "mhcqms_db_pool_checkout_failures_total", "counter", "Checkouts that timed out or failed to connect")
+        ):
+            metric(name, kind, help_text)
+            for pool, state in sorted(pools.items()):
+                if key in state:
+                    sample(name, {"pool": pool}, state[key])
+
+        if self.enabled:
+            with self._lock:
+                routes = sorted(self._routes.items())
+                statements = sorted(self._statements.items())
+
+                def route_labels(endpoint: str) -> Dict[str, str]:
+                    method, _, route = endpoint.partition(" ")
+                    return {"method": method, "route": route} if route else {"method": "", "route": endpoint}
+
+                histogram("mhcqms_http_request_duration_seconds", "Request latency by route",
+                          [(route_labels(endpoint), stats.latency) for endpoint, stats in routes])
+                histogram("mhcqms_http_request_db_seconds", "SQL time per request by route",
+                          [(route_labels(endpoint), stats.db) for endpoint, stats in routes])
+                histogram("mhcqms_http_request_serialization_seconds", "Response validation and encoding time per request by route",
+                          [(route_labels(endpoint), stats.serialization) for endpoint, stats in routes])
+                metric("mhcqms_http_request_sql_statements_total", "counter", "SQL statements executed by route")
+                for endpoint, stats in routes:
+                    sample("mhcqms_http_request_sql_statements_total", route_labels(endpoint), stats.statements)
+                metric("mhcqms_http_request_errors_total", "counter", "Requests answered with a 5xx status by route")
+                for endpoint, stats in routes:
+                    sample("mhcqms_http_request_errors_total", route_labels(endpoint), stats.errors)
+                histogram("mhcqms_sql_statement_duration_seconds", "SQL statement duration by engine and operation",
+                          [({"engine": engine, "operation": operation}, values) for (engine, operation), values in statements])
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._statements.clear()
+        self._delete(self.profiles())
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+request_profiler = RequestProfiler()
+
+class ProfilingMiddleware:
+    """ASGI middleware feeding request_profiler; added only when PROFILING_ENABLED.
+
+    A profiled request's response carries ``X-Profile-Id``, the id to fetch
+    the profile with from ``/api/profiling/profiles/{id}``.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler = request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.lower().encode():
+                header = value.decode("latin-1")
+        record = RequestRecord(self.profiler.should_sample(header))
+        token = _current.set(record)
+        started = time.perf_counter()
+        status_code = 500
+        # The handler has finished once headers go out (bar streamed bodies): name the profile now
+        profile_id = uuid.uuid4().hex[:12] if record.sampled else None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if record.session is not None:
+                    headers: List = list(message.get("headers", []))
+                    headers.append((PROFILE_ID_HEADER.lower().encode(), profile_id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+            self.profiler.record_request(endpoint, time.perf_counter() - started, record, status_code,
+                                         scope.get("path", ""), profile_id)
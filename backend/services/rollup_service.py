@@ -0,0 +1,277 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import Float, func, and_, case, cast
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import PatientTest, Test, QueueMetrics, RollupGranularity
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+
+load_dotenv("config.env")
+
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _start_of_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _minutes(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return (_as_utc(end) - _as_utc(start)).total_seconds() / 60
+
+def _minutes_sql(db: Session, start, end):
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * 1440
+    return cast(func.extract("epoch", end - start), Float) / 60
+
+class RollupStats:
+    """Additive accumulator for one department over one period.
+
+    Patients are the exception: a patient seen on several days is one
+    patient, so bucket counts are not summed. They come from the tests added
+    (``patient_ids``) or from a COUNT(DISTINCT) (``counted_patients``).
+    """
+
+    def __init__(self):
+        self.patient_ids = set()
+        self.counted_patients = 0
+        self.total_tests = 0
+        self.pending_tests = 0
+        self.in_progress_tests = 0
+        self.completed_tests = 0
+        self.wait_time_total = 0.0
+        self.wait_time_samples = 0
+        self.test_duration_total = 0.0
+        self.test_duration_samples = 0
+
+    @property
+    def total_patients(self) -> int:
+        return self.counted_patients + len(self.patient_ids)
+
+    @property
+    def average_wait_time(self) -> float:
+        return self.wait_time_total / self.wait_time_samples if self.wait_time_samples else 0.0
+
+    @property
+    def average_test_duration(self) -> float:
+        return self.test_duration_total / self.test_duration_samples if self.test_duration_samples else 0.0
+
+    def add_test(self, row):
+        self.patient_ids.add(row.patient_id)
+        self.total_tests += 1
+        if row.status == "pending":
+            self.pending_tests += 1
+        elif row.status == "in_progress":
+            self.in_progress_tests += 1
+        elif row.status == "completed":
+            self.completed_tests += 1
+
+            wait_time = _minutes(row.assigned_at, row.started_at)
+            if wait_time is not None:
+                self.wait_time_total += wait_time
+                self.wait_time_samples += 1
+
+            test_duration = _minutes(row.started_at, row.completed_at)
+            if test_duration is not None:
+                self.test_duration_total += test_duration
+                self.test_duration_samples += 1
+
+    def add_rollup(self, row):
+        self.total_tests += row.total_tests or 0
+        self.pending_tests += row.pending_tests or 0
+        self.in_progress_tests += row.in_progress_tests or 0
+        self.completed_tests += row.completed_tests or 0
+        self.wait_time_total += row.wait_time_total or 0.0
+        self.wait_time_samples += row.wait_time_samples or 0
+        self.test_duration_total += row.test_duration_total or 0.0
+        self.test_duration_samples += row.test_duration_samples or 0
+
+class RollupService:
+
+    @staticmethod
+    def _test_rows(db: Session, start: Optional[datetime], end: Optional[datetime] = None) -> Iterable:
+        query = db.query(
+            Test.department_id,
+            PatientTest.patient_id,
+            PatientTest.status,
+            PatientTest.created_at,
+            PatientTest.assigned_at,
+            PatientTest.started_at,
+            PatientTest.completed_at
+        ).join(Test, PatientTest.test_id == Test.id)
+
+        if start is not None:
+            query = query.filter(PatientTest.created_at >= start)
+        if end is not None:
+            query = query.filter(PatientTest.created_at < end)
+
+        return query.yield_per(1000)
+
+    @staticmethod
+    def watermark(db: Session) -> Optional[datetime]:
+        return db.query(func.max(QueueMetrics.updated_at)).scalar()
+
+    @staticmethod
+    def _touched_days(db: Session, since: Optional[datetime], now: datetime) -> list:
+        if since is None:
+            first = db.query(func.min(PatientTest.created_at)).scalar()
+            first_day = _start_of_day(_as_utc(first)) if first else None
+            touched = set()
+        else:
+            first = db.query(func.min(PatientTest.created_at)).filter(PatientTest.created_at >= since).scalar()
+            first_day = _start_of_day(_as_utc(first)) if first else None
+            # Older tests that changed status since the last run
+            touched = {
+                _start_of_day(_as_utc(created_at))
+                for created_at, in db.query(PatientTest.created_at).filter(
+                    and_(PatientTest.created_at < since, PatientTest.updated_at >= since)
+                )
+            }
+
+        if first_day is not None:
+            day = first_day
+            while day <= now:
+                touched.add(day)
+                day += timedelta(days=1)
+
+        return sorted(touched)
+
+    @staticmethod
+    def refresh_day(db: Session, day: datetime, now: datetime):
+        buckets: Dict[Tuple[int, str, datetime], RollupStats] = {}
+        for row in RollupService._test_rows(db, day, day + timedelta(days=1)):
+            created_at = _as_utc(row.created_at)
+            hour = created_at.replace(minute=0, second=0, microsecond=0)
+            for key in ((row.department_id, RollupGranularity.DAY, day), (row.department_id, RollupGranularity.HOUR, hour)):
+                buckets.setdefault(key, RollupStats()).add_test(row)
+
+        db.query(QueueMetrics).filter(
+            and_(QueueMetrics.date >= day, QueueMetrics.date < day + timedelta(days=1))
+        ).delete(synchronize_session=False)
+
+        for (department_id, granularity, bucket), stats in buckets.items():
+            db.add(QueueMetrics(
+                department_id=department_id,
+                granularity=granularity,
+                date=bucket,
+                total_patients=stats.total_patients,
+                total_tests=stats.total_tests,
+                pending_tests=stats.pending_tests,
+                in_progress_tests=stats.in_progress_tests,
+                completed_tests=stats.completed_tests,
+                average_wait_time=stats.average_wait_time,
+                wait_time_samples=stats.wait_time_samples,
+                average_test_duration=stats.average_test_duration,
+                test_duration_samples=stats.test_duration_samples,
+                updated_at=now
+            ))
+
+    @staticmethod
+    def run(db: Session) -> int:
+        """Recompute every daily and hourly bucket touched since the last run."""
+        now = datetime.utcnow()
+        days = RollupService._touched_days(db, RollupService.watermark(db), now)
+        for day in days:
+            RollupService.refresh_day(db, day, now)
+            db.commit()
+        return len(days)
+
+    @staticmethod
+    def run_once() -> int:
+        db = SessionLocal()
+        try:
+            return RollupService.run(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    async def run_periodically(interval: int):
+        while True:
+            try:
+                days = await run_in_threadpool(RollupService.run_once)
+                logger.info("queue_metrics rollup refreshed %d day(s)", days)
+            except Exception:
+                logger.exception("queue_metrics rollup failed")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _aggregate(db: Session, start: Optional[datetime]) -> list:
+        """Per-department totals of the tests created since ``start``, in the shape add_rollup takes."""
+        completed = PatientTest.status == "completed"
+        wait_time = case((completed, _minutes_sql(db, PatientTest.assigned_at, PatientTest.started_at)))
+        test_duration = case((completed, _minutes_sql(db, PatientTest.started_at, PatientTest.completed_at)))
+        query = db.query(
+            Test.department_id,
+            func.count(PatientTest.id).label("total_tests"),
+            func.sum(case((PatientTest.status == "pending", 1), else_=0)).label("pending_tests"),
+            func.sum(case((PatientTest.status == "in_progress", 1), else_=0)).label("in_progress_tests"),
+            func.sum(case((completed, 1), else_=0)).label("completed_tests"),
+            func.sum(wait_time).label("wait_time_total"),
+            func.count(wait_time).label("wait_time_samples"),
+            func.sum(test_duration).label("test_duration_total"),
+            func.count(test_duration).label("test_duration_samples")
+        ).join(Test, PatientTest.test_id == Test.id)
+
+        if start is not None:
+            query = query.filter(PatientTest.created_at >= start)
+        return query.group_by(Test.department_id).all()
+
+    @staticmethod
+    def department_stats(db: Session, include_patients: bool = False) -> Dict[int, RollupStats]:
+        """All-time stats per department: daily rollups plus the tests since.
+
+        Days before the last rollup run are read from queue_metrics; tests
+        created since the start of that day (all of them before the first
+        run) are aggregated in SQL. ``total_patients`` is only filled with
+        ``include_patients``, a COUNT(DISTINCT) over every test.
+        """
+        watermark = RollupService.watermark(db)
+        cutoff = _start_of_day(watermark) if watermark else None
+        stats: Dict[int, RollupStats] = {}
+
+        if cutoff is not None:
+            rollups = db.query(
+                QueueMetrics.department_id,
+                func.sum(QueueMetrics.total_tests).label("total_tests"),
+                func.sum(QueueMetrics.pending_tests).label("pending_tests"),
+                func.sum(QueueMetrics.in_progress_tests).label("in_progress_tests"),
+                func.sum(QueueMetrics.completed_tests).label("completed_tests"),
+                func.sum(QueueMetrics.average_wait_time * QueueMetrics.wait_time_samples).label("wait_time_total"),
+                func.sum(QueueMetrics.wait_time_samples).label("wait_time_samples"),
+                func.sum(QueueMetrics.average_test_duration * QueueMetrics.test_duration_samples).label("test_duration_total"),
+                func.sum(QueueMetrics.test_duration_samples).label("test_duration_samples")
+            ).filter(
+                and_(QueueMetrics.granularity == RollupGranularity.DAY, QueueMetrics.date < cutoff)
+            ).group_by(QueueMetrics.department_id).all()
+
+            for row in rollups:
+                stats.setdefault(row.department_id, RollupStats()).add_rollup(row)
+
+        for row in RollupService._aggregate(db, cutoff):
+            stats.setdefault(row.department_id, RollupStats()).add_rollup(row)
+
+        if include_patients:
+            patients = db.query(Test.department_id, func.count(func.distinct(PatientTest.patient_id))).join(
+                Test, PatientTest.test_id == Test.id
+            ).group_by(Test.department_id)
+            for department_id, count in patients:
+                stats.setdefault(department_id, RollupStats()).counted_patients = count
+
+        return stats
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Refreshed rollups for {RollupService.run_once()} day(s)")
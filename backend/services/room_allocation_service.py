@@ -0,0 +1,34 @@
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from models import Room
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RoomAllocationService:
+    """Atomic room claims.
+
+    Reading ``room.is_available`` and writing it back in a later flush lets
+    two concurrent requests both see the room free. Here the check and the
+    write are one ``UPDATE ... WHERE is_available``: the database serializes
+    writers on the row, so exactly one of them gets ``rowcount == 1``. The
+    claim belongs to the caller's transaction and is undone by its rollback.
+    """
+
+    @staticmethod
+    def claim(db: Session, room_id: int) -> bool:
+        result = db.execute(
+            update(Room)
+            .where(Room.id == room_id, Room.is_available == True)
+            .values(is_available=False)
+        )
+        claimed = result.rowcount == 1
+        if not claimed:
+            logger.info("room_allocation.claim_conflict room_id=%s", room_id)
+        return claimed
+
+    @staticmethod
+    def release(db: Session, room_id: Optional[int]) -> None:
+        if room_id:
+            db.execute(update(Room).where(Room.id == room_id).values(is_available=True))
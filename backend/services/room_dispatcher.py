@@ -0,0 +1,272 @@
+from sqlalchemy import and_, event, exists, select, update
+from sqlalchemy.orm import Session, aliased
+from database import SessionLocal
+from models import PatientTest, Patient, Test, Room
+from services.shared_state import shared_state
+from services.test_catalog import test_catalog
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+import heapq
+import logging
+import os
+import threading
+
+load_dotenv("config.env")
+
+ROOM_DISPATCH_ENABLED = os.getenv("ROOM_DISPATCH_ENABLED", "false").lower() == "true"
+
+RISK_PRIORITY = {"high": 0, "medium": 1, "low": 2}
+# Tests without a duration sort as if they took this long (minutes)
+DEFAULT_TEST_DURATION = 30
+
+logger = logging.getLogger(__name__)
+
+class DispatchEntry(NamedTuple):
+    # Heap order is field order: highest risk, then longest wait, then shortest test
+    risk_rank: int
+    waiting_since: float
+    duration: int
+    patient_test_id: int
+    patient_id: int
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return datetime.now(timezone.utc).timestamp()
+    # Naive values are UTC (SQLite and datetime.utcnow())
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+class RoomDispatcher:
+    """Per-department priority heaps of pending, unassigned patient tests.
+
+    Rebuilt from the database at startup and kept current as tests are
+    registered, assigned or change status. When a room frees up its
+    department's heap yields the next patient in O(log n). Entries removed
+    elsewhere are only marked stale and skipped when they surface; the
+    assignment itself is a conditional UPDATE, so an entry that went stale
+    in another worker is skipped as well. Removals and assignments take
+    effect when the session that made them commits; an entry taken by a
+    dispatch that rolls back goes back on its heap. Other workers' heaps
+    follow through services.shared_state: new entries and removals are
+    published.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._heaps: Dict[int, List[DispatchEntry]] = {}
+        # Live entry per patient test; anything else in a heap is stale
+        self._queued: Dict[int, DispatchEntry] = {}
+        self._department_of: Dict[int, int] = {}
+        self._stale = 0
+
+    def rebuild(self, db: Session):
+        rows = db.execute(
+            select(
+                PatientTest.id, PatientTest.patient_id, PatientTest.created_at,
+                Patient.risk_level, Test.department_id, Test.estimated_duration
+            ).join(Patient, PatientTest.patient_id == Patient.id)
+            .join(Test, PatientTest.test_id == Test.id)
+            .where(PatientTest.status == "pending", PatientTest.assigned_room_id.is_(None))
+        ).all()
+
+        heaps: Dict[int, List[DispatchEntry]] = {}
+        queued, department_of = {}, {}
+        for row in rows:
+            entry = self._entry(row.id, row.patient_id, row.risk_level, row.created_at, row.estimated_duration)
+            heaps.setdefault(row.department_id, []).append(entry)
+            queued[row.id] = entry
+            department_of[row.id] = row.department_id
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        with self._lock:
+            self._heaps, self._queued, self._department_of, self._stale = heaps, queued, department_of, 0
+        logger.info("room_dispatcher.rebuilt queued=%d departments=%d", len(queued), len(heaps))
+
+    def enqueue(self, db: Session, patient_tests: Iterable, risk_level: str):
+        """Add new pending tests (anything with id, patient_id, test_id, created_at)."""
+        if not self.enabled:
+            return
+        tests = test_catalog.get(db).tests
+        entries = []
+        for pt in patient_tests:
+            test = tests.get(pt.test_id)
+            if test is not None:
+                entries.append((test.department_id, self._entry(pt.id, pt.patient_id, risk_level, pt.created_at, test.estimated_duration)))
+        self._push(entries)
+        if entries:
+            shared_state.publish("room_dispatcher.enqueued", {"entries": entries})
+
+    def discard(self, db: Session, patient_test_id: int):
+        """The test was assigned, started or cancelled outside the dispatcher; applied when ``db`` commits."""
+        if self.enabled:
+            db.info.setdefault("room_dispatcher_discarded", set()).add(patient_test_id)
+
+    def dispatch(self, db: Session, room: Room) -> Optional[DispatchEntry]:
+        """Assign the highest-priority waiting test to ``room``, which the caller holds.
+
+        Returns the assigned entry, or None when nobody in the room's
+        department can be called; the caller then frees the room. Patients
+        busy in another room keep their place in the heap.
+        """
+        if not self.enabled:
+            return None
+
+        # The caller's own status change (e.g. the test just completed here)
+        # must be visible to the busy-patient check
+        db.flush()
+        deferred = []
+        try:
+            while True:
+                entry = self._pop(room.department_id)
+                if entry is None:
+                    return None
+                assigned = self._assign(db, entry, room.id)
+                if assigned is None:
+                    deferred.append(entry)
+                    continue
+                # Off the heap now; dropped for good on commit, restored on rollback
+                db.info.setdefault("room_dispatcher_taken", []).append(entry)
+                if assigned:
+                    logger.info(
+                        "room_dispatcher.assigned room_id=%s patient_test_id=%s risk_rank=%s",
+                        room.id, entry.patient_test_id, entry.risk_rank
+                    )
+                    return entry
+        finally:
+            self._restore(deferred)
+
+    def queued(self) -> Dict[int, int]:
+        """Waiting tests per department id."""
+        with self._lock:
+            counts: Dict[int, int] = {}
+            for department_id in self._department_of.values():
+                counts[department_id] = counts.get(department_id, 0) + 1
+            return counts
+
+    @staticmethod
+    def _entry(patient_test_id, patient_id, risk_level, created_at, duration) -> DispatchEntry:
+        return DispatchEntry(
+            RISK_PRIORITY.get(risk_level, len(RISK_PRIORITY)),
+            _timestamp(created_at),
+            duration if duration is not None else DEFAULT_TEST_DURATION,
+            patient_test_id,
+            patient_id
+        )
+
+    def _pop(self, department_id: int) -> Optional[DispatchEntry]:
+        with self._lock:
+            heap = self._heaps.get(department_id)
+            while heap:
+                entry = heapq.heappop(heap)
+                if self._queued.get(entry.patient_test_id) is entry:
+                    # Stays in _queued until assigned, so a deferral can put it back
+                    return entry
+                self._stale = max(self._stale - 1, 0)
+            return None
+
+    def _assign(self, db: Session, entry: DispatchEntry, room_id: int) -> Optional[bool]:
+        """True if assigned, None if the patient is busy elsewhere, False if the entry is stale."""
+        other = aliased(PatientTest)
+        patient_busy = exists().where(and_(
+            other.patient_id == entry.patient_id,
+            other.assigned_room_id.is_not(None),
+            other.status.in_(("pending", "in_progress"))
+        ))
+        result = db.execute(
+            update(PatientTest)
+            .where(
+                PatientTest.id == entry.patient_test_id,
+                PatientTest.status == "pending",
+                PatientTest.assigned_room_id.is_(None),
+                ~patient_busy
+            )
+            .values(assigned_room_id=room_id, assigned_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return True
+
+        still_waiting = db.execute(
+            select(PatientTest.id).where(
+                PatientTest.id == entry.patient_test_id,
+                PatientTest.status == "pending",
+                PatientTest.assigned_room_id.is_(None)
+            )
+        ).first()
+        return None if still_waiting else False
+
+    def _push(self, entries: List[Tuple[int, DispatchEntry]]):
+        with self._lock:
+            for department_id, entry in entries:
+                if entry.patient_test_id in self._queued:
+                    continue
+                heapq.heappush(self._heaps.setdefault(department_id, []), entry)
+                self._queued[entry.patient_test_id] = entry
+                self._department_of[entry.patient_test_id] = department_id
+
+    def _restore(self, entries: List[DispatchEntry]):
+        # Popped entries that are still live go back on their heap
+        with self._lock:
+            for entry in entries:
+                if self._queued.get(entry.patient_test_id) is entry:
+                    heapq.heappush(self._heaps.setdefault(self._department_of[entry.patient_test_id], []), entry)
+
+    def _discard(self, patient_test_ids: Iterable[int], taken: Iterable[DispatchEntry] = ()):
+        with self._lock:
+            for entry in taken:
+                self._remove(entry.patient_test_id)
+            for patient_test_id in patient_test_ids:
+                if self._remove(patient_test_id):
+                    # Its heap entry stays behind until popped or compacted
+                    self._stale += 1
+            if self._stale > max(len(self._queued), 64):
+                self._compact()
+
+    def _remove(self, patient_test_id: int) -> bool:
+        # Caller holds the lock
+        self._department_of.pop(patient_test_id, None)
+        return self._queued.pop(patient_test_id, None) is not None
+
+    def _compact(self):
+        # Caller holds the lock: drop stale entries once they outnumber live ones
+        heaps: Dict[int, List[DispatchEntry]] = {}
+        for patient_test_id, entry in self._queued.items():
+            heaps.setdefault(self._department_of[patient_test_id], []).append(entry)
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        self._heaps, self._stale = heaps, 0
+
+room_dispatcher = RoomDispatcher(ROOM_DISPATCH_ENABLED)
+
+def _rebuild_dispatcher():
+    if room_dispatcher.enabled:
+        with SessionLocal() as db:
+            room_dispatcher.rebuild(db)
+
+def _relay_enqueued(message: dict):
+    if room_dispatcher.enabled:
+        room_dispatcher._push([(department_id, DispatchEntry(*entry)) for department_id, entry in message["entries"]])
+
+@event.listens_for(Session, "after_commit")
+def _discard_on_commit(session):
+    taken = session.info.pop("room_dispatcher_taken", [])
+    discarded = session.info.pop("room_dispatcher_discarded", set())
+    if taken or discarded:
+        room_dispatcher._discard(discarded, taken)
+        for patient_test_id in discarded | {entry.patient_test_id for entry in taken}:
+            shared_state.publish("room_dispatcher.discarded", {"patient_test_id": patient_test_id})
+
+# Not after_rollback: closing a session that never committed skips it
+@event.listens_for(Session, "after_transaction_end")
+def _restore_uncommitted(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("room_dispatcher_discarded", None)
+        room_dispatcher._restore(session.info.pop("room_dispatcher_taken", []))
+
+shared_state.subscribe("room_dispatcher.enqueued", _relay_enqueued, resync=_rebuild_dispatcher)
+shared_state.subscribe(
+    "room_dispatcher.discarded",
+    lambda message: room_dispatcher._discard([message["patient_test_id"]])
+)
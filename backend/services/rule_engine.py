@@ -0,0 +1,164 @@
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+from dotenv import load_dotenv
+import os
+import yaml
+
+# numpy and pandas are only needed for batch evaluation; importing them
+# here would add their load time to every worker's cold start
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+load_dotenv("config.env")
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules", "test_assignment.yaml")
+TEST_RULES_PATH = os.getenv("TEST_RULES_PATH", DEFAULT_RULES_PATH)
+
+RISK_FLAGS = ("smoking", "diabetes", "hypertension", "obesity", "family_history")
+
+# One compiled condition: a scalar check on a feature dict and the same
+# check over a DataFrame column, returning a boolean array
+class Condition(NamedTuple):
+    check: Callable[[Dict[str, Any]], bool]
+    vector: Callable[["pd.DataFrame"], "np.ndarray"]
+
+class TestRule(NamedTuple):
+    key: str
+    department: str
+    name_contains: List[str]
+    groups: List[List[Condition]]
+
+    def matches_test(self, department_type: Optional[str], name: str) -> bool:
+        name = name.lower()
+        return department_type == self.department and all(word in name for word in self.name_contains)
+
+def _as_list(value) -> List:
+    return [value] if isinstance(value, (str, bool, int)) else list(value)
+
+def _compile_condition(key: str, value) -> Condition:
+    if key == "min_age":
+        return Condition(lambda f: f["age"] >= value, lambda df: (df["age"] >= value).to_numpy())
+    if key == "max_age":
+        return Condition(lambda f: f["age"] <= value, lambda df: (df["age"] <= value).to_numpy())
+    if key in ("gender", "risk_level"):
+        allowed = {str(v).lower() for v in _as_list(value)}
+        return Condition(lambda f: f[key] in allowed, lambda df: df[key].isin(allowed).to_numpy())
+    if key in RISK_FLAGS:
+        expected = bool(value)
+        return Condition(lambda f: f[key] == expected, lambda df: (df[key] == expected).to_numpy())
+    raise ValueError(f"Unknown rule condition '{key}'")
+
+def _compile_groups(when) -> List[List[Condition]]:
+    if when is None:
+        return []
+    groups = [when] if isinstance(when, dict) else when
+    return [[_compile_condition(key, value) for key, value in group.items()] for group in groups]
+
+class RuleSet:
+    """Screening rules compiled once into closures for patients and batches.
+
+    ``assign`` scores one patient's feature dict; ``evaluate`` runs the same
+    rules over a whole DataFrame with NumPy, one vector op per condition.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        risk = spec["risk"]
+        self.flag_points = {flag: int(points) for flag, points in risk.get("flags", {}).items()}
+        for flag in self.flag_points:
+            if flag not in RISK_FLAGS:
+                raise ValueError(f"Unknown risk flag '{flag}'")
+        self.age_points = sorted(((b["min_age"], b["points"]) for b in risk.get("age_points", [])), reverse=True)
+        self.levels = sorted(((l["min_score"], l["level"]) for l in risk["levels"]), reverse=True)
+        self.default_level = self.levels[-1][1]
+
+        self.tests = [
+            TestRule(
+                key=test["key"],
+                department=test["match"]["department"],
+                name_contains=[word.lower() for word in test["match"]["name_contains"]],
+                groups=_compile_groups(test.get("when"))
+            )
+            for test in spec["tests"]
+        ]
+        if len({test.key for test in self.tests}) != len(self.tests):
+            raise ValueError("Duplicate test keys in assignment rules")
+
+    @staticmethod
+    def features(patient) -> Dict[str, Any]:
+        """Rule inputs for one patient (ORM object or anything with the same attributes)."""
+        features = {flag: bool(getattr(patient, flag)) for flag in RISK_FLAGS}
+        features["age"] = datetime.now().year - patient.date_of_birth.year
+        features["gender"] = (patient.gender or "").lower()
+        return features
+
+    def risk_score(self, features: Dict[str, Any]) -> int:
+        score = sum(points for flag, points in self.flag_points.items() if features[flag])
+        return score + next((points for min_age, points in self.age_points if features["age"] >= min_age), 0)
+
+    def risk_level(self, features: Dict[str, Any]) -> str:
+        score = self.risk_score(features)
+        return next((level for min_score, level in self.levels if score >= min_score), self.default_level)
+
+    def assign(self, features: Dict[str, Any]) -> List[str]:
+        """Test keys for one patient, in rule order."""
+        features = {**features, "risk_level": self.risk_level(features)}
+        return [
+            test.key for test in self.tests
+            if not test.groups or any(all(c.check(features) for c in group) for group in test.groups)
+        ]
+
+    def evaluate(self, patients: "pd.DataFrame") -> "pd.DataFrame":
+        """Vectorized ``risk_level`` + ``assign`` for a batch.
+
+        Needs the RISK_FLAGS columns, ``gender`` and either ``age`` or
+        ``date_of_birth``. Returns ``risk_score``, ``risk_level`` and one
+        boolean column per test key, on the input's index.
+        """
+        import numpy as np
+        import pandas as pd
+
+        frame = pd.DataFrame(index=patients.index)
+        for flag in RISK_FLAGS:
+            frame[flag] = patients[flag].fillna(False).astype(bool)
+        frame["gender"] = patients["gender"].fillna("").str.lower()
+        if "age" in patients:
+            frame["age"] = patients["age"].to_numpy()
+        else:
+            frame["age"] = datetime.now().year - pd.to_datetime(patients["date_of_birth"], utc=True).dt.year
+
+        score = np.zeros(len(frame), dtype=np.int64)
+        for flag, points in self.flag_points.items():
+            score += frame[flag].to_numpy() * points
+        if self.age_points:
+            age = frame["age"].to_numpy()
+            score += np.select([age >= min_age for min_age, _ in self.age_points], [p for _, p in self.age_points], 0)
+        frame["risk_score"] = score
+        frame["risk_level"] = np.select(
+            [score >= min_score for min_score, _ in self.levels],
+            [level for _, level in self.levels],
+            self.default_level
+        )
+
+        result = frame[["risk_score", "risk_level"]].copy()
+        for test in self.tests:
+            if not test.groups:
+                result[test.key] = True
+                continue
+            mask = np.zeros(len(frame), dtype=bool)
+            for group in test.groups:
+                group_mask = np.ones(len(frame), dtype=bool)
+                for condition in group:
+                    group_mask &= condition.vector(frame)
+                mask |= group_mask
+            result[test.key] = mask
+        return result
+
+    def test_keys(self) -> Sequence[str]:
+        return [test.key for test in self.tests]
+
+def load_rules(path: str = TEST_RULES_PATH) -> RuleSet:
+    with open(path) as file:
+        return RuleSet(yaml.safe_load(file))
+
+assignment_rules = load_rules()
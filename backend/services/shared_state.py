@@ -0,0 +1,268 @@
+from typing import Callable, Dict, Iterator, Optional
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+load_dotenv("config.env")
+
+# "local": the launcher's Unix socket hub (serve.py); "redis": pub/sub on REDIS_URL
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "local").lower()
+# Set by serve.py for its workers; without it a local backend has nobody to talk to
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET", "")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SHARED_STATE_CHANNEL = os.getenv("SHARED_STATE_CHANNEL", "mhcqms")
+# 0 for the worker that runs once-per-deployment jobs (set by serve.py)
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+RECONNECT_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+class LocalHub:
+    """Runs in the launcher: relays every line a worker sends to all other workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Per connection, the lock its senders hold: each worker has its own
+        # relay thread, and unserialized sendall calls interleave their lines
+        self._connections: Dict[socket.socket, threading.Lock] = {}
+        self._server: Optional[socket.socket] = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(64)
+        threading.Thread(target=self._accept, name="shared-state-hub", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._connections[connection] = threading.Lock()
+            threading.Thread(target=self._relay, args=(connection,), daemon=True).start()
+
+    def _relay(self, connection: socket.socket):
+        try:
+            with connection.makefile("rb") as lines:
+                for line in lines:
+                    with self._lock:
+                        others = [(other, lock) for other, lock in self._connections.items() if other is not connection]
+                    for other, send_lock in others:
+                        try:
+                            with send_lock:
+                                other.sendall(line)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._connections.pop(connection, None)
+            connection.close()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = {}
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class LocalBackend:
+    """A worker's connection to the launcher's LocalHub."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._socket: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.path)
+        with self._lock:
+            self._socket = connection
+
+    def receive(self) -> Iterator[bytes]:
+        with self._socket.makefile("rb") as lines:
+            yield from lines
+        raise ConnectionError("shared state hub closed the connection")
+
+    def send(self, data: bytes):
+        with self._lock:
+            if self._socket is None:
+                raise ConnectionError("not connected to the shared state hub")
+            self._socket.sendall(data + b"\n")
+
+    def close(self):
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+class RedisBackend:
+    """Pub/sub on one Redis channel, for workers on several hosts.
+
+    Needs the optional ``redis`` package. ``client`` is anything with
+    redis-py's ``publish`` and ``pubsub``; a stand-in can be passed to run
+    without a server.
+    """
+
+    def __init__(self, url: str, channel: str, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._client = client
+        self._pubsub = None
+
+    def connect(self):
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+
+    def receive(self) -> Iterator[bytes]:
+        for message in self._pubsub.listen():
+            if message.get("type") == "message":
+                yield message["data"]
+        raise ConnectionError("redis subscription ended")
+
+    def send(self, data: bytes):
+        self._client.publish(self.channel, data)
+
+    def close(self):
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+def _default_backend():
+    if SHARED_STATE_BACKEND == "redis":
+        try:
+            return RedisBackend(REDIS_URL, SHARED_STATE_CHANNEL)
+        except ImportError:
+            logger.warning("shared_state.redis_missing backend=redis workers will not share state (pip install redis)")
+            return None
+    if SHARED_STATE_SOCKET:
+        return LocalBackend(SHARED_STATE_SOCKET)
+    return None
+
+class SharedState:
+    """Keeps per-worker caches and indexes coherent across server workers.
+
+    Services publish what they changed after their commit ("the test
+    catalog changed", "patient test 12 went in_progress"); every other
+    worker applies the same change to its own copy, on a listener thread.
+    Without a backend (a single uvicorn process) publishing is a no-op.
+    After a lost connection each topic's ``resync`` runs, since changes may
+    have been missed in between.
+    """
+
+    def __init__(self, backend_factory: Callable[[], object] = _default_backend):
+        self._backend_factory = backend_factory
+        self._backend = None
+        self._origin = uuid.uuid4().hex
+        self._handlers: Dict[str, Handler] = {}
+        self._resyncs: Dict[str, Callable[[], None]] = {}
+        self._stopped = threading.Event()
+        self._connected = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    @property
+    def is_primary(self) -> bool:
+        """Whether this worker runs the once-per-deployment background jobs."""
+        return WORKER_INDEX == 0
+
+    def subscribe(self, topic: str, handler: Handler, resync: Optional[Callable[[], None]] = None):
+        self._handlers[topic] = handler
+        if resync is not None:
+            self._resyncs[topic] = resync
+
+    def publish(self, topic: str, message: Optional[dict] = None):
+        if self._backend is None:
+            return
+        data = json.dumps({"origin": self._origin, "topic": topic, "message": message or {}}).encode()
+        try:
+            self._backend.send(data)
+        except Exception as e:
+            # The listener reconnects; the other workers resync then
+            logger.warning("shared_state.publish_failed topic=%s error=%s", topic, e)
+
+    def start(self, timeout: float = 5.0):
+        """Connect and start listening; waits up to ``timeout`` for the first connection."""
+        if self._backend is None:
+            self._backend = self._backend_factory()
+        if self._backend is None:
+            return
+        self._stopped.clear()
+        threading.Thread(target=self._listen, name="shared-state", daemon=True).start()
+        if not self._connected.wait(timeout):
+            logger.warning("shared_state.not_connected backend=%s", type(self._backend).__name__)
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+        self._connected.clear()
+
+    def _listen(self):
+        backend = self._backend
+        reconnecting = False
+        while not self._stopped.is_set():
+            try:
+                backend.connect()
+                self._connected.set()
+                logger.info("shared_state.connected backend=%s", type(backend).__name__)
+                if reconnecting:
+                    self._resync()
+                for data in backend.receive():
+                    self._dispatch(data)
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                logger.warning("shared_state.disconnected error=%s", e)
+            reconnecting = True
+            time.sleep(RECONNECT_SECONDS)
+
+    def _dispatch(self, data: bytes):
+        try:
+            envelope = json.loads(data)
+        except ValueError:
+            # Whatever change it carried is lost; rebuild from the database
+            logger.warning("shared_state.undecodable_message bytes=%d", len(data))
+            self._resync()
+            return
+        if envelope.get("origin") == self._origin:
+            return
+        handler = self._handlers.get(envelope.get("topic"))
+        if handler is None:
+            return
+        try:
+            handler(envelope.get("message") or {})
+        except Exception:
+            logger.exception("shared_state.handler_failed topic=%s", envelope.get("topic"))
+
+    def _resync(self):
+        for topic, resync in list(self._resyncs.items()):
+            try:
+                resync()
+            except Exception:
+                logger.exception("shared_state.resync_failed topic=%s", topic)
+
+shared_state = SharedState()
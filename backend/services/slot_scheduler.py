@@ -0,0 +1,288 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import Appointment, Room
+from services.room_dispatcher import DEFAULT_TEST_DURATION
+from services.shared_state import shared_state
+from services.test_catalog import test_catalog
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import threading
+
+load_dotenv("config.env")
+
+# Bookable hours and the grid slot starts are offered on (clinic local time)
+APPOINTMENT_DAY_START = time.fromisoformat(os.getenv("APPOINTMENT_DAY_START", "08:00"))
+APPOINTMENT_DAY_END = time.fromisoformat(os.getenv("APPOINTMENT_DAY_END", "20:00"))
+APPOINTMENT_SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "15"))
+SLOT_INDEX_RECONCILE_SECONDS = int(os.getenv("SLOT_INDEX_RECONCILE_SECONDS", "300"))
+
+# Appointments in these states no longer hold their slot
+INACTIVE_STATUSES = ("cancelled", "completed")
+# Longest booking the database overlap check looks back for
+MAX_APPOINTMENT_MINUTES = 24 * 60
+
+logger = logging.getLogger(__name__)
+
+def _naive(value: datetime) -> datetime:
+    # appointment_date is stored without a zone; aware input is taken as UTC
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _bookable(candidate: datetime, duration: timedelta) -> datetime:
+    """Earliest grid-aligned start at or after ``candidate`` that fits in bookable hours."""
+    step = timedelta(minutes=APPOINTMENT_SLOT_MINUTES)
+    while True:
+        midnight = candidate.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidate = midnight + -((midnight - candidate) // step) * step
+        day_start = datetime.combine(candidate.date(), APPOINTMENT_DAY_START)
+        if candidate < day_start:
+            candidate = day_start
+        if candidate + duration <= datetime.combine(candidate.date(), APPOINTMENT_DAY_END):
+            return candidate
+        candidate = datetime.combine(candidate.date() + timedelta(days=1), APPOINTMENT_DAY_START)
+
+class RoomSlots:
+    """Bookings of one room plus their union as sorted, disjoint busy blocks.
+
+    ``starts``/``ends`` are parallel sorted lists, so both questions the
+    scheduler asks are a bisect: is [start, end) free, and where does the
+    next gap after T begin.
+    """
+
+    __slots__ = ("bookings", "starts", "ends")
+
+    def __init__(self):
+        self.bookings: Dict[int, Tuple[datetime, datetime]] = {}
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+
+    def add(self, appointment_id: int, start: datetime, end: datetime):
+        self.bookings[appointment_id] = (start, end)
+        # Blocks touching [start, end) are merged into one
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        if first < last:
+            start, end = min(start, self.starts[first]), max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    def remove(self, appointment_id: int):
+        if self.bookings.pop(appointment_id, None) is None:
+            return
+        # Blocks do not remember their parts; re-merge this room's bookings
+        bookings = sorted(self.bookings.items(), key=lambda item: item[1])
+        self.bookings, self.starts, self.ends = {}, [], []
+        for other_id, (start, end) in bookings:
+            self.add(other_id, start, end)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        before = bisect_right(self.starts, start) - 1
+        if before >= 0 and self.ends[before] > start:
+            return False
+        return before + 1 >= len(self.starts) or self.starts[before + 1] >= end
+
+    def first_free(self, after: datetime, duration: timedelta, until: datetime) -> Optional[datetime]:
+        """Earliest bookable start >= ``after`` with ``duration`` free, before ``until``."""
+        if datetime.combine(after.date(), APPOINTMENT_DAY_START) + duration > datetime.combine(after.date(), APPOINTMENT_DAY_END):
+            return None
+        candidate = after
+        while True:
+            candidate = _bookable(candidate, duration)
+            if candidate >= until:
+                return None
+            # First block still running at the candidate start
+            block = bisect_right(self.ends, candidate)
+            if block < len(self.starts) and self.starts[block] < candidate + duration:
+                candidate = self.ends[block]
+                continue
+            return candidate
+
+class SlotScheduler:
+    """Per-room interval index of active appointments for slot booking.
+
+    Answers "is this slot free" and "first free slot after T" from memory.
+    Bookings are still verified against the database under a lock on the
+    room row (``reserve``), so a stale index in another worker can only
+    cost a rejected booking, never a double booking. Changes are published
+    to the other workers' indexes through services.shared_state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots: Dict[int, RoomSlots] = {}
+        self._room_of: Dict[int, int] = {}
+        # room_id -> (room_number, department_id)
+        self._rooms: Dict[int, Tuple[str, int]] = {}
+        self.loaded_at: Optional[datetime] = None
+
+    def rebuild(self, db: Session):
+        since = datetime.utcnow() - timedelta(days=1)
+        rooms = db.execute(select(Room.id, Room.room_number, Room.department_id)).all()
+        appointments = db.execute(
+            select(Appointment.id, Appointment.room_id, Appointment.appointment_date, Appointment.duration_minutes)
+            .where(Appointment.appointment_date >= since, Appointment.status.notin_(INACTIVE_STATUSES))
+        ).all()
+
+        slots: Dict[int, RoomSlots] = {room_id: RoomSlots() for room_id, _, _ in rooms}
+        room_of = {}
+        for appointment_id, room_id, appointment_date, duration_minutes in sorted(appointments, key=lambda row: row.appointment_date):
+            if room_id in slots:
+                start = _naive(appointment_date)
+                slots[room_id].add(appointment_id, start, start + self._duration(duration_minutes))
+                room_of[appointment_id] = room_id
+
+        with self._lock:
+            self._slots, self._room_of = slots, room_of
+            self._rooms = {room_id: (room_number, department_id) for room_id, room_number, department_id in rooms}
+            self.loaded_at = datetime.utcnow()
+        logger.info("slot_scheduler.rebuilt rooms=%d appointments=%d", len(rooms), len(room_of))
+
+    def rebuild_once(self):
+        with SessionLocal() as db:
+            self.rebuild(db)
+
+    async def run_periodically(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.rebuild_once)
+            except Exception:
+                logger.exception("slot_scheduler.rebuild_failed")
+
+    @staticmethod
+    def duration_for(db: Session, test_id: Optional[int]) -> int:
+        test = test_catalog.get(db).tests.get(test_id) if test_id else None
+        if test and test.estimated_duration:
+            return test.estimated_duration
+        return DEFAULT_TEST_DURATION
+
+    def track(self, appointment: Appointment):
+        """Index an appointment as committed; inactive ones release their slot."""
+        booking = {
+            "id": appointment.id,
+            "room_id": appointment.room_id,
+            "status": appointment.status,
+            "start": _naive(appointment.appointment_date).isoformat(),
+            "duration_minutes": appointment.duration_minutes
+        }
+        self._track(booking)
+        shared_state.publish("slot_scheduler.tracked", booking)
+
+    def _track(self, booking: dict):
+        with self._lock:
+            old_room = self._room_of.pop(booking["id"], None)
+            if old_room in self._slots:
+                self._slots[old_room].remove(booking["id"])
+            if booking["status"] in INACTIVE_STATUSES or booking["room_id"] is None:
+                return
+            start = datetime.fromisoformat(booking["start"])
+            self._slots.setdefault(booking["room_id"], RoomSlots()).add(
+                booking["id"], start, start + self._duration(booking["duration_minutes"])
+            )
+            self._room_of[booking["id"]] = booking["room_id"]
+
+    def forget(self, appointment_id: int, broadcast: bool = True):
+        with self._lock:
+            room_id = self._room_of.pop(appointment_id, None)
+            if room_id in self._slots:
+                self._slots[room_id].remove(appointment_id)
+        if broadcast:
+            shared_state.publish("slot_scheduler.forgotten", {"id": appointment_id})
+
+    def is_free(self, room_id: int, start: datetime, duration_minutes: int) -> bool:
+        start = _naive(start)
+        with self._lock:
+            slots = self._slots.get(room_id)
+            return slots is None or slots.is_free(start, start + timedelta(minutes=duration_minutes))
+
+    def available_slots(
+        self,
+        room_ids: List[int],
+        start: datetime,
+        end: datetime,
+        duration_minutes: int,
+        limit: int
+    ) -> List[dict]:
+        """Free slots across ``room_ids``, earliest first; ``limit=1`` is the first free slot."""
+        start, end = _naive(start), _naive(end)
+        duration = timedelta(minutes=duration_minutes)
+        step = timedelta(minutes=APPOINTMENT_SLOT_MINUTES)
+        results = []
+        with self._lock:
+            for room_id in room_ids:
+                slots = self._slots.get(room_id) or RoomSlots()
+                candidate = start
+                for _ in range(limit):
+                    candidate = slots.first_free(candidate, duration, end)
+                    if candidate is None:
+                        break
+                    results.append((candidate, room_id))
+                    candidate += step
+            results.sort()
+            return [{
+                "room_id": room_id,
+                "room_number": self._rooms.get(room_id, ("", None))[0],
+                "start": slot_start,
+                "end": slot_start + duration
+            } for slot_start, room_id in results[:limit]]
+
+    def rooms_for_department(self, department_id: int) -> List[int]:
+        with self._lock:
+            return sorted(room_id for room_id, (_, room_department) in self._rooms.items() if room_department == department_id)
+
+    def reserve(
+        self,
+        db: Session,
+        room_id: int,
+        start: datetime,
+        duration_minutes: int,
+        appointment_id: Optional[int] = None
+    ) -> Optional[bool]:
+        """Lock the room row and check the slot against the database.
+
+        Returns None if the room does not exist, False if the slot overlaps
+        another active appointment (ignoring ``appointment_id`` itself) and
+        True if it is free; the lock holds until the caller's commit, so
+        concurrent bookings of the same room run one after the other.
+        """
+        start = _naive(start)
+        end = start + timedelta(minutes=duration_minutes)
+        # A no-op UPDATE takes the row lock on PostgreSQL and the write lock on SQLite
+        locked = db.execute(
+            update(Room).where(Room.id == room_id).values(room_number=Room.room_number)
+            .execution_options(synchronize_session=False)
+        )
+        if locked.rowcount == 0:
+            return None
+
+        query = select(Appointment.id, Appointment.appointment_date, Appointment.duration_minutes).where(
+            Appointment.room_id == room_id,
+            Appointment.status.notin_(INACTIVE_STATUSES),
+            Appointment.appointment_date < end,
+            Appointment.appointment_date > start - timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+        )
+        if appointment_id is not None:
+            query = query.where(Appointment.id != appointment_id)
+        for other_id, other_date, other_minutes in db.execute(query).all():
+            other_start = _naive(other_date)
+            if other_start + self._duration(other_minutes) > start:
+                logger.info("slot_scheduler.conflict room_id=%s start=%s appointment_id=%s", room_id, start, other_id)
+                return False
+        return True
+
+    @staticmethod
+    def _duration(duration_minutes: Optional[int]) -> timedelta:
+        return timedelta(minutes=duration_minutes or DEFAULT_TEST_DURATION)
+
+slot_scheduler = SlotScheduler()
+
+shared_state.subscribe("slot_scheduler.tracked", slot_scheduler._track, resync=slot_scheduler.rebuild_once)
+shared_state.subscribe("slot_scheduler.forgotten", lambda message: slot_scheduler.forget(message["id"], broadcast=False))
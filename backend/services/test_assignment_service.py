@@ -1,115 +1,117 @@
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.orm import Session
-from models import Patient, Test, PatientTest, Department
+from models import Patient, PatientTest
+from services.rule_engine import RuleSet, RISK_FLAGS, assignment_rules, load_rules
+from services.test_catalog import test_catalog
 from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+import argparse
+import logging
+import time
 import uuid
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 class TestAssignmentService:
-    
+
     @staticmethod
     def calculate_risk_level(patient: Patient) -> str:
-        risk_score = 0
-        
-        if patient.smoking:
-            risk_score += 2
-        if patient.diabetes:
-            risk_score += 2
-        if patient.hypertension:
-            risk_score += 2
-        if patient.obesity:
-            risk_score += 1
-        if patient.family_history:
-            risk_score += 1
-            
-        age = datetime.now().year - patient.date_of_birth.year
-        if age > 60:
-            risk_score += 2
-        elif age > 40:
-            risk_score += 1
-            
-        if risk_score >= 5:
-            return "high"
-        elif risk_score >= 3:
-            return "medium"
-        else:
-            return "low"
+        return assignment_rules.risk_level(RuleSet.features(patient))
     
     @staticmethod
     def assign_tests(db: Session, patient: Patient) -> list[PatientTest]:
         assigned_tests = []
         
-        # Get available tests by department
-        radiology_tests = db.query(Test).join(Department).filter(
-            Department.type == "radiology"
-        ).all()
-        
-        cardiology_tests = db.query(Test).join(Department).filter(
-            Department.type == "cardiology"
-        ).all()
-        
-        # Assign tests based on risk level and age
-        age = datetime.now().year - patient.date_of_birth.year
-        risk_level = TestAssignmentService.calculate_risk_level(patient)
-        
-        # Radiology tests
-        if patient.gender.lower() == "female" and age >= 40:
-            mammogram = next((t for t in radiology_tests if "mammogram" in t.name.lower()), None)
-            if mammogram:
-                assigned_tests.append(PatientTest(
-                    patient_id=patient.id,
-                    test_id=mammogram.id
-                ))
-        
-        if age >= 18:
-            usg_abdomen = next((t for t in radiology_tests if "usg" in t.name.lower() and "abdomen" in t.name.lower()), None)
-            if usg_abdomen:
+        # Rules from rules/test_assignment.yaml; O(1) lookups in the cached catalog
+        for key in assignment_rules.assign(RuleSet.features(patient)):
+            test = test_catalog.rule_test(db, key)
+            if test:
                 assigned_tests.append(PatientTest(
                     patient_id=patient.id,
-                    test_id=usg_abdomen.id
+                    test_id=test.id
                 ))
         
-        xray_chest = next((t for t in radiology_tests if "x-ray" in t.name.lower() and "chest" in t.name.lower()), None)
-        if xray_chest:
-            assigned_tests.append(PatientTest(
-                patient_id=patient.id,
-                test_id=xray_chest.id
-            ))
+        return assigned_tests
+    
+    @staticmethod
+    def evaluate_all(db: Session, rules: Optional[RuleSet] = None) -> "pd.DataFrame":
+        """Run a rule set over every patient at once.
         
-        # Cardiology tests
-        if risk_level in ["medium", "high"] or age >= 50:
-            ecg = next((t for t in cardiology_tests if "ecg" in t.name.lower()), None)
-            if ecg:
-                assigned_tests.append(PatientTest(
-                    patient_id=patient.id,
-                    test_id=ecg.id
-                ))
+        Returns one row per patient id with the stored and the rule-derived
+        risk level, plus one boolean column per test key.
+        """
+        import pandas as pd
         
-        if risk_level == "high" or age >= 60:
-            tmt = next((t for t in cardiology_tests if "tmt" in t.name.lower()), None)
-            if tmt:
-                assigned_tests.append(PatientTest(
-                    patient_id=patient.id,
-                    test_id=tmt.id
-                ))
+        rules = rules or assignment_rules
+        patients = pd.read_sql(
+            select(
+                Patient.id, Patient.date_of_birth, Patient.gender, Patient.risk_level,
+                *(getattr(Patient, flag) for flag in RISK_FLAGS)
+            ),
+            db.connection(),
+            index_col="id"
+        )
+        result = rules.evaluate(patients)
+        result.insert(0, "stored_risk_level", patients["risk_level"])
+        return result
+    
+    @staticmethod
+    def reassignment_summary(db: Session, evaluated: "pd.DataFrame", rules: Optional[RuleSet] = None) -> "pd.DataFrame":
+        """Per test: patients ``evaluated`` selects and how many lack that test today."""
+        import pandas as pd
         
-        if risk_level == "high":
-            echo_2d = next((t for t in cardiology_tests if "2d echo" in t.name.lower() or "echo" in t.name.lower()), None)
-            if echo_2d:
-                assigned_tests.append(PatientTest(
-                    patient_id=patient.id,
-                    test_id=echo_2d.id
-                ))
+        rules = rules or assignment_rules
+        existing = pd.read_sql(select(PatientTest.patient_id, PatientTest.test_id).distinct(), db.connection())
+        tests = test_catalog.resolve(db, rules)
         
-        # PFT for all adults
-        if age >= 18:
-            pft = next((t for t in cardiology_tests if "pft" in t.name.lower()), None)
-            if pft:
-                assigned_tests.append(PatientTest(
-                    patient_id=patient.id,
-                    test_id=pft.id
-                ))
-        
-        return assigned_tests
+        rows = []
+        for key in rules.test_keys():
+            selected = evaluated.index[evaluated[key].to_numpy()]
+            test = tests.get(key)
+            has_test = existing.loc[existing["test_id"] == test.id, "patient_id"] if test else pd.Series(dtype="int64")
+            rows.append({
+                "test": key,
+                "catalog_test": test.name if test else None,
+                "patients_selected": len(selected),
+                "missing_test": int((~selected.isin(has_test)).sum())
+            })
+        return pd.DataFrame(rows).set_index("test")
     
     @staticmethod
     def generate_unique_id() -> str:
         return f"P{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+
+if __name__ == "__main__":
+    # Preview a policy change across all patients:
+    #   python -m services.test_assignment_service --rules new_rules.yaml [--update-risk]
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Evaluate test assignment rules over every patient")
+    parser.add_argument("--rules", help="rules YAML (default: the deployed rules)")
+    parser.add_argument("--update-risk", action="store_true", help="store the recomputed risk levels")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    rules = load_rules(args.rules) if args.rules else assignment_rules
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        evaluated = TestAssignmentService.evaluate_all(db, rules)
+        summary = TestAssignmentService.reassignment_summary(db, evaluated, rules)
+        changed = evaluated[evaluated["risk_level"] != evaluated["stored_risk_level"]]
+
+        print(f"Evaluated {len(evaluated)} patients in {time.perf_counter() - started:.2f}s")
+        print(f"Risk level changes: {len(changed)}")
+        print(summary.to_string())
+
+        if args.update_risk and len(changed):
+            patients = Patient.__table__
+            db.execute(
+                update(patients).where(patients.c.id == bindparam("patient_id")).values(risk_level=bindparam("new_risk_level")),
+                [{"patient_id": int(pid), "new_risk_level": level} for pid, level in changed["risk_level"].items()]
+            )
+            db.commit()
+            print(f"Updated risk level for {len(changed)} patients")
+    finally:
+        db.close()
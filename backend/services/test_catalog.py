@@ -0,0 +1,134 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from models import Test, Department
+from services.rule_engine import RuleSet, assignment_rules
+from services.shared_state import shared_state
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+import logging
+import os
+import re
+import threading
+import time
+
+load_dotenv("config.env")
+
+TEST_CATALOG_TTL_SECONDS = float(os.getenv("TEST_CATALOG_TTL_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+def normalize_test_code(name: str) -> str:
+    """``"X-ray Chest"`` -> ``"xraychest"``: case and punctuation do not matter."""
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+class CatalogSnapshot(NamedTuple):
+    tests: Dict[int, Test]
+    by_code: Dict[Tuple[str, str], Test]
+    rules: Dict[str, Test]
+    loaded_at: float
+
+class TestCatalog:
+    """Process-wide cache of the test catalog, indexed by department type and code.
+
+    Holds detached ``Test`` rows (with their department) loaded in one query.
+    Edits through the ORM invalidate it when their transaction commits; other
+    processes pick them up after ``TEST_CATALOG_TTL_SECONDS``.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._generation = 0
+
+    def load(self, db: Session) -> CatalogSnapshot:
+        generation = self._generation
+        # Separate session: closing it detaches the rows without touching ``db``
+        with Session(bind=db.get_bind()) as loader:
+            tests = loader.query(Test).options(joinedload(Test.department)).order_by(Test.id).all()
+
+        by_code: Dict[Tuple[str, str], Test] = {}
+        for test in tests:
+            department_type = test.department.type if test.department else None
+            by_code.setdefault((department_type, normalize_test_code(test.name)), test)
+
+        # Rule keys resolved once per load instead of scanned on every registration
+        rules = self._resolve(tests, assignment_rules)
+
+        snapshot = CatalogSnapshot({t.id: t for t in tests}, by_code, rules, time.monotonic())
+        with self._lock:
+            # An empty catalog means the database is not seeded yet; an edit
+            # committed while loading makes this snapshot stale
+            if tests and generation == self._generation:
+                self._snapshot = snapshot
+
+        logger.info("test_catalog.loaded tests=%d rules=%d", len(tests), len(rules))
+        return snapshot
+
+    @staticmethod
+    def _resolve(tests: List[Test], rules: RuleSet) -> Dict[str, Test]:
+        resolved = {}
+        for rule in rules.tests:
+            test = next((
+                t for t in tests
+                if rule.matches_test(t.department.type if t.department else None, t.name)
+            ), None)
+            if test:
+                resolved[rule.key] = test
+        return resolved
+
+    def resolve(self, db: Session, rules: RuleSet) -> Dict[str, Test]:
+        """Map another rule set's test keys to catalog tests."""
+        return self._resolve(list(self.get(db).tests.values()), rules)
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > self.ttl:
+            snapshot = self.load(db)
+        return snapshot
+
+    def rule_test(self, db: Session, rule: str) -> Optional[Test]:
+        return self.get(db).rules.get(rule)
+
+    def lookup(self, db: Session, department_type: str, name: str) -> Optional[Test]:
+        return self.get(db).by_code.get((department_type, normalize_test_code(name)))
+
+    def department_id(self, db: Session, test_id: int) -> Optional[int]:
+        test = self.get(db).tests.get(test_id)
+        return test.department_id if test else None
+
+    def attach(self, db: Session):
+        """Put the cached rows in ``db``'s identity map so relationship loads skip SQL.
+
+        Call after the last commit of the request; committing again expires them.
+        """
+        # The identity map is weak-referencing; keep the merged copies alive
+        db.info["test_catalog"] = [db.merge(test, load=False) for test in self.get(db).tests.values()]
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+test_catalog = TestCatalog(TEST_CATALOG_TTL_SECONDS)
+
+def _mark_catalog_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info["test_catalog_changed"] = True
+
+for _model in (Test, Department):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_catalog_changed)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("test_catalog_changed", False):
+        test_catalog.invalidate()
+        shared_state.publish("test_catalog.changed")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("test_catalog_changed", None)
+
+shared_state.subscribe("test_catalog.changed", lambda message: test_catalog.invalidate(), resync=test_catalog.invalidate)
@@ -0,0 +1,253 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import PatientTest, Room
+from services.room_dispatcher import DEFAULT_TEST_DURATION
+from services.test_catalog import test_catalog
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+import asyncio
+import logging
+import math
+import os
+import threading
+
+load_dotenv("config.env")
+
+WAIT_TIME_HISTORY_DAYS = int(os.getenv("WAIT_TIME_HISTORY_DAYS", "30"))
+WAIT_TIME_RECONCILE_SECONDS = int(os.getenv("WAIT_TIME_RECONCILE_SECONDS", "300"))
+# Completions the learned mean follows; older ones fade out exponentially
+WAIT_TIME_WINDOW = int(os.getenv("WAIT_TIME_WINDOW", "200"))
+# Test.estimated_duration counts as this many observed completions
+PRIOR_WEIGHT = 5
+
+logger = logging.getLogger(__name__)
+
+# (department_id, test_id, status, created_at) for one queue row
+QueueEntry = Tuple[int, int, str, Optional[datetime]]
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class ServiceTime:
+    """Running mean and variance of one test's duration, in minutes.
+
+    Exact (Welford) for the first WAIT_TIME_WINDOW completions, exponentially
+    weighted after that. ``expected`` shrinks the learned mean towards the
+    catalog's estimated_duration while there are only a few samples.
+    """
+
+    __slots__ = ("prior", "count", "mean", "variance")
+
+    def __init__(self, prior: Optional[int]):
+        self.prior = prior
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def add(self, minutes: float):
+        self.count = min(self.count + 1, WAIT_TIME_WINDOW)
+        weight = 1 / self.count
+        delta = minutes - self.mean
+        self.mean += weight * delta
+        self.variance = (1 - weight) * (self.variance + weight * delta * delta)
+
+    @property
+    def expected(self) -> float:
+        if self.prior is None:
+            return self.mean if self.count else DEFAULT_TEST_DURATION
+        return (PRIOR_WEIGHT * self.prior + self.count * self.mean) / (PRIOR_WEIGHT + self.count)
+
+class WaitTimeEstimator:
+    """In-memory wait-time model: per-test service times plus live queue depth.
+
+    The expected wait in a department is the work ahead (expected duration
+    of every waiting test, half of it for tests in progress) divided by the
+    department's rooms, and zero while a room is free. Status changes made
+    by this process update the model as they commit; a periodic rebuild
+    folds in other workers' changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tests: Dict[int, ServiceTime] = {}
+        self._department_of: Dict[int, int] = {}
+        self._rooms: Dict[int, int] = {}
+        # department_id -> test_id -> count
+        self._waiting: Dict[int, Dict[int, int]] = {}
+        self._in_progress: Dict[int, Dict[int, int]] = {}
+        self.loaded_at: Optional[datetime] = None
+
+    def rebuild(self, db: Session):
+        since = datetime.utcnow() - timedelta(days=WAIT_TIME_HISTORY_DAYS)
+        catalog = list(test_catalog.get(db).tests.values())
+        rooms = db.execute(select(Room.department_id, func.count(Room.id)).group_by(Room.department_id)).all()
+        active = db.execute(
+            select(PatientTest.test_id, PatientTest.status, func.count(PatientTest.id))
+            .where(PatientTest.status.in_(("pending", "in_progress")))
+            .group_by(PatientTest.test_id, PatientTest.status)
+        ).all()
+        history = db.execute(
+            select(PatientTest.test_id, PatientTest.started_at, PatientTest.completed_at)
+            .where(
+                PatientTest.status == "completed",
+                PatientTest.started_at.is_not(None),
+                PatientTest.completed_at >= since
+            )
+            .order_by(PatientTest.completed_at)
+        ).all()
+
+        tests = {test.id: ServiceTime(test.estimated_duration) for test in catalog}
+        department_of = {test.id: test.department_id for test in catalog}
+        for test_id, started_at, completed_at in history:
+            minutes = self._minutes(started_at, completed_at)
+            if test_id in tests and minutes is not None:
+                tests[test_id].add(minutes)
+
+        waiting: Dict[int, Dict[int, int]] = {}
+        in_progress: Dict[int, Dict[int, int]] = {}
+        for test_id, test_status, count in active:
+            if test_id in department_of:
+                counts = waiting if test_status == "pending" else in_progress
+                counts.setdefault(department_of[test_id], {})[test_id] = count
+
+        with self._lock:
+            self._tests, self._department_of = tests, department_of
+            self._rooms = {department_id: count for department_id, count in rooms}
+            self._waiting, self._in_progress = waiting, in_progress
+            self.loaded_at = datetime.utcnow()
+        logger.info("wait_time_estimator.rebuilt tests=%d completions=%d", len(tests), len(history))
+
+    def rebuild_once(self):
+        with SessionLocal() as db:
+            self.rebuild(db)
+
+    async def run_periodically(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.rebuild_once)
+            except Exception:
+                logger.exception("wait_time_estimator.rebuild_failed")
+
+    def record_new(self, test_id: int, test_status: str = "pending"):
+        with self._lock:
+            self._adjust(test_id, test_status, 1)
+
+    def record_transition(self, test_id: int, old_status: str, new_status: str,
+                          started_at: Optional[datetime] = None, completed_at: Optional[datetime] = None):
+        if old_status == new_status:
+            return
+        with self._lock:
+            self._adjust(test_id, old_status, -1)
+            self._adjust(test_id, new_status, 1)
+            minutes = self._minutes(started_at, completed_at) if new_status == "completed" else None
+            if minutes is not None and test_id in self._tests:
+                self._tests[test_id].add(minutes)
+
+    def department_wait(self, department_id: int, queued_test_id: Optional[int] = None) -> Optional[int]:
+        """Minutes a test joining the department's queue now would wait.
+
+        ``queued_test_id``: the test is already counted as waiting (at the
+        back of the queue), so it is not part of its own work ahead.
+        """
+        with self._lock:
+            if self.loaded_at is None:
+                return None
+            in_progress = self._in_progress.get(department_id, {})
+            waiting = self._waiting.get(department_id, {})
+            work = sum(count * self._expected(test_id) / 2 for test_id, count in in_progress.items())
+            work += sum(count * self._expected(test_id) for test_id, count in waiting.items())
+            occupancy = sum(in_progress.values()) + sum(waiting.values())
+            if queued_test_id is not None and waiting.get(queued_test_id):
+                work -= self._expected(queued_test_id)
+                occupancy -= 1
+            return self._wait(occupancy, work, self._rooms.get(department_id, 0))
+
+    def queue_waits(self, entries: Sequence[QueueEntry], positional: bool = True) -> List[Optional[int]]:
+        """Estimated minutes until each pending queue row is called.
+
+        With ``positional`` the rows are the departments' whole queues and
+        each pending test waits for the ones created before it. Otherwise
+        (a few changed rows) pending tests get the back-of-queue estimate.
+        """
+        waits: List[Optional[int]] = [None] * len(entries)
+        if not positional:
+            for index, (department_id, test_id, test_status, _) in enumerate(entries):
+                if test_status == "pending":
+                    waits[index] = self.department_wait(department_id, test_id)
+            return waits
+
+        by_department: Dict[int, List[int]] = {}
+        for index, entry in enumerate(entries):
+            by_department.setdefault(entry[0], []).append(index)
+
+        with self._lock:
+            if self.loaded_at is None:
+                return waits
+            for department_id, indexes in by_department.items():
+                rooms = self._rooms.get(department_id, 0)
+                in_progress = [entries[i][1] for i in indexes if entries[i][2] == "in_progress"]
+                work = sum(self._expected(test_id) / 2 for test_id in in_progress)
+                pending = sorted(
+                    (i for i in indexes if entries[i][2] == "pending"),
+                    key=lambda i: _as_utc(entries[i][3]) or datetime.min
+                )
+                for ahead, index in enumerate(pending):
+                    waits[index] = self._wait(len(in_progress) + ahead, work, rooms)
+                    work += self._expected(entries[index][1])
+        return waits
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            departments = [{
+                "department_id": department_id,
+                "rooms": self._rooms.get(department_id, 0),
+                "waiting": sum(self._waiting.get(department_id, {}).values()),
+                "in_progress": sum(self._in_progress.get(department_id, {}).values())
+            } for department_id in sorted(set(self._rooms) | set(self._department_of.values()))]
+            tests = [{
+                "test_id": test_id,
+                "department_id": self._department_of.get(test_id),
+                "samples": stats.count,
+                "mean_minutes": round(stats.mean, 1) if stats.count else None,
+                "std_minutes": round(math.sqrt(stats.variance), 1) if stats.count > 1 else None,
+                "expected_minutes": round(stats.expected, 1)
+            } for test_id, stats in sorted(self._tests.items())]
+            loaded_at = self.loaded_at
+        # department_wait takes the lock itself
+        for department in departments:
+            department["estimated_wait_minutes"] = self.department_wait(department["department_id"])
+        return {"loaded_at": loaded_at, "departments": departments, "tests": tests}
+
+    def _adjust(self, test_id: int, test_status: str, delta: int):
+        # Caller holds the lock
+        department_id = self._department_of.get(test_id)
+        if department_id is None or test_status not in ("pending", "in_progress"):
+            return
+        counts = (self._waiting if test_status == "pending" else self._in_progress).setdefault(department_id, {})
+        counts[test_id] = max(counts.get(test_id, 0) + delta, 0)
+
+    def _expected(self, test_id: int) -> float:
+        stats = self._tests.get(test_id)
+        return stats.expected if stats else DEFAULT_TEST_DURATION
+
+    @staticmethod
+    def _wait(occupancy: int, work: float, rooms: int) -> int:
+        # A free room means no wait; otherwise the work ahead shared by all rooms
+        if occupancy < rooms:
+            return 0
+        return int(round(work / max(rooms, 1)))
+
+    @staticmethod
+    def _minutes(started_at: Optional[datetime], completed_at: Optional[datetime]) -> Optional[float]:
+        if started_at is None or completed_at is None:
+            return None
+        minutes = (_as_utc(completed_at) - _as_utc(started_at)).total_seconds() / 60
+        return minutes if minutes >= 0 else None
+
+wait_time_estimator = WaitTimeEstimator()
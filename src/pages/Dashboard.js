@@ -22,6 +22,9 @@ import {
   Assessment as AssessmentIcon,
 } from '@mui/icons-material';
 import axios from 'axios';
+import {subscribeToQueueStream} from '../utils/queueStream';
+
+const METRICS_REFRESH_DELAY = 2000;
 
 const Dashboard = () => {
   const navigate = useNavigate();
@@ -39,8 +42,24 @@ const Dashboard = () => {
 
   useEffect(() => {
     fetchDashboardData();
-    const interval = setInterval(fetchDashboardData, 30000);
-    return () => clearInterval(interval);
+
+    // Refresh the counters only when the live queue feed reports a change,
+    // coalescing bursts of updates into a single request.
+    let refreshTimer = null;
+    const scheduleRefresh = () => {
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(fetchDashboardData, METRICS_REFRESH_DELAY);
+    };
+    const unsubscribe = subscribeToQueueStream({
+      onUpsert: scheduleRefresh,
+      onRemove: scheduleRefresh,
+      onError: (error) => console.error('Queue stream error:', error),
+    });
+
+    return () => {
+      unsubscribe();
+      clearTimeout(refreshTimer);
+    };
   }, []);
 
   const fetchDashboardData = async () => {
@@ -32,6 +32,7 @@ import {
   FilterList as FilterIcon,
 } from '@mui/icons-material';
 import axios from 'axios';
+import {subscribeToQueueStream} from '../utils/queueStream';
 
 const QueueManagement = () => {
   const [queueData, setQueueData] = useState([]);
@@ -53,8 +54,24 @@ const QueueManagement = () => {
   useEffect(() => {
     fetchInitialData();
     if (autoRefresh) {
-      const interval = setInterval(fetchQueueData, 30000);
-      return () => clearInterval(interval);
+      return subscribeToQueueStream({
+        departmentId: selectedDepartment,
+        onSnapshot: (items) => {
+          setQueueData(items);
+          setLoading(false);
+        },
+        onUpsert: (item) =>
+          setQueueData((current) => {
+            const index = current.findIndex((row) => row.id === item.id);
+            if (index === -1) return [...current, item];
+            const next = [...current];
+            next[index] = item;
+            return next;
+          }),
+        onRemove: (id) =>
+          setQueueData((current) => current.filter((row) => row.id !== id)),
+        onError: (error) => console.error('Queue stream error:', error),
+      });
     }
   }, [autoRefresh, selectedDepartment]);
 
@@ -72,7 +89,9 @@ const QueueManagement = () => {
 
       setDepartments(deptRes.data);
       setRooms(roomsRes.data);
-      await fetchQueueData();
+      if (!autoRefresh) {
+        await fetchQueueData();
+      }
     } catch (error) {
       console.error('Error fetching initial data:', error);
     }
@@ -117,7 +136,9 @@ const QueueManagement = () => {
 
       setUpdateDialog({open: false, patientTest: null});
       setUpdateData({status: '', room_id: '', notes: ''});
-      fetchQueueData();
+      if (!autoRefresh) {
+        fetchQueueData();
+      }
     } catch (error) {
       console.error('Error updating status:', error);
     }
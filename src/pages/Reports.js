@@ -122,7 +122,28 @@ const Reports = () => {
         }
       );
 
-      const url = window.URL.createObjectURL(new Blob([response.data]));
+      let data = response.data;
+      if (response.status === 202) {
+        // Large exports run as a background job: wait for it, then download the file
+        let job = JSON.parse(await response.data.text());
+        while (job.status === 'queued' || job.status === 'running') {
+          await new Promise((resolve) => setTimeout(resolve, 2000));
+          const status = await axios.get(`https://mhcqms.onrender.com${job.status_url}`, {
+            headers: {Authorization: `Bearer ${token}`},
+          });
+          job = status.data;
+        }
+        if (job.status !== 'completed') {
+          throw new Error(job.error || 'Export failed');
+        }
+        const download = await axios.get(`https://mhcqms.onrender.com${job.download_url}`, {
+          headers: {Authorization: `Bearer ${token}`},
+          responseType: 'blob',
+        });
+        data = download.data;
+      }
+
+      const url = window.URL.createObjectURL(new Blob([data]));
       const link = document.createElement('a');
       link.href = url;
       link.setAttribute(
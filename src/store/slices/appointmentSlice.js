@@ -38,16 +38,25 @@ export const createAppointment = createAsyncThunk(
   }
 );
 
+// The list comes a page at a time; X-Next-Cursor is set while more follow
+const APPOINTMENT_PAGE_SIZE = 500;
+
 export const fetchAppointments = createAsyncThunk(
   'appointments/fetch',
   async (params, {rejectWithValue}) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(getApiUrl('/appointments/'), {
-        headers: {Authorization: `Bearer ${token}`},
-        params,
-      });
-      return response.data;
+      const appointments = [];
+      let cursor;
+      do {
+        const response = await axios.get(getApiUrl('/appointments/'), {
+          headers: {Authorization: `Bearer ${token}`},
+          params: {limit: APPOINTMENT_PAGE_SIZE, ...params, cursor},
+        });
+        appointments.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
+      return appointments;
     } catch (error) {
       return rejectWithValue(
         error.response?.data?.detail || 'Failed to fetch appointments'
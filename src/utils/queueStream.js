@@ -0,0 +1,79 @@
+import {getApiUrl} from '../config/api';
+
+const RECONNECT_DELAY = 5000;
+
+// Subscribes to the server-sent queue feed. EventSource cannot send the
+// Authorization header, so the stream is read through fetch instead.
+export const subscribeToQueueStream = ({
+  departmentId,
+  onSnapshot,
+  onUpsert,
+  onRemove,
+  onError,
+}) => {
+  const controller = new AbortController();
+  let reconnectTimer = null;
+
+  const dispatch = (event, data) => {
+    if (event === 'snapshot') {
+      onSnapshot && onSnapshot(data);
+    } else if (event === 'upsert') {
+      onUpsert && onUpsert(data.item);
+    } else if (event === 'remove') {
+      onRemove && onRemove(data.id);
+    }
+  };
+
+  const connect = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      const params = departmentId ? `?department_id=${departmentId}` : '';
+      const response = await fetch(getApiUrl(`/queue/stream${params}`), {
+        headers: {Authorization: `Bearer ${token}`},
+        signal: controller.signal,
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Queue stream failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const message = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+
+          let event = 'message';
+          let data = '';
+          message.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            if (line.startsWith('data:')) data += line.slice(5).trim();
+          });
+          if (data) dispatch(event, JSON.parse(data));
+        }
+      }
+    } catch (error) {
+      if (controller.signal.aborted) return;
+      onError && onError(error);
+    }
+
+    if (!controller.signal.aborted) {
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+    }
+  };
+
+  connect();
+
+  return () => {
+    controller.abort();
+    clearTimeout(reconnectTimer);
+  };
+};
@@ -6,6 +6,7 @@ echo Installing Python dependencies...
 pip install -r requirements.txt
 echo.
 echo Initializing database...
+alembic upgrade head
 python init_db.py
 echo.
 echo Starting FastAPI server...
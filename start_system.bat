@@ -2,7 +2,7 @@
 echo Starting Healthcare Queue Management System...
 echo.
 echo Starting Backend Server...
-start "Backend Server" cmd /k "cd backend && pip install -r requirements.txt && python init_db.py && python main.py"
+start "Backend Server" cmd /k "cd backend && pip install -r requirements.txt && alembic upgrade head && python init_db.py && python main.py"
 echo.
 echo Waiting for backend to start...
 timeout /t 10 /nobreak >nul